@@ -4,13 +4,14 @@
 
 from os import path
 import json
+import hashlib
 from glb import *
 
 
 def __fill_level_structure_constants():
     global PLAYER_UNIT, BEAST_UNITS, SOLID_BLOCKS, DESTRUCTABLE_BLOCKS, SUPPORT_BLOCKS, CARRY_BLOCKS, HANG_BLOCKS
     global CLIMB_BLOCKS, VIRTUAL_BLOCKS, TREASURE_BLOCKS, EXIT_BLOCKS, BEAST_BLOCKS, DEADLY_BLOCKS, MAPPED_BLOCKS
-    global BLOCKS
+    global BLOCKS, BLOCK_IDS, BLOCK_CHARS, BLOCK_TRAITS
 
     PLAYER_UNIT = BLOCKS["characters"]["I"]
     BEAST_UNITS = get_subset_by_type(BLOCKS["characters"], "beast")
@@ -38,6 +39,46 @@ def __fill_level_structure_constants():
     MAPPED_BLOCKS = list(get_subset_by_type({**BLOCKS["static"], **BLOCKS["animated"], **BLOCKS["characters"]},
                                             "mapped"))
 
+    # Числовые коды блоков для карты уровня и битовые маски их свойств
+    all_blocks = {**BLOCKS["static"], **BLOCKS["animated"], **BLOCKS["characters"]}
+    BLOCK_CHARS = [EMPTY_BLOCK, BORDER_BLOCK] + [ch for ch in all_blocks if ch not in (EMPTY_BLOCK, BORDER_BLOCK)]
+    BLOCK_IDS = {ch: block_id for block_id, ch in enumerate(BLOCK_CHARS)}
+    BLOCK_TRAITS = [0, TRAIT_SOLID | TRAIT_SUPPORT] + \
+                   [sum({TRAITS[_] for _ in all_blocks[ch]["type"] if _ in TRAITS}) for ch in BLOCK_CHARS[2:]]
+
+
+# Свойства блоков в виде битовых флагов. Из них для каждого блока собирается маска в BLOCK_TRAITS
+TRAIT_SOLID = 1 << 0
+TRAIT_SUPPORT = 1 << 1
+TRAIT_CARRY = 1 << 2
+TRAIT_HANG = 1 << 3
+TRAIT_CLIMB = 1 << 4
+TRAIT_DESTRUCTABLE = 1 << 5
+TRAIT_VIRTUAL = 1 << 6
+TRAIT_TREASURE = 1 << 7
+TRAIT_EXIT = 1 << 8
+TRAIT_DEADLY = 1 << 9
+TRAIT_MAPPED = 1 << 10
+
+TRAITS = {"solid": TRAIT_SOLID,
+          "support": TRAIT_SUPPORT,
+          "carry": TRAIT_CARRY,
+          "hang": TRAIT_HANG,
+          "climb": TRAIT_CLIMB,
+          "destructable": TRAIT_DESTRUCTABLE,
+          "virtual": TRAIT_VIRTUAL,
+          "treasure": TRAIT_TREASURE,
+          "exit": TRAIT_EXIT,
+          "deadly": TRAIT_DEADLY,
+          "mapped": TRAIT_MAPPED,
+          }
+"""Соответствие типов блоков из BLOCKS битовым флагам"""
+
+EMPTY_BLOCK = '.'
+"""Пустая клетка уровня"""
+
+BORDER_BLOCK = '|'
+"""Граница уровня. Ею окружена карта уровня, чтобы не проверять выход за её пределы. Непроницаема и держит"""
 
 # Статусы завершения игры
 GAME_OVER_NOT_OVER = 0  # Игра продолжается
@@ -53,14 +94,26 @@ GAME_CONFIG_FILE = path.join(path.dirname(__file__), "structure.ini")
 GAME_STATE_FILE = path.join(path.dirname(__file__), "state.ini")
 """Define game state file. This is storage for values, that changes during game, like current level, music track etc"""
 
+REPLAY_FILE = path.join(path.dirname(__file__), "Replays", "last.replay")
+"""Запись последней сыгранной попытки уровня (см. модуль replay)"""
+
 BLOCK_WIDTH = 38
 """Размер спрайтов"""
 
 LEVEL_WIDTH = 42
-"""Ширина уровня"""
+"""Ширина уровня. Карта берётся по размеру файла уровня, но не меньше этого: короткие строки дополняются пустотой"""
 
 LEVEL_HEIGHT = 22
-"""Высота уровня"""
+"""Высота уровня. Как и ширина -- наименьшая, карты больше этого показываются камерой (см. модуль camera)"""
+
+SCREEN_WIDTH = LEVEL_WIDTH
+"""Ширина игрового окна в блоках"""
+
+SCREEN_HEIGHT = LEVEL_HEIGHT
+"""Высота игрового окна в блоках"""
+
+ATLAS_FOLDERS = ("Animation", "Beast", "Player", "Static", "Temporary", "Treasure")
+"""Каталоги картинок, которые упаковываются в атласы. Картинки остальных каталогов загружаются по одной"""
 
 STEP = 24
 """Шагов анимации между ключевыми кадрами (в которых игра воспринимает управление).
@@ -78,6 +131,19 @@ BEAST_TEMPO = 8
 Изменяя эти значения можно добиться либо замедления, либо ускорения монстров относительно игрока.
 """
 
+INPUT_PREBUFFER = 1
+"""Сколько нажатий клавиш перемещения запоминается на следующие шаги игрока, сверх нажатия на текущий шаг"""
+
+BEAST_WANDER = True
+"""Монстры, которым путь к игроку перегорожен, какое-то время бредут наугад. Иначе -- стоят на месте"""
+
+BEAST_HORDE = 64
+"""С какого числа монстров на уровне они ходят все одновременно (см. модуль horde), а не по очереди"""
+
+RENDER_FPS = 60
+"""Ограничение частоты отрисовки кадров. 0 -- без ограничения. Скорость игры от этого значения не зависит,
+    симуляция всегда выполняет FPS тиков в секунду"""
+
 FPS = TEMPO * STEP
 BEAST_STEP = int(FPS / BEAST_TEMPO)
 BEAST_ANIMATION_STEP = BLOCK_WIDTH / BEAST_STEP  # Смещение объекта в пикселах за один шаг анимации
@@ -422,13 +488,34 @@ DEADLY_BLOCKS = list()
 MAPPED_BLOCKS = list()
 """Блоки, хранящиеся в карте проверки"""
 
+BLOCK_CHARS = list()
+"""Символы блоков по их числовым кодам. Код 0 -- пустая клетка, 1 -- граница уровня"""
+BLOCK_IDS = dict()
+"""Числовые коды блоков по их символам"""
+BLOCK_TRAITS = list()
+"""Маски свойств (TRAIT_*) блоков по их числовым кодам"""
+
 __fill_level_structure_constants()
 
 
+def config_digest() -> str:
+    """Хэш настроек, от которых зависит симуляция. Записи игры верны только для тех же настроек"""
+    settings = {"STEP": STEP, "TEMPO": TEMPO, "BEAST TEMPO": BEAST_TEMPO, "BEAST WANDER": BEAST_WANDER,
+                "BEAST HORDE": BEAST_HORDE, "LEVEL WIDTH": LEVEL_WIDTH, "LEVEL HEIGHT": LEVEL_HEIGHT, "BLOCKS": BLOCKS}
+    return hashlib.md5(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def init_timing():
+    """Настройки структуры уровня, которые зависят от темпа игры. Вызывается после загрузки конфигурации"""
+    # Override default lifetime value in structure setting to avoid speed-related issues
+    BLOCKS["temporary"]["cracked"]["lifetime"] = int(FPS * 2.2)
+
+
 def init_config(game_state, config, defaults: tuple = (-1, -1)):
     """Загрузка или установка конфигурации по умолчанию и создание файлов конфигурации"""
     global BLOCKS, BLOCK_WIDTH, FPS, BEAST_STEP, PLAYER_ANIMATION_STEP
-    global LEVEL_HEIGHT, LEVEL_WIDTH, STEP, TEMPO, BEAST_TEMPO, BEAST_ANIMATION_STEP
+    global LEVEL_HEIGHT, LEVEL_WIDTH, STEP, TEMPO, BEAST_TEMPO, BEAST_ANIMATION_STEP, RENDER_FPS, BEAST_WANDER
+    global INPUT_PREBUFFER, BEAST_HORDE, SCREEN_WIDTH, SCREEN_HEIGHT
 
     (current_level, current_song) = defaults
 
@@ -449,10 +536,16 @@ def init_config(game_state, config, defaults: tuple = (-1, -1)):
         BLOCK_WIDTH = int(config.get("Geometry", "BLOCK WIDTH", fallback=BLOCK_WIDTH))
         LEVEL_WIDTH = int(config.get("Geometry", "LEVEL WIDTH", fallback=LEVEL_WIDTH))
         LEVEL_HEIGHT = int(config.get("Geometry", "LEVEL HEIGHT", fallback=LEVEL_HEIGHT))
+        SCREEN_WIDTH = int(config.get("Geometry", "SCREEN WIDTH", fallback=LEVEL_WIDTH))
+        SCREEN_HEIGHT = int(config.get("Geometry", "SCREEN HEIGHT", fallback=LEVEL_HEIGHT))
 
         STEP = int(config.get("Game", "STEP", fallback=STEP))
         TEMPO = int(config.get("Game", "TEMPO", fallback=TEMPO))
         BEAST_TEMPO = int(config.get("Game", "BEAST TEMPO", fallback=BEAST_TEMPO))
+        RENDER_FPS = int(config.get("Game", "RENDER FPS", fallback=RENDER_FPS))
+        BEAST_WANDER = bool(int(config.get("Game", "BEAST WANDER", fallback=int(BEAST_WANDER))))
+        INPUT_PREBUFFER = int(config.get("Game", "INPUT PREBUFFER", fallback=INPUT_PREBUFFER))
+        BEAST_HORDE = int(config.get("Game", "BEAST HORDE", fallback=BEAST_HORDE))
 
         __fill_level_structure_constants()
 
@@ -468,9 +561,15 @@ def init_config(game_state, config, defaults: tuple = (-1, -1)):
         config["Game"]["STEP"] = str(STEP)
         config["Game"]["TEMPO"] = str(TEMPO)
         config["Game"]["BEAST TEMPO"] = str(BEAST_TEMPO)
+        config["Game"]["RENDER FPS"] = str(RENDER_FPS)
+        config["Game"]["BEAST WANDER"] = str(int(BEAST_WANDER))
+        config["Game"]["INPUT PREBUFFER"] = str(INPUT_PREBUFFER)
+        config["Game"]["BEAST HORDE"] = str(BEAST_HORDE)
         config["Geometry"]["BLOCK WIDTH"] = str(BLOCK_WIDTH)
         config["Geometry"]["LEVEL WIDTH"] = str(LEVEL_WIDTH)
         config["Geometry"]["LEVEL HEIGHT"] = str(LEVEL_HEIGHT)
+        config["Geometry"]["SCREEN WIDTH"] = str(SCREEN_WIDTH)
+        config["Geometry"]["SCREEN HEIGHT"] = str(SCREEN_HEIGHT)
         config["Entities"]["BLOCKS"] = json.dumps(BLOCKS, indent='\t')
 
         with open(GAME_CONFIG_FILE, "w") as config_file:
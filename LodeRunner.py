@@ -7,12 +7,8 @@
  Оптимизация структур хранения информации. Все блоки отправлены в общий словарь BLOCKS. Он получил стандартизованную
  стурктуру для любого типа блока.
 
- В данном проекте есть один серьёзный недочёт дизайна -- сейчас при загрузке уровня
- все анимированные спрайты создаются и загружаются заново. На каждый новый уровень. Причём, на каждый блок своя копия.
- Это не оптимально. Картинки анимации, например, достаточно загрузить один раз за всю игру
- по одному экземпляру на каждый тип анимированного спрайта.
- Для этого можно ввести промежуточный класс между Block и всеми наследниками -- что-то типа ImageArray
- Или перед Block, а последний сделать вырожденным случаем.
+ Картинки всех спрайтов загружаются через общий кэш (block.load_image, block.load_frames). Каждый кадр
+ существует в единственном экземпляре на всю игру, а блоки уровня хранят только состояние своей анимации.
 
  Замечание на релиз 8.0. Для улучшения вовлечённости, нужно добавить подсчёт очков за уровень и, возможно, ввести
  опционально количество жизней. Очки считать очень просто -- обратное от времени, прошедшего между подборами сокровищ.
@@ -35,6 +31,9 @@ from glb import *
 import block
 import character
 import level
+import clock
+import controls
+import replay
 
 
 # What next after level end (fail or win)
@@ -57,7 +56,7 @@ def init_screen(width, height):
 def game_over(reason: int):
     """Действия, которые нужно выполнить при завершении игры (по любой причине)"""
     buttons = [btQuit, ]
-    scr_halfwidth, scr_halfheight = (_ * CC.BLOCK_WIDTH / 2 for _ in (CC.LEVEL_WIDTH, CC.LEVEL_HEIGHT))
+    scr_halfwidth, scr_halfheight = (_ * CC.BLOCK_WIDTH / 2 for _ in (CC.SCREEN_WIDTH, CC.SCREEN_HEIGHT))
 
     # Если игрок уровень проиграл, то нужно воспроизвести соответствующий звук
     # Кроме того, на экране заставки нужно добавить кнопку Restart
@@ -119,19 +118,20 @@ config = configparser.ConfigParser()
 game_state = configparser.ConfigParser()
 
 current_level, current_song = CC.init_config(game_state, config)
+glGameClock = clock.GameClock()
 
 # =======================
 # Starting initialization
 # =======================
 
-# Override default lifetime value in structure setting to avoid speed-related issues
-CC.BLOCKS["temporary"]["cracked"]["lifetime"] = int(CC.FPS * 2.2)
+CC.init_timing()
 
 # This makes game screen insensitive to Windows 10 scale setting in screen preferences
 ctypes.windll.user32.SetProcessDPIAware()
-glMainCanvas = init_screen(CC.BLOCK_WIDTH * CC.LEVEL_WIDTH, CC.BLOCK_WIDTH * CC.LEVEL_HEIGHT)
+glMainCanvas = init_screen(CC.BLOCK_WIDTH * CC.SCREEN_WIDTH, CC.BLOCK_WIDTH * CC.SCREEN_HEIGHT)
 
 glLevel = level.Level(glMainCanvas)
+glInput = controls.InputBuffer()
 
 FailTitle = block.Block("Game over title.jpg", subfolder="Titles")
 WinTitle = block.Block("Win title.jpg", subfolder="Titles")
@@ -149,8 +149,8 @@ what_next = ACTION_NEXT
 # Intro screen
 # ============
 
-glMainCanvas.blit(IntroTitle.image, IntroTitle.image.get_rect(center=(CC.LEVEL_WIDTH * CC.BLOCK_WIDTH / 2,
-                                                                      CC.LEVEL_HEIGHT * CC.BLOCK_WIDTH / 2)))
+glMainCanvas.blit(IntroTitle.image, IntroTitle.image.get_rect(center=(CC.SCREEN_WIDTH * CC.BLOCK_WIDTH / 2,
+                                                                      CC.SCREEN_HEIGHT * CC.BLOCK_WIDTH / 2)))
 pygame.display.update()
 
 pygame.mixer.music.load(path.join(path.dirname(__file__), "Sounds", "INTRO.mp3"))
@@ -204,6 +204,10 @@ while what_next in (ACTION_NEXT, ACTION_RESTART):
 
     glLevel.load(path.join(levels_dir, levels_list[current_level]))
 
+    # Каждая попытка записывается, чтобы её можно было повторить (python replay.py Replays/last.replay)
+    glReplay = replay.Replay.start(glLevel, levels_list[current_level])
+    glLevel.player.controls = replay.Recorder(glInput, glReplay)
+
     # ======================================================
     # Pause 1,5 sec for user to look around new level
     # Beasts, treasures and player are blinking at this time
@@ -218,34 +222,49 @@ while what_next in (ACTION_NEXT, ACTION_RESTART):
         glClock.tick(8)
 
     game_over_reason = CC.GAME_OVER_NOT_OVER
-    player_tick = beast_tick = 0
+    pygame.event.clear((KEYDOWN, KEYUP))
+    glInput.reset(pygame.key.get_pressed())
+    glGameClock.reset()
+    glClock.tick()
+    frame_ticks = (0, 0)
 
     # =================================================================================================
     # Game lifecycle
     # =================================================================================================
     while game_over_reason == CC.GAME_OVER_NOT_OVER:
-        # =================================
-        # Actions on user interrupt attempt
-        # =================================
+        # ==========================================================
+        # Actions on user interrupt attempt. Player controls are
+        # buffered every frame, player reads them on his own step
+        # ==========================================================
         for event in pygame.event.get():
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                 what_next = ACTION_QUIT
                 game_over_reason = CC.GAME_OVER_USER_END
-
-        # ====================================================
-        # Do all level actions, assigned to one single tick.
-        # Player and beasts ticks management performed at main
-        # module lifecycle.
-        # ====================================================
-        result = glLevel.live(player_tick, beast_tick)
-        game_over_reason = (result, game_over_reason)[result == CC.GAME_OVER_NOT_OVER]
-
-        player_tick = (player_tick + 1) * (player_tick < CC.STEP - 1)
-        beast_tick = (beast_tick + 1) * (beast_tick < CC.BEAST_STEP - 1)
-
-        pygame.display.update()
-        glClock.tick(CC.FPS)
-
+            glInput.handle(event)
+
+        # ===========================================================
+        # Do all level actions for every simulation tick, that passed
+        # in real time since previous frame. Player and beasts ticks
+        # management performed by game clock.
+        # ===========================================================
+        elapsed = 0
+        while glGameClock.pending() and game_over_reason == CC.GAME_OVER_NOT_OVER:
+            frame_ticks = glGameClock.step()
+            result = glLevel.update(*frame_ticks)
+            game_over_reason = (result, game_over_reason)[result == CC.GAME_OVER_NOT_OVER]
+            elapsed += 1
+
+        # ===========================================================
+        # One frame for all these ticks. Characters positions are
+        # interpolated by the part of the next tick already passed.
+        # ===========================================================
+        glLevel.draw(*(_ + glGameClock.alpha for _ in frame_ticks), elapsed=elapsed)
+
+        # Обновляем на экране только изменившиеся области
+        pygame.display.update(glLevel.dirty_rects)
+        glGameClock.add_time(glClock.tick(CC.RENDER_FPS))
+
+    glReplay.save(CC.REPLAY_FILE)
     pygame.mixer.music.fadeout(500)
     what_next = game_over(game_over_reason)
 
@@ -0,0 +1,126 @@
+""" Атласы спрайтов.
+ Все картинки одного каталога images упаковываются в одну большую картинку и индекс кадров.
+ Атлас сохраняется на диск (каталог images/Atlas), поэтому при запуске игры каталог декодируется
+ одним файлом вместо десятков мелких. Кадры выдаются как подповерхности (subsurface) атласа.
+
+ Атлас пересобирается автоматически, если картинки каталога изменились.
+ Заранее собрать все атласы можно командой: python atlas.py
+"""
+
+from os import path, listdir, makedirs
+import json
+import pygame
+import CC
+
+IMAGES_FOLDER = path.join(path.dirname(__file__), "images")
+"""Корневой каталог картинок игры"""
+
+ATLAS_FOLDER = path.join(IMAGES_FOLDER, "Atlas")
+"""Каталог, в котором хранятся собранные атласы"""
+
+ATLAS_WIDTH = 1024
+"""Ширина атласа в пикселах. Высота определяется упаковкой"""
+
+ATLAS_PADDING = 1
+"""Промежуток между кадрами атласа"""
+
+__atlases = dict()
+"""Загруженные за время работы программы атласы. Ключ -- каталог картинок"""
+
+
+class Atlas:
+    """Атлас -- одна поверхность со всеми кадрами каталога и индекс прямоугольников кадров в ней"""
+
+    def __init__(self, surface: pygame.Surface, index: dict):
+        self.surface = surface
+        self.index = {name: pygame.Rect(rect) for name, rect in index.items()}
+        self.frames = dict()
+        """Уже выданные подповерхности. Для каждого кадра создаётся одна"""
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get(self, name) -> pygame.Surface:
+        """Кадр атласа по имени исходного файла"""
+        frame = self.frames.get(name)
+        if frame is None:
+            frame = self.frames[name] = self.surface.subsurface(self.index[name])
+        return frame
+
+
+def __sources(subfolder) -> dict:
+    """Картинки каталога, которые попадают в атлас, с их размером и временем изменения"""
+    folder = path.join(IMAGES_FOLDER, subfolder)
+    res = dict()
+    for name in sorted(listdir(folder)):
+        if name.lower().endswith(".png"):
+            info = path.getmtime(path.join(folder, name)), path.getsize(path.join(folder, name))
+            res[name] = list(info)
+    return res
+
+
+def pack(sizes: dict, width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+    """Упаковка прямоугольников полками: кадры сортируются по высоте и укладываются рядами слева направо.
+        Возвращает индекс {имя: (x, y, ширина, высота)} и общую высоту атласа."""
+    width = max([width] + [w + padding for w, h in sizes.values()])
+    index = dict()
+    x = y = shelf_height = 0
+    for name in sorted(sizes, key=lambda _: (-sizes[_][1], _)):
+        w, h = sizes[name]
+        if x + w > width:
+            x, y, shelf_height = 0, y + shelf_height + padding, 0
+        index[name] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    return index, y + shelf_height
+
+
+def build(subfolder) -> Atlas:
+    """Собирает атлас каталога из отдельных картинок и сохраняет его на диск"""
+    sources = __sources(subfolder)
+    images = {name: pygame.image.load(path.join(IMAGES_FOLDER, subfolder, name)) for name in sources}
+    index, height = pack({name: img.get_size() for name, img in images.items()})
+
+    surface = pygame.Surface((max([1] + [r[0] + r[2] for r in index.values()]), max(height, 1)), pygame.SRCALPHA)
+    for name, img in images.items():
+        surface.blit(img, index[name][0:2])
+
+    makedirs(ATLAS_FOLDER, exist_ok=True)
+    pygame.image.save(surface, path.join(ATLAS_FOLDER, subfolder + ".png"))
+    with open(path.join(ATLAS_FOLDER, subfolder + ".json"), "w") as index_file:
+        json.dump({"sources": sources, "index": index}, index_file, indent='\t')
+
+    return Atlas(surface, index)
+
+
+def load(subfolder) -> Atlas:
+    """Загружает атлас каталога с диска. Если атласа нет, или он устарел, атлас пересобирается."""
+    try:
+        with open(path.join(ATLAS_FOLDER, subfolder + ".json"), "r") as index_file:
+            description = json.load(index_file)
+        if description["sources"] != __sources(subfolder):
+            return build(subfolder)
+        surface = pygame.image.load(path.join(ATLAS_FOLDER, subfolder + ".png"))
+    except (OSError, ValueError, KeyError, pygame.error):
+        return build(subfolder)
+
+    return Atlas(surface, description["index"])
+
+
+def get_atlas(subfolder) -> Atlas:
+    """Атлас каталога. Загружается один раз за всё время работы программы.
+        Если каталог не упаковывается в атлас, возвращает None."""
+    if subfolder not in CC.ATLAS_FOLDERS:
+        return None
+    atlas = __atlases.get(subfolder)
+    if atlas is None:
+        atlas = __atlases[subfolder] = load(subfolder)
+        if pygame.display.get_surface() is not None:
+            atlas.surface = atlas.surface.convert_alpha()
+    return atlas
+
+
+if __name__ == "__main__":
+    for folder in CC.ATLAS_FOLDERS:
+        packed = build(folder)
+        print(f"{folder}: {len(packed.index)} frames, {packed.surface.get_width()}x{packed.surface.get_height()}")
@@ -0,0 +1,522 @@
+""" Пакетный движок: много независимых игр одновременно.
+ Состояние всех игр хранится в общих массивах NumPy (карты, сокровища, игроки, монстры, таймеры
+ зарастания ям), и каждый тик выполняется набором операций над массивами сразу для всех игр,
+ без объектов уровня и персонажей на каждую игру. Нужен для массовых прогонов: обучение агентов,
+ оценка сложности уровней.
+
+ Правила те же, что в Level.update: падение и ходьба (Character.fall, Character.move), рытьё
+ (Player.move), сбор сокровищ и выход, смертельные блоки, зарастание ям, погоня монстров по полю
+ расстояний (Beast.move, модуль navigation). Монстры одной игры ходят по очереди, как в Level.update --
+ цикл идёт по номеру монстра, а все игры обрабатываются разом.
+
+ Единственное отличие -- источник случайных чисел. Случайная длина блуждания монстров (Beast.range)
+ берётся из общего генератора NumPy, а не из генератора уровня, поэтому с одним зерном блуждания
+ не совпадут с engine.py. Все остальные ходы те же.
+
+ Клетки, как и в navigation, -- упакованные в число позиции уровня (см. Level.cell). Карты всех игр лежат
+ в одном массиве, поэтому уровни -- только стандартного размера CC.LEVEL_WIDTH x CC.LEVEL_HEIGHT.
+ Шаг -- шаг игрока (CC.STEP тиков). Тики, где ничего не происходит, пропускаются (см. Level.quiet_ticks).
+
+ Прогон случайных действий: python batch.py [уровни или каталоги ...] [--games N] [--steps N] [--seed S]
+"""
+
+import argparse
+import time
+from os import path
+from collections import Counter
+import numpy as np
+import CC
+import navigation
+import engine
+import solver
+import env
+from env import ACTION_NAMES
+from horde import DIRECTION_CODES, ANTIDIRECTION
+
+NO_EVENT = np.iinfo(np.int64).max
+"""Тик зарастания, если зарастать нечему"""
+
+
+class LevelTemplate:
+    """Исходное состояние уровня в виде массивов. Из него начинаются игры этого уровня"""
+
+    def __init__(self, game_field):
+        self.grid = game_field.grid.ravel().copy()
+        self.exit = game_field.exit.ravel().copy()
+        """Слой выхода. Где он не пуст, после сбора сокровищ карта заменяется им"""
+
+        self.treasure = np.zeros(self.grid.size, dtype=bool)
+        self.treasure[list(game_field.treasures)] = True
+        self.treasures_count = game_field.treasures_count
+
+        self.deadly = np.zeros(self.grid.size, dtype=bool)
+        self.deadly[list(game_field.deadly)] = True
+
+        self.player = game_field.cell(game_field.player.pos)
+        self.beasts = [game_field.cell(beast.pos) for beast in game_field.beasts]
+        self.spawn = [game_field.cell(beast.spawn_pos) for beast in game_field.beasts]
+        self.range = [beast.range for beast in game_field.beasts]
+        self.idioticy = [beast.idioticy for beast in game_field.beasts]
+        self.direction = [DIRECTION_CODES[beast.move_direction] for beast in game_field.beasts]
+
+        self.distance = game_field.navigation.table.distance
+        """Таблица расстояний исходной карты (см. navigation.DistanceTable)"""
+
+        self.crack_lifetime = game_field.player.cracked_block.lifetime()
+        """Сколько тиков живёт вырытая яма, считая тик рытья"""
+
+
+class BatchEngine:
+    """Набор из count независимых игр, работающих в ногу. Управление -- через step()"""
+
+    def __init__(self, count, seed=None, game=None):
+        self.game = engine.Engine() if game is None else game
+        """Движок, которым читаются файлы уровней"""
+
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.stride = CC.LEVEL_WIDTH + 2
+        self.cells = (CC.LEVEL_HEIGHT + 2) * self.stride
+        self.trait_table = np.array(CC.BLOCK_TRAITS, dtype=np.uint16)
+        self.empty = CC.BLOCK_IDS[CC.EMPTY_BLOCK]
+
+        self.templates = list()
+        """Исходные состояния загруженных уровней (LevelTemplate)"""
+
+        self.level = np.zeros(count, dtype=np.intp)
+        """Номер уровня (в templates) каждой игры"""
+
+        self.deadly = np.zeros((0, self.cells), dtype=bool)
+        """Смертельные клетки уровней, по номерам уровней"""
+
+        self.crack_lifetime = np.zeros(0, dtype=np.int64)
+        """Время жизни ямы на уровнях, по номерам уровней"""
+
+        # Состояние уровней
+        self.grid = np.zeros((count, self.cells), dtype=np.uint8)
+        self.traits = np.zeros((count, self.cells), dtype=np.uint16)
+        """Маски свойств клеток карты. Обновляются вместе с grid"""
+        self.treasure = np.zeros((count, self.cells), dtype=bool)
+        self.treasures_count = np.zeros(count, dtype=np.int32)
+        self.exit_open = np.zeros(count, dtype=bool)
+        self.regrow_at = np.zeros((count, self.cells), dtype=np.int64)
+        """Тик зарастания вырытой клетки, 0 -- клетка не вырыта"""
+        self.underlay = np.zeros((count, self.cells), dtype=np.uint8)
+        """Блок, который вернётся на место вырытой клетки"""
+        self.regrow_next = np.full(count, NO_EVENT, dtype=np.int64)
+        """Ближайший тик зарастания в каждой игре"""
+        self.dug = np.zeros(count, dtype=np.int32)
+        """Сколько вырытых клеток ещё не заросло. Если ни одной и выхода нет, карта совпадает с исходной"""
+        self.revision = np.zeros(count, dtype=np.int64)
+        """Счётчик изменений карты, как Level.revision"""
+
+        # Персонажи
+        self.player = np.zeros(count, dtype=np.intp)
+        self.beasts = np.zeros((count, 0), dtype=np.intp)
+        self.spawn = np.zeros((count, 0), dtype=np.intp)
+        self.alive = np.zeros((count, 0), dtype=bool)
+        """Есть ли монстр с этим номером в игре. У уровней с меньшим числом монстров лишние выключены"""
+        self.range = np.zeros((count, 0), dtype=np.int8)
+        self.idioticy = np.zeros((count, 0), dtype=np.int8)
+        self.direction = np.zeros((count, 0), dtype=np.int8)
+        self.occupied = np.zeros((count, self.cells), dtype=np.int16)
+        """Число монстров в клетке (см. level.Occupancy)"""
+
+        # Поле расстояний до игрока для монстров, своё у каждой игры (см. navigation.FlowField)
+        self.flow = np.zeros((count, self.cells), dtype=np.uint16)
+        self.flow_target = np.full(count, -1, dtype=np.intp)
+        self.flow_revision = np.full(count, -1, dtype=np.int64)
+
+        self.ticks = np.zeros(count, dtype=np.int64)
+        self.result = np.zeros(count, dtype=np.uint8)
+        """Статус каждой игры (CC.GAME_OVER_*). Закончившиеся игры не меняются до reset"""
+
+        stride = self.stride
+        self.action_move = np.array([{"left": -1, "right": 1, "up": -stride, "down": stride}.get(name, 0)
+                                     for name in ACTION_NAMES], dtype=np.intp)
+        """Смещение клетки для действий перемещения (env.ACTION_NAMES), 0 -- не перемещение"""
+        self.action_dig = np.array([{"dig_left": -1, "dig_right": 1}.get(name, 0) for name in ACTION_NAMES],
+                                   dtype=np.intp)
+        """Сторона рытья для действий рытья, 0 -- не рытьё"""
+        self.direction_move = np.array((0, -stride, stride, -1, 1), dtype=np.intp)
+
+    def load(self, levels, seed=0):
+        """Загрузка уровней и начало всех игр. levels -- файл уровня или список файлов,
+            игра i получает уровень levels[i % len(levels)]. seed -- зерно уровня при чтении (см. Level.load),
+            от него зависит начальная длина блуждания монстров"""
+        levels = [levels] if isinstance(levels, str) else list(levels)
+        self.templates.clear()
+        for filename in levels:
+            self.game.load(filename, seed)
+            if self.game.level.grid.size != self.cells:
+                raise ValueError(f"{filename}: batch runs only {CC.LEVEL_WIDTH}x{CC.LEVEL_HEIGHT} levels")
+            self.templates.append(LevelTemplate(self.game.level))
+        self.level = np.arange(self.count) % len(levels)
+        self.deadly = np.stack([template.deadly for template in self.templates])
+        self.crack_lifetime = np.array([template.crack_lifetime for template in self.templates])
+
+        width = max(len(template.beasts) for template in self.templates)
+        for name in ("beasts", "spawn", "alive", "range", "idioticy", "direction"):
+            setattr(self, name, np.zeros((self.count, width), dtype=getattr(self, name).dtype))
+        self.reset()
+
+    def reset(self, games=None):
+        """Начало заново игр games (номера или маска), по умолчанию всех"""
+        games = np.arange(self.count) if games is None else np.asarray(games)
+        if games.dtype == bool:
+            games = np.flatnonzero(games)
+        for number, template in enumerate(self.templates):
+            chosen = games[self.level[games] == number]
+            if not chosen.size:
+                continue
+            self.grid[chosen] = template.grid
+            self.treasure[chosen] = template.treasure
+            self.treasures_count[chosen] = template.treasures_count
+            self.player[chosen] = template.player
+
+            beasts = len(template.beasts)
+            self.alive[chosen] = False
+            self.alive[chosen, :beasts] = True
+            self.beasts[chosen, :beasts] = template.beasts
+            self.spawn[chosen, :beasts] = template.spawn
+            self.range[chosen, :beasts] = template.range
+            self.idioticy[chosen, :beasts] = template.idioticy
+            self.direction[chosen, :beasts] = template.direction
+
+        self.traits[games] = self.trait_table[self.grid[games]]
+        self.exit_open[games] = False
+        self.regrow_at[games] = 0
+        self.regrow_next[games] = NO_EVENT
+        self.dug[games] = 0
+        self.revision[games] += 1
+        self.occupied[games] = 0
+        for number in range(self.beasts.shape[1]):
+            chosen = games[self.alive[games, number]]
+            self.occupied[chosen, self.beasts[chosen, number]] += 1
+        self.ticks[games] = 0
+        self.result[games] = CC.GAME_OVER_NOT_OVER
+
+    def step(self, actions) -> np.ndarray:
+        """Один шаг игрока во всех продолжающихся играх. actions -- номера действий (env.ACTION_NAMES)
+            по играм. Возвращает статусы игр"""
+        actions = np.asarray(actions)
+        ticks = self.ticks.copy()
+        outcome = np.zeros(self.count, dtype=np.uint8)
+        offset = self.next_offset(ticks, -1)
+        while offset < CC.STEP:
+            live = np.flatnonzero(self.result == CC.GAME_OVER_NOT_OVER)
+            clock = ticks[live] + offset
+            self.ticks[live] = clock + 1
+            outcome[live] = CC.GAME_OVER_NOT_OVER
+            self.move_player(live[clock % CC.STEP == 0], actions, outcome)
+            self.regrow(live[self.regrow_next[live] == clock + 1], outcome)
+            self.move_beasts(live[(clock % CC.BEAST_STEP == 0) & self.alive[live].any(axis=1)], outcome)
+            self.result[live] = outcome[live]
+            offset = self.next_offset(ticks, offset)
+
+        live = self.result == CC.GAME_OVER_NOT_OVER
+        self.ticks[live] = ticks[live] + CC.STEP
+        return self.result
+
+    def next_offset(self, ticks, offset) -> int:
+        """Ближайший после offset тик шага, на котором хоть в одной продолжающейся игре что-то происходит:
+            ходит игрок, ходят монстры или зарастает яма. Остальные тики пропускаются.
+            ticks -- номера тиков игр в начале шага. CC.STEP, если до конца шага таких тиков нет"""
+        live = self.result == CC.GAME_OVER_NOT_OVER
+        if not live.any():
+            return CC.STEP
+        clock = ticks[live] + offset + 1
+        upcoming = min(int(((-clock) % CC.STEP).min()), int((self.regrow_next[live] - clock - 1).min()))
+        if self.alive.any():
+            upcoming = min(upcoming, int(((-clock) % CC.BEAST_STEP).min()))
+        return offset + 1 + upcoming
+
+    def change(self, games, cells, blocks):
+        """Замена блоков в клетках cells игр games. Пары (игра, клетка) не должны повторяться"""
+        self.grid[games, cells] = blocks
+        self.traits[games, cells] = self.trait_table[blocks]
+        np.add.at(self.revision, games, 1)
+
+    def move_player(self, games, actions, outcome):
+        """Ход игрока (Player.move) и его последствия: сокровища, выход, смертельные блоки"""
+        if not games.size:
+            return
+        stride = self.stride
+        traits, occupied = self.traits, self.occupied
+        start = self.player[games]
+        supported = (traits[games, start + stride] & CC.TRAIT_SUPPORT) | (traits[games, start] & CC.TRAIT_CARRY) | \
+            occupied[games, start + stride]
+        supported = supported != 0
+        eaten = supported & (occupied[games, start] != 0)
+        acting = supported & ~eaten
+
+        # Рытьё: рядом пусто, под этой клеткой -- разрушаемый блок
+        side = self.action_dig[actions[games]]
+        dig = acting & (side != 0)
+        dig[dig] &= (self.grid[games[dig], start[dig] + side[dig]] == self.empty) & \
+            ((traits[games[dig], start[dig] + stride + side[dig]] & CC.TRAIT_DESTRUCTABLE) != 0)
+        if dig.any():
+            self.dig(games[dig], start[dig] + stride + side[dig])
+
+        disp = self.action_move[actions[games]]
+        target = start + disp
+        moving = acting & (disp != 0) & ((traits[games, target] & CC.TRAIT_SOLID) == 0) & \
+            (occupied[games, target] == 0) & ((disp != -stride) | ((traits[games, start] & CC.TRAIT_CLIMB) != 0))
+        self.player[games] = np.where(supported, np.where(moving, target, start), start + stride)
+
+        # Сокровище, выход и смертельный блок проверяются в клетке, где игрок был в начале хода
+        collected = ~eaten & self.treasure[games, start]
+        if collected.any():
+            found = games[collected]
+            self.treasure[found, start[collected]] = False
+            self.treasures_count[found] -= 1
+            self.open_exit(found[self.treasures_count[found] <= 0])
+
+        result = np.where(eaten, CC.GAME_OVER_EATEN, CC.GAME_OVER_NOT_OVER)
+        result = np.where(start < 2 * stride, CC.GAME_OVER_COMPLETE, result)
+        result = np.where(self.deadly[self.level[games], start], CC.GAME_OVER_KILLED, result)
+        outcome[games] = result
+
+    def dig(self, games, cells):
+        """Яма в клетках cells. Блок зарастёт через время жизни ямы (см. Level.add_temporary)"""
+        self.underlay[games, cells] = self.grid[games, cells]
+        self.change(games, cells, np.full(games.size, self.empty, dtype=np.uint8))
+        lifetime = self.crack_lifetime[self.level[games]]
+        regrow = np.where(lifetime > 0, self.ticks[games] + lifetime - 1, 0)
+        self.regrow_at[games, cells] = regrow
+        self.regrow_next[games] = np.minimum(self.regrow_next[games], np.where(regrow, regrow, NO_EVENT))
+        self.dug[games] += 1
+
+    def open_exit(self, games):
+        """Все сокровища собраны -- на карту накладывается выход (см. Level.show_exit)"""
+        for game in games.tolist():
+            exit_layer = self.templates[self.level[game]].exit
+            cells = np.flatnonzero(exit_layer != self.empty)
+            self.change(np.full(cells.size, game), cells, exit_layer[cells])
+            self.exit_open[game] = True
+
+    def regrow(self, games, outcome):
+        """Зарастание ям (Level.regrow): игрок в яме застревает, монстры в ней гибнут"""
+        if not games.size:
+            return
+        rows, cells = np.nonzero(self.regrow_at[games] == self.ticks[games, None])
+        found = games[rows]
+        stuck = self.player[found] == cells
+        outcome[found[stuck]] = CC.GAME_OVER_STUCK
+        # Если в яме игрок, монстры в ней остаются (см. TemporaryBlock.is_killing)
+        for number in range(self.beasts.shape[1]):
+            killed = ~stuck & self.alive[found, number] & (self.beasts[found, number] == cells)
+            self.kill(found[killed], number)
+
+        self.change(found, cells, self.underlay[found, cells])
+        self.regrow_at[found, cells] = 0
+        np.subtract.at(self.dug, found, 1)
+        pending = self.regrow_at[games]
+        self.regrow_next[games] = np.where(pending, pending, NO_EVENT).min(axis=1)
+
+    def kill(self, games, number):
+        """Гибель монстров number в играх games: они возрождаются на месте рождения (Beast.die)"""
+        if not games.size:
+            return
+        np.subtract.at(self.occupied, (games, self.beasts[games, number]), 1)
+        self.beasts[games, number] = self.spawn[games, number]
+        np.add.at(self.occupied, (games, self.beasts[games, number]), 1)
+
+    def update_flow(self, games):
+        """Поля расстояний до игрока (navigation.FlowField.update). Пока карта совпадает с исходной, поле
+            берётся из таблицы расстояний, иначе считается поиском в ширину сразу для всех игр"""
+        targets = self.player[games]
+        stale = (self.flow_target[games] != targets) | (self.flow_revision[games] != self.revision[games])
+        games, targets = games[stale], targets[stale]
+        if not games.size:
+            return
+        self.flow_target[games] = targets
+        self.flow_revision[games] = self.revision[games]
+
+        static = (self.dug[games] == 0) & ~self.exit_open[games]
+        for number, template in enumerate(self.templates):
+            chosen = static & (self.level[games] == number)
+            self.flow[games[chosen]] = template.distance[targets[chosen]]
+        if not static.all():
+            self.flow[games[~static]] = self.bfs(games[~static], targets[~static])
+
+    def bfs(self, games, targets) -> np.ndarray:
+        """Поиск в ширину по графу перемещений (navigation.build_moves) сразу для нескольких игр.
+            Карты игр уложены подряд в один плоский массив, обход идёт слоями по всем играм вместе"""
+        stride = self.stride
+        traits = self.traits[games].ravel()
+        size = traits.size
+        free = (traits & CC.TRAIT_SOLID) == 0
+        supported = (traits & CC.TRAIT_CARRY) != 0
+        supported[:-stride] |= (traits[stride:] & CC.TRAIT_SUPPORT) != 0
+
+        def neighbour(values, disp):
+            """Значения values в соседних клетках со смещением disp. Рамка уровня не даёт выйти в соседнюю игру"""
+            res = np.zeros(size, dtype=bool)
+            if disp > 0:
+                res[:-disp] = values[disp:]
+            else:
+                res[-disp:] = values[:disp]
+            return res
+
+        # Из клетки можно шагнуть в соседнюю (см. navigation.cell_moves)
+        up = free & supported & ((traits & CC.TRAIT_CLIMB) != 0) & neighbour(free, -stride)
+        down = free & (~supported | neighbour(free, stride))
+        left = free & supported & neighbour(free, -1)
+        right = free & supported & neighbour(free, 1)
+
+        distance = np.full(size, navigation.UNREACHABLE, dtype=np.uint16)
+        layer = np.arange(games.size) * self.cells + targets
+        distance[layer] = 0
+        order = np.zeros(size, dtype=np.intp)
+        step = 0
+        while layer.size:
+            step += 1
+            sources = np.concatenate((layer[up[layer + stride]] + stride, layer[down[layer - stride]] - stride,
+                                      layer[left[layer + 1]] + 1, layer[right[layer - 1]] - 1))
+            sources = sources[distance[sources] == navigation.UNREACHABLE]
+            distance[sources] = step
+            # Клетка может прийти от нескольких соседей -- оставляем одну копию
+            order[sources] = np.arange(sources.size)
+            layer = sources[order[sources] == np.arange(sources.size)]
+        return distance.reshape(games.size, self.cells)
+
+    def move_beasts(self, games, outcome):
+        """Ходы монстров (Beast.move) по очереди их номеров, во всех играх games сразу"""
+        if not games.size:
+            return
+        stride = self.stride
+        traits, occupied = self.traits, self.occupied
+        player = self.player[games]
+
+        # Поле расстояний нужно только там, где хоть один монстр будет выбирать путь
+        beasts = self.beasts[games]
+        thinking = self.alive[games] & (self.idioticy[games] == 0) & (beasts != player[:, None]) & \
+            (((traits[games[:, None], beasts + stride] & CC.TRAIT_SUPPORT) |
+              (traits[games[:, None], beasts] & CC.TRAIT_CARRY)) != 0)
+        self.update_flow(games[thinking.any(axis=1)])
+        flow = self.flow
+
+        for number in range(self.beasts.shape[1]):
+            alive = self.alive[games, number]
+            current, current_player = games[alive], player[alive]
+            start = self.beasts[current, number]
+            pos = start.copy()
+            here = traits[current, start]
+
+            falling = ((traits[current, start + stride] & CC.TRAIT_SUPPORT) | (here & CC.TRAIT_CARRY)) == 0
+            pos[falling] += stride
+            direction = self.direction[current, number]
+            direction[falling] = 0
+
+            eaten = ~falling & (start == current_player)
+            outcome[current[eaten]] = CC.GAME_OVER_EATEN
+            acting = ~falling & ~eaten
+            climb = (here & CC.TRAIT_CLIMB) != 0
+            moved = np.zeros(current.size, dtype=bool)
+
+            def try_move(mask, disp, obstacles=True):
+                """Character.move для монстров из mask. Возвращает маску успешных ходов"""
+                target = start + disp
+                ok = mask & (disp != 0) & ((traits[current, target] & CC.TRAIT_SOLID) == 0) & \
+                    ((disp != -stride) | climb)
+                if obstacles:
+                    ok &= occupied[current, target] == 0
+                pos[ok] = target[ok]
+                return ok
+
+            think = acting & (self.idioticy[current, number] == 0)
+            if think.any():
+                self.range[current[think], number] = self.rng.integers(0, 4, size=np.count_nonzero(think))
+
+                # Ход по полю расстояний (navigation.next_move): первый по порядку строго ближний свободный
+                best = flow[current, start]
+                choice = np.zeros(current.size, dtype=np.int8)
+                for code in (1, 2, 3, 4):
+                    target = start + self.direction_move[code]
+                    distance = flow[current, target]
+                    ok = think & (distance < best) & ((traits[current, target] & CC.TRAIT_SOLID) == 0) & \
+                        (occupied[current, target] == 0) & ((code != 1) | climb)
+                    best = np.where(ok, distance, best)
+                    choice[ok] = code
+                moved = try_move(think & (choice != 0), self.direction_move[choice])
+                direction[moved] = choice[moved]
+
+                # Пути нет -- напрямую к игроку: сначала по вертикали, потом по горизонтали
+                player_row, player_col = np.divmod(current_player, stride)
+                row, col = np.divmod(start, stride)
+                for disp, codes in ((np.sign(player_row - row) * stride, (1, 0, 2)),
+                                    (np.sign(player_col - col), (3, 0, 4))):
+                    ok = try_move(think & ~moved, disp)
+                    direction[ok] = np.take(codes, np.sign(disp[ok]) + 1)
+                    moved |= ok
+
+            wander = acting & ~moved
+            if not CC.BEAST_WANDER:
+                direction[wander] = 0
+            elif wander.any():
+                idioticy = self.idioticy[current, number]
+                idioticy[wander] = ((idioticy + 1) * (idioticy < self.range[current, number]))[wander]
+                self.idioticy[current, number] = idioticy
+
+                # Продолжаем идти, куда шли, а упёршись -- поворачиваем назад
+                going = wander & (direction != 0)
+                ahead = try_move(going, self.direction_move[direction])
+                turned = going & ~ahead
+                direction[turned] = ANTIDIRECTION[direction[turned]]
+                back = try_move(turned, self.direction_move[direction], obstacles=False)
+                direction[turned & ~back] = 0
+
+            # Смертельный блок проверяется в клетке, где монстр был в начале хода
+            dead = ~eaten & self.deadly[self.level[current], start]
+            pos[dead] = self.spawn[current[dead], number]
+
+            self.direction[current, number] = direction
+            occupied[current, start] -= 1
+            occupied[current, pos] += 1
+            self.beasts[current, number] = pos
+
+    def observe(self, out=None) -> np.ndarray:
+        """Наблюдения всех игр в формате env.LodeRunnerEnv, формы (count, каналы, высота, ширина).
+            out -- заранее выделенный массив для них"""
+        shape = (self.count, env.OBSERVATION_CHANNELS, CC.LEVEL_HEIGHT, CC.LEVEL_WIDTH)
+        out = np.zeros(shape, dtype=np.uint8) if out is None else out
+        grid_shape = (self.count, CC.LEVEL_HEIGHT + 2, self.stride)
+        np.copyto(out[:, env.BLOCKS_CHANNEL], self.grid.reshape(grid_shape)[:, 1:-1, 1:-1])
+        np.copyto(out[:, env.TREASURES_CHANNEL], self.treasure.reshape(grid_shape)[:, 1:-1, 1:-1])
+
+        games = np.arange(self.count)
+        for channel, cells, present in ((env.PLAYER_CHANNEL, self.player[:, None], np.ones((self.count, 1), bool)),
+                                        (env.BEASTS_CHANNEL, self.beasts, self.alive)):
+            out[:, channel] = 0
+            rows, cols = np.divmod(cells, self.stride)
+            chosen = games[:, None].repeat(cells.shape[1], axis=1)[present]
+            out[chosen, channel, rows[present] - 1, cols[present] - 1] = 1
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched LodeRunner random rollouts")
+    parser.add_argument("levels", nargs="*", default=[path.join(path.dirname(path.abspath(__file__)), "Levels")],
+                        help="level files or folders, Levels by default")
+    parser.add_argument("--games", type=int, default=1000, help="games per level run in lockstep")
+    parser.add_argument("--steps", type=int, default=300, help="player steps per game")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    batch = BatchEngine(args.games, args.seed)
+    rng = np.random.default_rng(args.seed)
+    total_steps, total_time = 0, 0.0
+    for filename in solver.level_files(args.levels):
+        batch.load(filename, args.seed)
+        started = time.perf_counter()
+        for _ in range(args.steps):
+            running = np.count_nonzero(batch.result == CC.GAME_OVER_NOT_OVER)
+            if not running:
+                break
+            total_steps += running
+            batch.step(rng.integers(len(ACTION_NAMES), size=args.games))
+        total_time += time.perf_counter() - started
+        results = Counter(engine.RESULT_NAMES[result] for result in batch.result.tolist())
+        print(f"{path.basename(filename)}: " + ", ".join(f"{name} {count}" for name, count in sorted(results.items())))
+    print(f"{total_steps} game steps in {total_time:.2f}s ({total_steps / max(total_time, 1e-9):.0f} steps/s)")
@@ -3,7 +3,17 @@
  Плюс, класс анимированных, но статичных спрайтов.
  И класс временных анимированных спрайтов. С их помощью подсвечиваются различные события уровня.
 
- V 2.1
+ V 2.5
+
+ 2.5 Анимация блока, который какое-то время не рисовался (был за краем экрана), догоняет пропущенное время
+     за один вызов get_image, без перебора всех пропущенных кругов анимации
+
+ 2.4 Время жизни временного блока известно заранее (TemporaryBlock.lifetime)
+
+ 2.3 Картинки каталогов, упакованных в атласы, берутся из атласа (см. модуль atlas)
+
+ 2.2 Общий кэш картинок. Каждый кадр загружается с диска один раз за всю игру,
+     все блоки и персонажи используют одни и те же поверхности
 
  2.1 Реализован класс Button
 
@@ -11,8 +21,65 @@
 """
 
 from os import path
+from math import ceil
 import pygame
 import CC
+import atlas
+
+IMAGES_FOLDER = path.join(path.dirname(__file__), "images")
+"""Корневой каталог картинок игры"""
+
+HEADLESS = False
+"""Режим без графики. Картинки не загружаются, вместо каждой используется заглушка размером в блок"""
+
+__images_cache = dict()
+"""Общий кэш картинок. Ключ -- (каталог, файл, отражение по x, отражение по y, масштаб),
+    либо (исходная картинка, отражение по x, отражение по y, масштаб) для преобразованных на лету.
+    Наборы кадров анимации хранятся здесь же, кортежами."""
+
+
+def load_image(img: str, subfolder="", xflip=False, yflip=False, scale=1) -> pygame.Surface:
+    """Загрузка картинки через общий кэш. Если img -- None, возвращается заглушка размером в блок"""
+    key = (subfolder, img, xflip, yflip, scale)
+    image = __images_cache.get(key)
+    if image is None:
+        if xflip or yflip or scale != 1:
+            image = transform_image(load_image(img, subfolder), xflip, yflip, scale)
+        elif img is None:
+            image = pygame.Surface((CC.BLOCK_WIDTH, CC.BLOCK_WIDTH))
+            image.fill((255, 255, 0))
+        elif HEADLESS:
+            image = load_image(None)
+        else:
+            sprites = atlas.get_atlas(subfolder)
+            image = sprites.get(img) if sprites is not None and img in sprites else \
+                pygame.image.load(path.join(IMAGES_FOLDER, subfolder, img)).convert_alpha()
+        __images_cache[key] = image
+    return image
+
+
+def transform_image(image: pygame.Surface, xflip=False, yflip=False, scale=1) -> pygame.Surface:
+    """Отражение и масштабирование уже загруженной картинки. Результат кэшируется по исходной картинке"""
+    if not (xflip or yflip or scale != 1):
+        return image
+
+    key = (image, xflip, yflip, scale)
+    transformed = __images_cache.get(key)
+    if transformed is None:
+        transformed = pygame.transform.flip(image, xflip, yflip)
+        if scale != 1:
+            transformed = pygame.transform.scale(transformed, [int(_ * scale) for _ in transformed.get_size()])
+        __images_cache[key] = transformed
+    return transformed
+
+
+def load_frames(files, subfolder="", xflip=False, yflip=False, scale=1) -> tuple:
+    """Загрузка кадров анимации. Для одинакового списка файлов всегда возвращается один и тот же кортеж кадров"""
+    key = (subfolder, tuple(files), xflip, yflip, scale)
+    frames = __images_cache.get(key)
+    if frames is None:
+        frames = __images_cache[key] = tuple(load_image(file, subfolder, xflip, yflip, scale) for file in files)
+    return frames
 
 
 class Block(pygame.sprite.Sprite):
@@ -22,29 +89,31 @@ class Block(pygame.sprite.Sprite):
         super().__init__()
         self.pos = [0, 0] if position is None else position
         self.oldpos = None
-        self.base_images_folder = path.join(path.dirname(__file__), "images", subfolder)
+        self.drawn_at = 0
+        """Тик анимации слоя уровня, по который продвинута анимация спрайта. Спрайты за краем экрана не рисуются,
+            а когда снова попадают на экран, их анимация догоняет пропущенное время (см. Level.show_animated)"""
+        self.base_images_folder = path.join(IMAGES_FOLDER, subfolder)
 
         if img is not None:
             if isinstance(img, str):
-                self.image = pygame.image.load(path.join(self.base_images_folder, img)).convert_alpha()
+                self.image = load_image(img, subfolder)
                 self.origin = img
             elif isinstance(img, Block):
                 self.image = img.image
                 self.origin = img.origin
         else:
-            self.image = pygame.Surface((CC.BLOCK_WIDTH, CC.BLOCK_WIDTH))
-            self.image.fill((255, 255, 0))
+            self.image = load_image(None)
             self.origin = "FAILSAFE"
 
         self.size = self.image.get_size()
         self.rect = self.image.get_rect(center=(self.size[0] / 2, self.size[1] / 2))
 
-    # TODO Реализовать масштабирование
     def copy(self, xflip=False, yflip=False, scale=1):
-        """Копирование текущего экземпляра в новый объект с возможностью отобразить зеркально."""
+        """Копирование текущего экземпляра в новый объект с возможностью отобразить зеркально и масштабировать.
+            Картинка не копируется -- все копии используют общую поверхность из кэша."""
         copied = Block(None, subfolder=path.basename(self.base_images_folder))
 
-        copied.image = (self.image.copy(), pygame.transform.flip(self.image, xflip, yflip))[xflip or yflip]
+        copied.image = transform_image(self.image, xflip, yflip, scale)
         copied.origin = self.origin
 
         return copied
@@ -60,8 +129,8 @@ class Block(pygame.sprite.Sprite):
         return self.oldpos[1] * CC.BLOCK_WIDTH + disp_x, self.oldpos[0] * CC.BLOCK_WIDTH + disp_y
 
     def show(self, canvas: pygame.Surface, pos: list):
-        """Рисование спрайта в заданных координатах сетки на заданной канве"""
-        canvas.blit(self.image, self.image.get_rect(topleft=(pos[1] * CC.BLOCK_WIDTH, pos[0] * CC.BLOCK_WIDTH)))
+        """Рисование спрайта в заданных координатах сетки на заданной канве. Возвращает изменённую область канвы"""
+        return canvas.blit(self.image, (pos[1] * CC.BLOCK_WIDTH, pos[0] * CC.BLOCK_WIDTH))
 
 
 class Button(Block):
@@ -76,7 +145,7 @@ class Button(Block):
         self.key = key
         if img[1] is not None:
             if isinstance(img[1], str):
-                self.images[1] = pygame.image.load(path.join(self.base_images_folder, img[1])).convert_alpha()
+                self.images[1] = load_image(img[1], subfolder)
             if isinstance(img[1], Block):
                 self.images[1] = img[1].image
 
@@ -86,8 +155,7 @@ class Button(Block):
     def copy(self, xflip=False, yflip=False, scale=1):
         copied = Button((None, None), subfolder=path.basename(self.base_images_folder))
 
-        copied.images = [pygame.transform.flip(self.images[0], xflip, yflip),
-                         pygame.transform.flip(self.images[1], xflip, yflip)] if xflip or yflip else self.images.copy()
+        copied.images = [transform_image(image, xflip, yflip, scale) for image in self.images]
 
         copied.pressed_state = self.pressed_state
         copied.origin = self.origin
@@ -113,7 +181,8 @@ class AnimatedBlock(Block):
     def __init__(self, img, position=None, subfolder="", animation_delay=0, animation_pause=0, hit_sound=None):
         self.delay = animation_delay
         self.pause = animation_pause
-        self.images = list()
+        self.images = tuple()
+        """Кадры анимации. Общий для всех однотипных блоков кортеж картинок из кэша"""
         self.single = True
         self.ticks = 0
         self.current_frame = 0
@@ -122,16 +191,26 @@ class AnimatedBlock(Block):
 
         super(AnimatedBlock, self).__init__(None, position, subfolder)
         if isinstance(img, (tuple, list)):
-            self.images = [Block(file, position, subfolder) for file in img]
+            self.images = load_frames(img, subfolder)
             self.single = False
 
-    def get_image(self, tick):
+    def get_image(self, tick, elapsed=1):
+        """Текущий кадр анимации. Перед этим анимация продвигается на elapsed тиков.
+            Тики, на которых кадр не меняется, пропускаются сразу, без перебора по одному."""
         if not self.single:
-            wait_for = (self.pause, self.delay)[self.in_action]
-
-            if self.ticks < wait_for:
-                self.ticks += 1
-            else:
+            # Анимация периодична: круг из всех кадров и паузы возвращает блок в то же состояние.
+            # Каждый кадр держится ceil(delay) + 1 тиков, пауза -- ceil(pause) + 1
+            elapsed %= len(self.images) * (ceil(self.delay) + 1) + ceil(self.pause) + 1
+            while elapsed > 0:
+                wait_for = (self.pause, self.delay)[self.in_action]
+
+                # Сколько тиков кадр ещё держится до смены
+                hold = max(0, ceil(wait_for - self.ticks))
+                if elapsed <= hold:
+                    self.ticks += elapsed
+                    break
+
+                elapsed -= hold + 1
                 self.ticks = 0
                 self.current_frame = 0 \
                     if self.current_frame >= len(self.images)-1 or not self.in_action else self.current_frame + 1
@@ -139,12 +218,12 @@ class AnimatedBlock(Block):
                 if not self.current_frame:
                     self.in_action = not self.in_action
 
-            return self.images[self.current_frame].image
+            return self.images[self.current_frame]
         else:
             return self.image
 
-    def show(self, canvas: pygame.Surface, tick):
-        canvas.blit(self.get_image(tick), self.get_screen_pos(tick=tick))
+    def show(self, canvas: pygame.Surface, tick, elapsed=1):
+        return canvas.blit(self.get_image(tick, elapsed), self.get_screen_pos(tick=tick))
 
     def copy(self, xflip=False, yflip=False, scale=1):
         copied = AnimatedBlock(None, self.pos, path.basename(self.base_images_folder),
@@ -160,9 +239,9 @@ class AnimatedBlock(Block):
         dst.origin = self.origin
 
         if self.single:
-            dst.image = (self.image.copy(), pygame.transform.flip(self.image, xflip, yflip))[xflip or yflip]
+            dst.image = transform_image(self.image, xflip, yflip, scale)
         else:
-            dst.images = [pict.copy(xflip, yflip, scale) for pict in self.images]
+            dst.images = tuple(transform_image(pict, xflip, yflip, scale) for pict in self.images)
 
         return dst
 
@@ -189,15 +268,33 @@ class TemporaryBlock(AnimatedBlock):
             тот блок, который перекрыт временным, а по смерти временного блока возвращается назад."""
         self.sound = sound
         self.images_end = None
+        self.last_image = None
+        """Кадр, показанный на последнем тике жизни блока"""
+        self.age = 0
+        """Сколько тиков блок уже прожил"""
+        self.kind = None
+        """Имя шаблона, копией которого создан блок. Нужно, чтобы воссоздать блок из снимка уровня"""
+        self.__lifetime = None
         img_start, img_end, *rest = img
 
         super().__init__(img_start, position, subfolder, animation_delay, animation_pause)
         self.origin = 'Animated: '+img_start[0] if img_start is not None else "EMPTY"
         if isinstance(img_end, (tuple, list)):
-            self.images_end = [Block(file, position, subfolder) for file in img_end]
+            self.images_end = load_frames(img_end, subfolder)
             self.origin += ' | ' + img_end[0]
 
-    def get_image(self, tick):
+    def get_image(self, tick, elapsed=1):
+        """Продвигает жизнь блока на elapsed тиков и возвращает текущий кадр.
+            Жизнь блока -- игровая логика, поэтому тики перебираются по одному."""
+        for _ in range(elapsed):
+            self.last_image = self.__next_image__(tick)
+        self.age += elapsed
+
+        if self.last_image is None:
+            return self.image if self.single else self.images[self.current_frame]
+        return self.last_image
+
+    def __next_image__(self, tick):
         if self.single:
             self.ticks += 1
             if self.ticks >= self.delay:
@@ -229,28 +326,43 @@ class TemporaryBlock(AnimatedBlock):
                     if not self.current_frame:
                         self.images, self.images_end = self.images_end, self.images
                         self.died = True
-                        return self.images_end[-1].image
+                        return self.images_end[-1]
 
-        return self.images[self.current_frame].image
+        return self.images[self.current_frame]
 
     def copy(self, xflip=False, yflip=False, scale=1):
         copied = TemporaryBlock((None, None), self.pos, path.basename(self.base_images_folder),
                                 animation_delay=self.delay, animation_pause=self.pause)
         self.__copy_body__(copied, xflip, yflip, scale)
         if self.images_end is not None:
-            copied.images_end = [pict.copy(xflip, yflip, scale) for pict in self.images_end]
+            copied.images_end = tuple(transform_image(pict, xflip, yflip, scale) for pict in self.images_end)
         copied.on_start = self.on_start
         copied.died = self.died
         copied.underlay = self.underlay
+        copied.kind = self.kind
+        copied.__lifetime = self.__lifetime
 
         return copied
 
+    def lifetime(self) -> int:
+        """Сколько тиков проживёт блок, начиная с текущего состояния, считая тик смерти.
+            Считается один раз прогоном копии блока, поэтому вызывать нужно до начала жизни блока.
+            Копии блока получают уже посчитанное значение, поэтому у шаблонов его нужно посчитать заранее."""
+        if self.__lifetime is None:
+            probe = self.copy()
+            self.__lifetime = 0
+            while not probe.died:
+                probe.__next_image__(0)
+                self.__lifetime += 1
+        return self.__lifetime
+
     # TODO Not all temporary blocks are so deadly. Do corresponding check here
-    def is_killing(self, player_pos: list, beasts: list):
-        """Проверяем, не зажало ли игрока или монстра зарастающей стеной"""
+    def is_killing(self, player_pos: list, beasts):
+        """Проверяем, не зажало ли игрока или монстра зарастающей стеной.
+            beasts -- индекс занятости клеток монстрами (level.Occupancy)"""
         if player_pos == self.pos:
             return False
-        for monster in beasts:
-            if monster.pos == self.pos:
-                monster.die()
+        for monster in list(beasts.at(self.pos)):
+            monster.die()
+            beasts.move(monster, self.pos)
         return True
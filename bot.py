@@ -0,0 +1,335 @@
+""" Бот -- игрок без человека.
+ Бот подключается вместо клавиатуры источником управления игрока (Player.controls) и на каждом шаге
+ выбирает клавиши сам: идёт к ближайшему сокровищу, а когда они собраны -- к верхнему ряду, где выход.
+ Путь ищется поиском в ширину по графу перемещений с рытьём (navigation.build_dig_moves) текущей карты,
+ поэтому там, где иначе не пройти, бот роет. Смертельные блоки и ямы, откуда не выбраться, он обходит всегда.
+ От монстров бот старается держаться: клетки ближе BEAST_MARGIN шагов к монстру и клетки, куда монстр успеет
+ раньше него, он обходит, если есть другой путь, а монстру, идущему по его ряду, роет яму навстречу.
+
+ Прогон на выносливость: python bot.py [уровни или каталоги ...] [--rounds N] [--hours H] [--steps N] [--seed S]
+ Все уровни проходятся по кругу без экрана, пока не пройдёт заданное число кругов или часов. Круг N играется
+ с зерном S + N, так что прогон повторяется в точности. Собирается доля пройденных уровней, тики на уровень,
+ причины поражений (CC.GAME_OVER_*) и скорость движка -- без учёта времени раздумий бота.
+ С --replays записи неудачных попыток сохраняются в указанный каталог -- их можно повторить replay.py.
+"""
+
+import argparse
+import json
+import random
+import time
+from types import SimpleNamespace
+from os import path
+from collections import Counter, deque
+from pygame.locals import *
+import CC
+import navigation
+from controls import KeyState, IDLE
+
+TIMEOUT = "TIMEOUT"
+"""Итог попытки, в которой уровень не пройден за отведённое число шагов"""
+
+STUCK_STEPS = 8
+"""Сколько шагов подряд бот может стоять в одной клетке, прежде чем сделать случайный ход"""
+
+__keys = {(0, -1): KeyState((K_LEFT, )),
+          (0, 1): KeyState((K_RIGHT, )),
+          (-1, 0): KeyState((K_UP, )),
+          (1, 0): KeyState((K_DOWN, )),
+          (1, -1): KeyState((K_q, )),
+          (1, 1): KeyState((K_w, )),
+          }
+"""Клавиши для смещения хода. Ход по диагонали вниз -- рытьё: по графу с рытьём в вырытый блок
+    попадают из клетки над соседним с ним"""
+
+TRAP_RANGE = 3
+"""На каком расстоянии по ряду бот роет яму навстречу монстру"""
+
+BEAST_MARGIN = 3
+"""Ближе скольких шагов к монстру бот не подходит, если может"""
+
+DISPLACEMENTS = tuple(__keys)
+"""Все смещения ходов. Из них выбирается случайный ход"""
+
+
+def keys_for(disp) -> KeyState:
+    return IDLE if disp is None else __keys[disp]
+
+
+def spread(graph: list, cells) -> list:
+    """Поиск в ширину сразу от нескольких клеток: число шагов по графу от ближайшей из cells до каждой клетки.
+        По обратному графу -- наоборот, от каждой клетки до ближайшей из cells"""
+    distance = [navigation.UNREACHABLE] * len(graph)
+    queue = deque(cells)
+    for cell in queue:
+        distance[cell] = 0
+    while queue:
+        cell = queue.popleft()
+        for target in graph[cell]:
+            if distance[target] == navigation.UNREACHABLE:
+                distance[target] = distance[cell] + 1
+                queue.append(target)
+    return distance
+
+
+class Bot:
+    """Источник управления игрока, играющий сам. Жадная стратегия: ближайшее сокровище, затем выход"""
+
+    def __init__(self, game_field, seed=0):
+        self.game_field = game_field
+        self.rng = random.Random(seed)
+        """Случайность бота -- для выхода из тупиков. Своя, чтобы не влиять на случайность уровня"""
+
+        self.revision = None
+        """Ревизия карты, по которой построены графы перемещений"""
+
+        self.graphs = list()
+        """Пары (прямой граф, обратный граф) перемещений с рытьём: сначала граф без цепочек вырытых блоков,
+            по нему бот ходит, пока цель достижима, затем с цепочками (см. navigation.build_dig_moves)"""
+
+        self.beast_moves = list()
+        self.beast_sources = list()
+        """Прямой и обратный графы перемещений без рытья. Так ходят монстры"""
+
+        self.doomed = set()
+        """Клетки, попав в которые, игрок погибает в смертельном блоке"""
+
+        self.trapped = list()
+        """Для каждого графа из graphs -- клетки, откуда по нему не добраться до верхнего ряда: ямы
+            и замкнутые карманы. Попав туда, игрок ждёт, пока его замурует"""
+
+        self.last_cell = None
+        self.idle_steps = 0
+        """Сколько шагов подряд игрок не покидал клетку"""
+
+        self.thinking = 0.0
+        """Время, потраченное ботом на выбор ходов, секунды"""
+
+    def update_graph(self):
+        if self.revision != self.game_field.revision:
+            self.graphs = [(moves, navigation.reverse_moves(moves))
+                           for moves in (navigation.build_dig_moves(self.game_field, chained)
+                                         for chained in (False, True))]
+            self.beast_moves = navigation.build_moves(self.game_field)
+            self.beast_sources = navigation.reverse_moves(self.beast_moves)
+            self.revision = self.game_field.revision
+
+            # Смертельные клетки и клетки, откуда в них падают. Падение идёт только вниз,
+            # поэтому клетки перебираются снизу вверх
+            moves, stride = self.graphs[0][0], self.game_field.stride
+            self.doomed = set(self.game_field.deadly)
+            for cell in range(len(moves) - 1, -1, -1):
+                if moves[cell] == [cell + stride] and cell + stride in self.doomed:
+                    self.doomed.add(cell)
+
+            # Выбраться можно и по лестнице выхода, которая появится, когда сокровища собраны. Ямы зарастут,
+            # и отрезанное ими снова станет достижимо, а в самой яме граф с рытьём ходит, как из вырытой
+            game_field = self.game_field
+            grid = game_field.grid.copy()
+            grid.flat[game_field.exit_cells] = game_field.exit.flat[game_field.exit_cells]
+            for temp in game_field.temporary_items:
+                if temp.underlay is not None:
+                    grid[temp.pos[0] + 1, temp.pos[1] + 1] = CC.BLOCK_IDS[temp.underlay]
+            opened = SimpleNamespace(grid=grid, stride=stride, trait_table=game_field.trait_table)
+            self.trapped = list()
+            for chained in (False, True):
+                escape = spread(navigation.reverse_moves(navigation.build_dig_moves(opened, chained)),
+                                range(stride + 1, 2 * stride - 1))
+                self.trapped.append({cell for cell, steps in enumerate(escape) if steps == navigation.UNREACHABLE})
+
+    def targets(self) -> list:
+        """Клетки, куда надо попасть: сокровища, а если они собраны -- верхний ряд"""
+        if self.game_field.treasures:
+            return list(self.game_field.treasures)
+        stride = self.game_field.stride
+        return list(range(stride + 1, 2 * stride - 1))
+
+    def beast_distance(self) -> list:
+        """Число шагов от ближайшего монстра до каждой клетки. Считается по графу с рытьём: монстры рыть
+            не умеют, но проваливаются в ямы, выбираются из них и ходят по головам застрявших. Так расстояние
+            выходит не больше настоящего, а бот осторожнее"""
+        return spread(self.graphs[1][0], self.game_field.occupancy.cells)
+
+    def trap(self):
+        """Смещение рытья навстречу монстру, который идёт по тому же ряду и вот-вот подойдёт. Или None"""
+        game_field = self.game_field
+        row, col = game_field.player.pos
+        for beast in game_field.beasts:
+            side = (beast.pos[1] > col) - (beast.pos[1] < col)
+            if beast.pos[0] == row and 1 < abs(beast.pos[1] - col) <= TRAP_RANGE and \
+                    game_field[(row, col + side)] == CC.EMPTY_BLOCK and \
+                    game_field.traits((row + 1, col + side)) & CC.TRAIT_DESTRUCTABLE:
+                return 1, side
+        return None
+
+    def plan(self):
+        """Смещение хода по кратчайшему пути к ближайшей цели, или None, если ходить незачем.
+            Смертельные блоки, падение в них и клетки, откуда не выбраться, обходятся всегда. Клетки,
+            куда монстр успеет раньше, чем игрок их покинет, и клетки ближе BEAST_MARGIN шагов от монстра
+            обходятся, если есть другой путь. Если его нет, бот отходит в достижимую клетку подальше
+            от монстров, а если отходить некуда -- идёт к цели напрямик."""
+        self.update_graph()
+        stride = self.game_field.stride
+        cell = self.game_field.cell(self.game_field.player.pos)
+        targets = self.targets()
+        target = None
+        for (moves, sources), trapped in zip(self.graphs, self.trapped):
+            avoided = self.doomed | trapped
+            reachable = navigation.bfs(moves, cell, avoided)
+            target = min(targets, key=reachable.__getitem__)
+            if reachable[target] != navigation.UNREACHABLE:
+                break
+
+        beast_distance = self.beast_distance()
+        blocked = avoided | {_ for _, steps in enumerate(beast_distance)
+                             if steps < BEAST_MARGIN or steps * CC.BEAST_STEP <= (reachable[_] + 1) * CC.STEP}
+        blocked.discard(cell)
+        safe = navigation.bfs(moves, cell, blocked)
+        safe_target = min(targets, key=safe.__getitem__)
+        if safe[safe_target] != navigation.UNREACHABLE:
+            return navigation.next_move(moves, navigation.bfs(sources, safe_target, blocked), cell, stride)
+
+        # Цель сейчас не достать -- отходим подальше от монстров в клетку, откуда можно вернуться без рытья.
+        # Иначе бот прячется в ямы, где его и замуровывает
+        back = navigation.bfs(self.beast_sources, cell)
+        retreat = max(range(len(safe)), key=lambda _: (safe[_] != navigation.UNREACHABLE != back[_],
+                                                       beast_distance[_], -safe[_]))
+        if retreat != cell and safe[retreat] != navigation.UNREACHABLE != back[retreat]:
+            return navigation.next_move(moves, navigation.bfs(sources, retreat, blocked), cell, stride)
+        if reachable[target] == navigation.UNREACHABLE:
+            return None
+        return navigation.next_move(moves, navigation.bfs(sources, target, avoided), cell, stride)
+
+    def wander(self):
+        """Случайный ход, чтобы выйти из тупика: из возможных по графу с рытьём, кроме ведущих в клетки,
+            которые обходит plan, и ближе BEAST_MARGIN шагов к монстру. Или None, если таких нет"""
+        self.update_graph()
+        stride = self.game_field.stride
+        cell = self.game_field.cell(self.game_field.player.pos)
+        beast_distance = self.beast_distance()
+        moves = self.graphs[0][0][cell]
+        choices = [disp for disp in DISPLACEMENTS if disp[0] * stride + disp[1] + cell in moves and
+                   disp[0] * stride + disp[1] + cell not in self.doomed | self.trapped[0] and
+                   beast_distance[disp[0] * stride + disp[1] + cell] >= BEAST_MARGIN]
+        return self.rng.choice(choices) if choices else None
+
+    def __call__(self) -> KeyState:
+        started = time.perf_counter()
+        cell = self.game_field.cell(self.game_field.player.pos)
+        self.idle_steps = (0, self.idle_steps + 1)[cell == self.last_cell]
+        self.last_cell = cell
+        if self.idle_steps >= STUCK_STEPS:
+            self.idle_steps = 0
+            disp = self.wander()
+        else:
+            disp = self.trap()
+            disp = self.plan() if disp is None else disp
+        self.thinking += time.perf_counter() - started
+        return keys_for(disp)
+
+
+class SoakStats:
+    """Статистика прогона на выносливость"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.completed = 0
+        self.ticks = 0
+        """Тики симуляции во всех попытках"""
+
+        self.completed_ticks = 0
+        """Тики симуляции в пройденных попытках"""
+
+        self.duration = 0.0
+        """Время работы движка без раздумий бота, секунды"""
+
+        self.thinking = 0.0
+        """Время раздумий бота, секунды"""
+
+        self.results = Counter()
+        """Число попыток по итогам (имена CC.GAME_OVER_* или TIMEOUT)"""
+
+        self.levels = dict()
+        """Для каждого уровня -- [попытки, пройдено, тики в пройденных попытках]"""
+
+    def add(self, level_name, result, ticks, duration, thinking):
+        self.attempts += 1
+        self.ticks += ticks
+        self.duration += duration - thinking
+        self.thinking += thinking
+        self.results[result] += 1
+        level_stats = self.levels.setdefault(level_name, [0, 0, 0])
+        level_stats[0] += 1
+        if result == "GAME_OVER_COMPLETE":
+            self.completed += 1
+            self.completed_ticks += ticks
+            level_stats[1] += 1
+            level_stats[2] += ticks
+
+    def as_dict(self) -> dict:
+        return {"attempts": self.attempts,
+                "completion_rate": self.completed / max(self.attempts, 1),
+                "ticks_per_completed_level": self.completed_ticks / max(self.completed, 1),
+                "ticks_per_second": self.ticks / max(self.duration, 1e-9),
+                "bot_seconds": self.thinking,
+                "engine_seconds": self.duration,
+                "results": dict(self.results),
+                "levels": {name: {"attempts": attempts, "completed": completed,
+                                  "ticks_per_completed": ticks / max(completed, 1)}
+                           for name, (attempts, completed, ticks) in sorted(self.levels.items())},
+                }
+
+    def __str__(self):
+        return f"{self.attempts} attempts, {self.completed / max(self.attempts, 1):.1%} completed, " \
+               f"{self.completed_ticks / max(self.completed, 1):.0f} ticks per completed level, " \
+               f"{self.ticks / max(self.duration, 1e-9):.0f} ticks/s (bot {self.thinking:.1f}s), " + \
+               ", ".join(f"{name} {count}" for name, count in self.results.most_common())
+
+
+if __name__ == "__main__":
+    import engine
+    import replay
+    import solver
+
+    parser = argparse.ArgumentParser(description="LodeRunner bot soak run")
+    parser.add_argument("levels", nargs="*", default=[path.join(path.dirname(path.abspath(__file__)), "Levels")],
+                        help="level files or folders, Levels by default")
+    parser.add_argument("--rounds", type=int, default=1, help="rounds over all levels, 0 -- until --hours pass")
+    parser.add_argument("--hours", type=float, default=None, help="stop after this many hours")
+    parser.add_argument("--steps", type=int, default=3000, help="player steps per attempt before timeout")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first round, next rounds use the next ones")
+    parser.add_argument("--no-beasts", action="store_true", help="remove beasts: check the planner alone")
+    parser.add_argument("--replays", help="folder to save replays of failed attempts to, not with --no-beasts")
+    parser.add_argument("--output", help="JSON statistics file, rewritten after every round")
+    args = parser.parse_args()
+
+    files = solver.level_files(args.levels)
+    game = engine.Engine()
+    stats = SoakStats()
+    started = time.monotonic()
+    deadline = None if args.hours is None else started + args.hours * 3600
+    round_number = 0
+    while (not args.rounds or round_number < args.rounds) and (deadline is None or time.monotonic() < deadline):
+        seed = args.seed + round_number
+        for filename in files:
+            game.load(filename, seed)
+            if args.no_beasts:
+                game.level.beasts.clear()
+                game.level.occupancy.clear()
+            player = Bot(game.level, seed)
+            record = replay.Replay.start(game.level, filename)
+            game.level.player.controls = replay.Recorder(player, record)
+
+            attempt_started = time.perf_counter()
+            game.run((), args.steps)
+            duration = time.perf_counter() - attempt_started
+
+            result = engine.RESULT_NAMES[game.result] if game.result != CC.GAME_OVER_NOT_OVER else TIMEOUT
+            stats.add(path.basename(filename), result, game.clock.ticks, duration, player.thinking)
+            if args.replays is not None and not args.no_beasts and result != "GAME_OVER_COMPLETE":
+                record.save(path.join(args.replays, f"{path.splitext(path.basename(filename))[0]}-{seed}.replay"))
+
+        round_number += 1
+        print(f"Round {round_number}: {stats}")
+        if args.output is not None:
+            with open(args.output, "w") as stats_file:
+                json.dump(stats.as_dict(), stats_file, indent=1)
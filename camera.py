@@ -0,0 +1,181 @@
+""" Камера и статичный слой уровней больше экрана.
+ Экран показывает окно в уровень. Если уровень в окно не помещается, окно следует за игроком: камера сдвигается,
+ когда игрок подходит к краю экрана ближе, чем на FOLLOW_MARGIN его размера. Если помещается -- камера неподвижна,
+ и уровень рисуется, как раньше, от левого верхнего угла.
+
+ Статичная картинка уровня целиком не хранится. Она делится на квадратные куски по CHUNK_SIZE клеток. Кусок
+ рисуется, только когда впервые попадает на экран, и хранится, пока его не вытеснят другие: в памяти держатся
+ CHUNK_MEMORY последних использованных кусков. Из кусков под камерой собирается фон экрана (Level.static_image).
+
+ Координаты здесь -- пикселы уровня: точка [0, 0] -- левый верхний угол клетки [0, 0].
+"""
+
+import pygame
+import numpy as np
+import CC
+import block
+
+CHUNK_SIZE = 16
+"""Сторона куска статичной картинки в клетках"""
+
+CHUNK_MEMORY = 48
+"""Сколько кусков статичной картинки держать в памяти. Кусок 16x16 клеток по 38 пикселов -- около 1.4 Мб"""
+
+FOLLOW_MARGIN = 0.3
+"""Доля размера экрана у каждого края, зайдя в которую игрок сдвигает камеру"""
+
+
+def chunk_key(pos) -> tuple:
+    """Ключ куска, в котором лежит клетка pos: (строка, столбец) в кусках"""
+    return pos[0] // CHUNK_SIZE, pos[1] // CHUNK_SIZE
+
+
+class Camera:
+    """Окно экрана в уровень"""
+
+    def __init__(self):
+        self.view = (0, 0)
+        """Размер экрана в пикселах"""
+
+        self.world = (0, 0)
+        """Размер уровня в пикселах"""
+
+        self.origin = (0, 0)
+        """Точка уровня, которая показывается в левом верхнем углу экрана"""
+
+        self.fixed = True
+        """Уровень помещается на экран целиком, и камера стоит в начале координат"""
+
+    def resize(self, view=None, world=None):
+        """Новый размер экрана или уровня. Камера возвращается в начало координат"""
+        self.view = self.view if view is None else tuple(view)
+        self.world = self.world if world is None else tuple(world)
+        self.fixed = self.world[0] <= self.view[0] and self.world[1] <= self.view[1]
+        self.origin = (0, 0)
+
+    def clamp(self, x, y) -> tuple:
+        """Положение камеры, ближайшее к (x, y), при котором экран не выходит за уровень"""
+        return (int(min(max(x, 0), max(self.world[0] - self.view[0], 0))),
+                int(min(max(y, 0), max(self.world[1] - self.view[1], 0))))
+
+    def center(self, x, y):
+        """Камера на точку уровня (x, y) в центре экрана"""
+        if not self.fixed:
+            self.origin = self.clamp(x - self.view[0] / 2, y - self.view[1] / 2)
+
+    def follow(self, x, y) -> bool:
+        """Сдвиг камеры так, чтобы точка уровня (x, y) была не ближе FOLLOW_MARGIN экрана к его краям.
+            Возвращает истину, если камера сдвинулась"""
+        if self.fixed:
+            return False
+        origin = []
+        for point, start, size in zip((x, y), self.origin, self.view):
+            margin = size * FOLLOW_MARGIN
+            origin.append(min(max(start, point + margin - size), point - margin))
+        origin = self.clamp(*origin)
+        moved, self.origin = origin != self.origin, origin
+        return moved
+
+    def visible_cells(self, margin=0) -> tuple:
+        """Клетки, хоть частью видимые на экране: строки row0..row1 и столбцы col0..col1 включительно.
+            margin -- на сколько клеток расширить прямоугольник с каждой стороны"""
+        col0, row0 = (start // CC.BLOCK_WIDTH - margin for start in self.origin)
+        col1, row1 = ((start + size - 1) // CC.BLOCK_WIDTH + margin for start, size in zip(self.origin, self.view))
+        return row0, row1, col0, col1
+
+    def to_screen(self, rect: pygame.Rect) -> pygame.Rect:
+        """Прямоугольник уровня в координатах экрана"""
+        return rect.move(-self.origin[0], -self.origin[1])
+
+
+class StaticChunks:
+    """Куски статичной картинки уровня. Ключ куска -- (строка, столбец) в кусках.
+        Порядок словаря -- от давно использованных к недавним"""
+
+    def __init__(self, game_field):
+        self.game_field = game_field
+        self.chunks = dict()
+
+    def clear(self):
+        self.chunks.clear()
+
+    def get(self, key) -> pygame.Surface:
+        """Кусок по ключу. Если его нет в памяти -- рисуется, а самый давно использованный вытесняется"""
+        chunk = self.chunks.pop(key, None)
+        if chunk is None:
+            chunk = self.render(key)
+            while len(self.chunks) >= CHUNK_MEMORY:
+                del self.chunks[next(iter(self.chunks))]
+        self.chunks[key] = chunk
+        return chunk
+
+    def render(self, key) -> pygame.Surface:
+        """Рисует кусок по карте уровня, как Level.prepare_static рисовал всю картинку"""
+        chunk = pygame.Surface((CHUNK_SIZE * CC.BLOCK_WIDTH, CHUNK_SIZE * CC.BLOCK_WIDTH))
+        chunk.fill((0, 0, 0))
+        row0, col0 = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE
+        sprites = self.game_field.sprites
+        for (y, x), blk in np.ndenumerate(self.game_field.grid[1:-1, 1:-1][row0:row0 + CHUNK_SIZE,
+                                                                           col0:col0 + CHUNK_SIZE]):
+            cur_block: block.Block = sprites.get(CC.BLOCK_CHARS[blk])
+            cur_block is None or cur_block.show(chunk, [y, x])
+        return chunk
+
+    def redraw(self, pos):
+        """Перерисовывает клетку pos в её куске, если кусок в памяти. Иначе он и так будет нарисован заново"""
+        key = chunk_key(pos)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return
+        local = [pos[0] - key[0] * CHUNK_SIZE, pos[1] - key[1] * CHUNK_SIZE]
+        chunk.fill((0, 0, 0), (local[1] * CC.BLOCK_WIDTH, local[0] * CC.BLOCK_WIDTH, CC.BLOCK_WIDTH, CC.BLOCK_WIDTH))
+        cur_block: block.Block = self.game_field.sprites.get(self.game_field[pos])
+        cur_block is None or cur_block.show(chunk, local)
+
+    def compose(self, canvas: pygame.Surface, camera: Camera, area: pygame.Rect = None):
+        """Собирает на канве фон экрана из кусков под камерой. area -- только эта область уровня"""
+        area = pygame.Rect(camera.origin, camera.view) if area is None else area
+        side = CHUNK_SIZE * CC.BLOCK_WIDTH
+        rows = range(max(area.top, 0) // side, (min(area.bottom, camera.world[1]) - 1) // side + 1)
+        cols = range(max(area.left, 0) // side, (min(area.right, camera.world[0]) - 1) // side + 1)
+        screen = camera.to_screen(area)
+        canvas.fill((0, 0, 0), screen)
+        for row in rows:
+            for col in cols:
+                chunk_rect = pygame.Rect(col * side, row * side, side, side).clip(area)
+                canvas.blit(self.get((row, col)), camera.to_screen(chunk_rect),
+                            chunk_rect.move(-col * side, -row * side))
+
+
+class ChunkIndex:
+    """Спрайты уровня (с позицией pos), разложенные по кускам, как статичная картинка. Отрисовка перебирает
+        только куски под камерой, так что работа за кадр не растёт с размером уровня"""
+
+    def __init__(self):
+        self.chunks = dict()
+        """Ключ куска -> словарь {клетка: спрайт}"""
+
+    def clear(self):
+        self.chunks.clear()
+
+    def add(self, cell, item):
+        self.chunks.setdefault(chunk_key(item.pos), dict())[cell] = item
+
+    def remove(self, cell, item):
+        del self.chunks[chunk_key(item.pos)][cell]
+
+    def visible(self, camera: Camera, margin=0):
+        """Спрайты, хоть частью видимые на экране (см. Camera.visible_cells). Перебираются только куски
+            под камерой, а положение проверяется только у спрайтов кусков на краю экрана"""
+        row0, row1, col0, col1 = camera.visible_cells(margin)
+        for row in range(row0 // CHUNK_SIZE, row1 // CHUNK_SIZE + 1):
+            inner_row = row0 <= row * CHUNK_SIZE and (row + 1) * CHUNK_SIZE - 1 <= row1
+            for col in range(col0 // CHUNK_SIZE, col1 // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((row, col))
+                if chunk is None:
+                    continue
+                if inner_row and col0 <= col * CHUNK_SIZE and (col + 1) * CHUNK_SIZE - 1 <= col1:
+                    yield from chunk.values()
+                else:
+                    yield from (item for item in chunk.values()
+                                if row0 <= item.pos[0] <= row1 and col0 <= item.pos[1] <= col1)
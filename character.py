@@ -3,8 +3,6 @@
 """
 
 # V 2.1
-import random
-
 import pygame
 from pygame.locals import *
 import block
@@ -44,6 +42,75 @@ ANTIMOTION = {K_LEFT: K_RIGHT,
 # Обратный словарь к MOTION. Нужен для поиска команды по известному шагу
 I_MOTION = dict(zip(MOTION.values(), MOTION.keys()))
 
+__animation_sets = dict()
+"""Уже построенные наборы анимаций. Ключ -- каталог и описание кадров по состояниям"""
+
+
+class AnimationSet:
+    """Набор анимаций одного типа персонажей.
+
+        Строится один раз, вместе со всеми производными (отражёнными и обращёнными) состояниями,
+        и используется всеми персонажами этого типа только для чтения.
+    """
+
+    def __init__(self, img: dict, subfolder=""):
+        self.images = dict()
+        """Кадры по состояниям персонажа. Для атаки -- шаблоны временных блоков"""
+
+        for state in STATES.keys():
+            if state in img:
+                self.images[STATES[state]] = block.load_frames(img[state], subfolder)
+
+        # Let's duplicate and flip walking animation if absent
+        self.__clone_animation__(STATES["walk_left"], STATES["walk_right"], True)
+
+        # Let's duplicate climbing animations if absent
+        self.__clone_animation__(STATES["climb_down"], STATES["climb_up"], reverse=True)
+
+        # Несколько переходных форм
+        self.__clone_animation__(STATES["walk_hang_right"], STATES["walk_hang_left"], True)
+        self.__clone_animation__(STATES["hang"], STATES["walk_hang_left"])
+        self.__clone_animation__(STATES["hang"], STATES["walk_hang_right"])
+        self.__clone_animation__(STATES["fall"], STATES["fall_hang"])
+
+        attack_list = ("attack_left", "attack_right")
+        for state in attack_list:
+            if state in img:
+                self.images[state] = block.TemporaryBlock((img[state], None), subfolder=subfolder,
+                                                          animation_delay=6)
+
+        if attack_list[0] not in self.images:
+            self.images[attack_list[0]] = None #block.TemporaryBlock((None, None), animation_delay=6)
+
+        if attack_list[1] not in self.images:
+            self.images[attack_list[1]] = self.images[attack_list[0]].copy(xflip=True) \
+                if self.images[attack_list[0]] is not None else None
+
+        # Время жизни шаблонов считается сразу, копии получают его готовым
+        for state in attack_list:
+            if self.images[state] is not None:
+                self.images[state].kind = state
+                self.images[state].lifetime()
+
+    def __clone_animation__(self, state1, state2, flip=False, reverse=False):
+        f, z = state1, state2
+        for i in range(2):
+            if f not in self.images and z in self.images:
+                if isinstance(self.images[z], tuple):
+                    self.images[f] = tuple(block.transform_image(pict, xflip=flip)
+                                           for pict in (self.images[z], reversed(self.images[z]))[reverse])
+                break
+            f, z = state2, state1
+
+
+def get_animation_set(img: dict, subfolder="") -> AnimationSet:
+    """Набор анимаций для типа персонажей. Для одинакового описания всегда возвращается один и тот же набор"""
+    key = (subfolder, tuple(sorted((state, tuple(files)) for state, files in img.items())))
+    animation_set = __animation_sets.get(key)
+    if animation_set is None:
+        animation_set = __animation_sets[key] = AnimationSet(img, subfolder)
+    return animation_set
+
 
 class Character(block.Block):
     """Базовый класс игрового персонажа. Анимированный, перемещается.
@@ -68,6 +135,7 @@ class Character(block.Block):
         self.move_direction = K_IDLE
         self.move_state = STATE_STAND
         self.images = dict()
+        """Кадры по состояниям. Общий для всех персонажей этого типа словарь, менять его нельзя"""
         self.delay = dict()
         self.delay[STATE_STAND] = idle_delay  # Idle and fall states are slower than moving states.
         self.delay[STATE_HANG] = idle_delay  # So they use different counters
@@ -78,77 +146,38 @@ class Character(block.Block):
 
         (self.step_sound, self.attack_sound, self.die_sound) = ((None, None, None), sounds)[sounds is not None]
 
-        # Load all images as an animation sets
+        # Animation sets are shared between all characters of the same type
         super().__init__(None, position, subfolder)
         if isinstance(img, dict):
-            for state in STATES.keys():
-                if state in img:
-                    self.images[STATES[state]] = [block.Block(file, position, subfolder) for file in img[state]]
-
-            # Let's duplicate and flip walking animation if absent
-            self.__clone_animation__(STATES["walk_left"], STATES["walk_right"], True)
-
-            # Let's duplicate climbing animations if absent
-            self.__clone_animation__(STATES["climb_down"], STATES["climb_up"], reverse=True)
-
-            # Несколько переходных форм
-            self.__clone_animation__(STATES["walk_hang_right"], STATES["walk_hang_left"], True)
-            self.__clone_animation__(STATES["hang"], STATES["walk_hang_left"])
-            self.__clone_animation__(STATES["hang"], STATES["walk_hang_right"])
-            self.__clone_animation__(STATES["fall"], STATES["fall_hang"])
-
-            attack_list = ("attack_left", "attack_right")
-            for state in attack_list:
-                if state in img:
-                    self.images[state] = block.TemporaryBlock((img[state], None), subfolder=subfolder,
-                                                              animation_delay=6)
-
-            if attack_list[0] not in self.images:
-                self.images[attack_list[0]] = None #block.TemporaryBlock((None, None), animation_delay=6)
-
-            if attack_list[1] not in self.images:
-                self.images[attack_list[1]] = self.images[attack_list[0]].copy(xflip=True) \
-                    if self.images[attack_list[0]] is not None else None
-
-    def __clone_animation__(self, state1, state2, flip=False, reverse=False):
-        f, z = state1, state2
-        for i in range(2):
-            if f not in self.images and z in self.images:
-                if isinstance(self.images[z], list):
-                    self.images[f] = [pict.copy(xflip=flip) for pict in reversed(self.images[z])] if reverse \
-                        else [pict.copy(xflip=flip) for pict in self.images[z]]
-                break
-            f, z = state2, state1
+            self.images = get_animation_set(img, subfolder).images
 
     def __set_state__(self):
-        self.move_state = (STATE_STAND, STATE_HANG)[self.game_field[self.pos] in CC.HANG_BLOCKS]
+        self.move_state = (STATE_STAND, STATE_HANG)[bool(self.game_field.traits(self.pos) & CC.TRAIT_HANG)]
 
     @staticmethod
-    def __in_obstacle__(obstacles: list, pos: list):
-        if obstacles is not None:
-            return any((pos == obst.pos for obst in obstacles))
-        return False
+    def __in_obstacle__(obstacles: level.Occupancy, pos: list):
+        return obstacles is not None and pos in obstacles
 
-    def fall(self, obstacles: list = None):
+    def fall(self, obstacles: level.Occupancy = None):
         """ Check for support block under us or staying on block which hangable
             If falling is present -- return true
         """
         self.oldpos = self.pos.copy()
         self.__set_state__()
 
+        # Under the bottom line there is a level border, which supports us
         tmp_pos = [self.pos[0] + 1, self.pos[1]]
-        if check_bounds(tmp_pos):
-            if all((self.game_field[tmp_pos] not in CC.SUPPORT_BLOCKS,
-                    self.game_field[self.pos] not in CC.CARRY_BLOCKS,
-                    not self.__in_obstacle__(obstacles, tmp_pos))):
-                # We are falling down, no other movement
-                self.move_state = STATE_FALL
-                self.move_direction = K_IDLE
-                self.pos[0] += 1
-                return True
+        if not (self.game_field.traits(tmp_pos) & CC.TRAIT_SUPPORT or
+                self.game_field.traits(self.pos) & CC.TRAIT_CARRY or
+                self.__in_obstacle__(obstacles, tmp_pos)):
+            # We are falling down, no other movement
+            self.move_state = STATE_FALL
+            self.move_direction = K_IDLE
+            self.pos[0] += 1
+            return True
         return False
 
-    def move(self, disp: tuple, obstacles: list = None):
+    def move(self, disp: tuple, obstacles: level.Occupancy = None):
         self.oldpos = self.pos.copy()
 
         self.__set_state__()
@@ -158,50 +187,49 @@ class Character(block.Block):
 
         tmp_pos = [self.pos[0] + disp[0], self.pos[1] + disp[1]]
 
-        if self.game_field[tmp_pos] in CC.SOLID_BLOCKS:
-            return False  # Impossible movement, block in the way
+        if self.game_field.traits(tmp_pos) & CC.TRAIT_SOLID:
+            return False  # Impossible movement, block or level border in the way
 
-        if disp[0] == -1 and self.game_field[self.pos] not in CC.CLIMB_BLOCKS:
+        if disp[0] == -1 and not self.game_field.traits(self.pos) & CC.TRAIT_CLIMB:
             return False  # Impossible to move up
 
         if self.__in_obstacle__(obstacles, tmp_pos):
             return False
 
-        if check_bounds(tmp_pos):
-            # Looks like we can move
-            # Character movement itself
-            self.step_sound is None or self.step_sound.play()
-            self.pos = tmp_pos.copy()
-            return True
-
-        return False
+        # Looks like we can move
+        # Character movement itself
+        self.step_sound is None or self.step_sound.play()
+        self.pos = tmp_pos.copy()
+        return True
 
-    def get_image(self, tick):
+    def get_image(self, tick, elapsed=1):
         if self.move_direction * self.move_state in self.images:
-            if isinstance(self.images[self.move_direction * self.move_state], list):
+            if isinstance(self.images[self.move_direction * self.move_state], tuple):
                 frames = len(self.images[self.move_direction * self.move_state])
                 if self.move_direction == K_IDLE:
                     delay = self.delay[self.move_state]
-                    self.current_ticks = 0 if self.current_ticks >= delay - 1 else self.current_ticks + 1
+                    self.current_ticks = (self.current_ticks + elapsed) % delay
                     current_frame = int(self.current_ticks / (delay / frames))
                 else:
                     self.current_ticks = 0
-                    current_frame = int(tick / (self.step / frames))
+                    # Интерполированный тик (player_tick + alpha) из-за округления может дойти ровно до step
+                    current_frame = min(int(tick / (self.step / frames)), frames - 1)
 
-                return self.images[self.move_direction * self.move_state][current_frame].image
+                return self.images[self.move_direction * self.move_state][current_frame]
             else:
-                return self.images[self.move_direction + self.move_state].image
+                return self.images[self.move_direction * self.move_state]
         else:
             return self.image
 
-    def show(self, canvas: pygame.Surface, tick):
-        canvas.blit(self.get_image(tick), self.get_screen_pos(self.animation_step, tick))
+    def show(self, canvas: pygame.Surface, tick, elapsed=1):
+        return canvas.blit(self.get_image(tick, elapsed), self.get_screen_pos(self.animation_step, tick))
 
 
 class Beast(Character):
     """Персонаж, управляемый компьютером
         Здесь реализовано компьютерное управление персонажем.
         В общем случае, он стремится по кратчайшей траектории подойти к игроку.
+        Путь берётся из общего для всех монстров поля расстояний уровня (см. модуль navigation).
     """
 
     def __init__(self, img, game_field: level.Level,
@@ -217,10 +245,12 @@ class Beast(Character):
         # Запоминаем позицию рождения для возрождения чудовища в исходном месте при его смерти
         self.spawn_pos = self.pos.copy()
         self.idioticy = 0
-        self.range = random.randrange(0, 4)
+        self.range = game_field.rng.randrange(0, 4)
+        self.plan = None
+        """Ход, просчитанный заранее, пока монстр ждёт своего шага (см. Level.plan_beasts)"""
 
     # Мы получаем координаты других чудищ (на их место встать нельзя) и игрока (к которому мы стремимся)
-    def move(self, player_pos: list, beasts: list = None):
+    def move(self, player_pos: list, beasts: level.Occupancy = None):
         self.__set_state__()
 
         if super().fall():
@@ -239,7 +269,14 @@ class Beast(Character):
         k_horiz = K_IDLE
         k_vert = K_IDLE
         if self.idioticy == 0:
-            self.range = random.randrange(0, 4)
+            self.range = self.game_field.rng.randrange(0, 4)
+            # Идём к игроку по кратчайшему пути, если он есть
+            disp = self.game_field.navigation.next_move(self.pos, beasts, self.plan)
+            if disp is not None and super().move(disp, beasts):
+                self.move_direction = I_MOTION[disp]
+                return True
+
+            # Пути нет -- пробуем подойти к игроку напрямую
             if disp_y != 0:
                 k_vert = I_MOTION[(disp_y, 0)]
             if super().move((disp_y, 0), beasts):
@@ -254,6 +291,10 @@ class Beast(Character):
                 self.move_direction = k_horiz
                 return True
 
+        if not CC.BEAST_WANDER:
+            self.move_direction = K_IDLE
+            return True
+
         self.idioticy = (self.idioticy + 1) * (self.idioticy < self.range)
         if self.move_direction != K_IDLE:
             if not super().move(MOTION[self.move_direction], beasts):
@@ -285,14 +326,23 @@ class Player(Character):
         # TODO Все временные блоки, ассоциированные с разрушаемыми, должны читаться и создаваться
         # TODO где-то вне. А при атаке игрока должен вставляться именно тот блок, который соответствует
         # TODO разрушаемому.
+        self.controls = pygame.key.get_pressed
+        """Источник управления. Функция, возвращающая состояние клавиш так же, как pygame.key.get_pressed.
+            Подменяется, если игроком управляет не клавиатура."""
+
         cracked = CC.BLOCKS["temporary"][CC.BLOCKS["static"]["Z"]["overlay"]]
         self.cracked_block = block.TemporaryBlock((cracked["animation"]["appear"], cracked["animation"]["disappear"]),
                                                   subfolder=cracked["folder"], animation_delay=cracked["lifetime"] / 100,
                                                   animation_pause=cracked["lifetime"])
+        self.cracked_block.kind = "cracked"
+        self.cracked_block.lifetime()
 
-    def move(self, obstacles: list = None, temporary_items: list = None):
-        pressed_keys = pygame.key.get_pressed()
+    def temporary_prototype(self, kind) -> block.TemporaryBlock:
+        """Шаблон временного блока, порождаемого игроком, по его имени (TemporaryBlock.kind)"""
+        return self.cracked_block if kind == "cracked" else self.images[kind]
 
+    def move(self, obstacles: level.Occupancy = None, add_temporary=None):
+        """add_temporary -- функция, которой уровень принимает временные блоки, порождённые рытьём"""
         self.move_direction = K_IDLE
 
         self.__set_state__()
@@ -304,13 +354,16 @@ class Player(Character):
         if self.__in_obstacle__(obstacles, self.pos):
             return False
 
+        # Управление читается, только когда игрок может действовать. Пока он падает, нажатия копятся в буфере
+        pressed_keys = self.controls()
+
         attack = {K_q: ("attack_left", -1),
                   K_w: ("attack_right", +1)}
         for key in attack:
             if pressed_keys[key]:
-                if all((0 <= self.pos[1] + attack[key][1] < CC.LEVEL_WIDTH,
-                        self.game_field[(self.pos[0], self.pos[1] + attack[key][1])] == '.',
-                        self.game_field[(self.pos[0] + 1, self.pos[1] + attack[key][1])] in CC.DESTRUCTABLE_BLOCKS)):
+                # Level border is neither empty nor destructable, so no bounds check needed
+                if self.game_field[(self.pos[0], self.pos[1] + attack[key][1])] == CC.EMPTY_BLOCK and \
+                        self.game_field.traits((self.pos[0] + 1, self.pos[1] + attack[key][1])) & CC.TRAIT_DESTRUCTABLE:
                     self.attack_sound is None or self.attack_sound.play()
                     fire = self.images[attack[key][0]].copy()
                     crack = self.cracked_block.copy()
@@ -320,8 +373,8 @@ class Player(Character):
 
                     self.game_field[crack.pos] = '.'
 
-                    temporary_items.append(fire)
-                    temporary_items.append(crack)
+                    add_temporary(fire)
+                    add_temporary(crack)
 
         for key in (K_UP, K_DOWN, K_LEFT, K_RIGHT):
             if pressed_keys[key]:
@@ -0,0 +1,214 @@
+""" Проверки детерминизма симуляции.
+ Игра с одним уровнем, зерном и вводом должна идти одинаково, как бы её ни запускали. Здесь одни и те же
+ игры со случайным вводом прогоняются двумя способами, и состояние сравнивается после каждого шага игрока:
+
+ snapshot -- игра, восстановленная посреди игры из снимка (Level.snapshot, Level.restore) в другом движке,
+ идёт дальше так же, как исходная.
+ replay -- запись игры (replay.py), сохранённая в файл и воспроизведённая в другом движке, даёт ту же игру:
+ тот же итог за то же число тиков.
+ batch -- игры в пакетном движке (batch.BatchEngine) идут так же, как по одной в обычном. Блуждание монстров
+ при этом выключено: в пакетном движке его длина берётся из другого генератора.
+ horde -- монстры, которые ходят ордой (horde.Horde), играют так же, как по одному (Beast.move).
+ ticks -- шаг движка, пропускающий тики без событий (Engine.step, Level.quiet_ticks, расписание событий уровня),
+ даёт то же, что CC.STEP тиков подряд.
+
+ Запуск: python check.py [уровни или каталоги ...] [--checks snapshot ...] [--seeds N] [--steps N]
+ Код возврата 1, если хоть одна проверка нашла расхождение.
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+from os import path
+import numpy as np
+import CC
+import engine
+import replay
+import solver
+import batch
+from env import ACTIONS
+from horde import DIRECTION_CODES
+
+
+def random_inputs(seed, steps) -> list:
+    """Случайный ввод игрока: номера действий (env.ACTIONS) на steps шагов"""
+    rng = random.Random(seed)
+    return [rng.randrange(len(ACTIONS)) for _ in range(steps)]
+
+
+def play(game, filename, seed, inputs) -> list:
+    """Игра до конца или до конца ввода. Возвращает снимки: перед первым шагом и после каждого"""
+    game.load(filename, seed)
+    snapshots = [game.snapshot()]
+    for action in inputs:
+        if game.result != CC.GAME_OVER_NOT_OVER:
+            break
+        game.step(ACTIONS[action])
+        snapshots.append(game.snapshot())
+    return snapshots
+
+
+def check_snapshot(games, filename, seeds, steps) -> list:
+    """Игра восстанавливается из снимка на середине во втором движке и продолжается с тем же вводом.
+        Второй движок перед этим играет тот же уровень с другим зерном и вводом, так что всё его
+        состояние должно прийти из снимка. Снимки сравниваются после каждого шага"""
+    original, restored = games
+    mismatches = list()
+    for seed in range(seeds):
+        inputs = random_inputs(seed, steps)
+        snapshots = play(original, filename, seed, inputs)
+        # Середина игры -- по числу сыгранных шагов: случайный игрок погибает задолго до конца ввода
+        middle = len(snapshots) // 2
+        play(restored, filename, seed + 1, random_inputs(seed + 1, middle))
+        restored.restore(snapshots[middle])
+        for step, action in enumerate(inputs[middle:len(snapshots) - 1], middle):
+            restored.step(ACTIONS[action])
+            if restored.snapshot() != snapshots[step + 1]:
+                mismatches.append(f"seed {seed} step {step}")
+                break
+    return mismatches
+
+
+def check_replay(games, filename, seeds, steps) -> list:
+    """Игра записывается (replay.Recorder), запись сохраняется в файл, читается обратно и воспроизводится
+        во втором движке (replay.ReplayControls) столько же шагов. Снимки сравниваются после каждого шага,
+        а в конце -- итог, число тиков и то, что воспроизведены все команды записи и не больше"""
+    recording, playing = games
+    mismatches = list()
+    with tempfile.TemporaryDirectory() as folder:
+        for seed in range(seeds):
+            recording.load(filename, seed)
+            recorded = replay.Replay.start(recording.level, filename)
+            recording.level.player.controls = replay.Recorder(recording.get_pressed, recorded)
+            snapshots = play(recording, filename, seed, random_inputs(seed, steps))
+            recording.level.player.controls = recording.get_pressed
+            replay_name = path.join(folder, f"{seed}.replay")
+            recorded.save(replay_name)
+
+            recorded = replay.Replay.load(replay_name)
+            playing.load(filename, recorded.seed)
+            playback = playing.level.player.controls = replay.ReplayControls(recorded)
+            for step, snapshot in enumerate(snapshots[1:]):
+                playing.step()
+                if playing.snapshot() != snapshot:
+                    mismatches.append(f"seed {seed} step {step}")
+                    break
+            else:
+                if (playing.result, playing.clock.ticks) != (recording.result, recording.clock.ticks) or \
+                        not playback.finished or playback.overrun:
+                    mismatches.append(f"seed {seed} end of replay")
+            playing.level.player.controls = playing.get_pressed
+    return mismatches
+
+
+def batch_state(batch_engine, number) -> tuple:
+    """Состояние игры number пакетного движка для сравнения с game_state"""
+    alive = batch_engine.alive[number]
+    return (int(batch_engine.result[number]), int(batch_engine.ticks[number]), int(batch_engine.player[number]),
+            batch_engine.beasts[number][alive].tolist(), batch_engine.direction[number][alive].tolist(),
+            batch_engine.grid[number].tobytes(), int(batch_engine.treasures_count[number]))
+
+
+def game_state(game) -> tuple:
+    """Итог, тик, клетки игрока и монстров, направления монстров, карта и число оставшихся сокровищ"""
+    game_field = game.level
+    return (game.result, game_field.ticks, game_field.cell(game_field.player.pos),
+            [game_field.cell(beast.pos) for beast in game_field.beasts],
+            [DIRECTION_CODES[beast.move_direction] for beast in game_field.beasts],
+            game_field.grid.tobytes(), game_field.treasures_count)
+
+
+def check_batch(games, filename, seeds, steps) -> list:
+    """Игры всех зёрен идут разом в пакетном движке, потом по одной в первом движке с тем же вводом.
+        Зерно задаёт только ввод: уровень в обоих движках читается с зерном 0. Состояния сравниваются
+        после каждого шага. Пакетный движок играет только уровни стандартного размера"""
+    game = games[0]
+    wander, CC.BEAST_WANDER = CC.BEAST_WANDER, False
+    inputs = np.array([random_inputs(seed, steps) for seed in range(seeds)], dtype=np.intp)
+    batch_engine = batch.BatchEngine(seeds, game=game)
+    batch_engine.load(filename)
+    states = list()
+    for actions in inputs.T:
+        batch_engine.step(actions)
+        states.append([batch_state(batch_engine, number) for number in range(seeds)])
+
+    mismatches = list()
+    for seed in range(seeds):
+        game.load(filename, 0)
+        for step, action in enumerate(inputs[seed].tolist()):
+            game.step(ACTIONS[action])
+            if game_state(game) != states[step][seed]:
+                mismatches.append(f"seed {seed} step {step}")
+                break
+    CC.BEAST_WANDER = wander
+    return mismatches
+
+
+def check_horde(games, filename, seeds, steps) -> list:
+    """Одни и те же игры с ордой (она включается при любом числе монстров) и с монстрами по одному.
+        Снимки сравниваются после каждого шага. Игры идут без блуждания монстров и с ним"""
+    horde, single = games
+    horde_size, wander = CC.BEAST_HORDE, CC.BEAST_WANDER
+    mismatches = list()
+    for wandering in (False, True):
+        CC.BEAST_WANDER = wandering
+        for seed in range(seeds):
+            inputs = random_inputs(seed, steps)
+            CC.BEAST_HORDE = 1
+            expected = play(horde, filename, seed, inputs)
+            CC.BEAST_HORDE = sys.maxsize
+            actual = play(single, filename, seed, inputs)
+            step = next((step for step, (one, other) in enumerate(zip(expected, actual), -1) if one != other),
+                        None if len(expected) == len(actual) else min(len(expected), len(actual)) - 1)
+            step is None or mismatches.append(f"{('no wander', 'wander')[wandering]} seed {seed} step {step}")
+    CC.BEAST_HORDE, CC.BEAST_WANDER = horde_size, wander
+    return mismatches
+
+
+def check_ticks(games, filename, seeds, steps) -> list:
+    """Игра шагами Engine.step и та же игра во втором движке по тику (Engine.tick).
+        Снимки сравниваются после каждого шага"""
+    stepping, ticking = games
+    mismatches = list()
+    for seed in range(seeds):
+        inputs = random_inputs(seed, steps)
+        snapshots = play(stepping, filename, seed, inputs)
+        ticking.load(filename, seed)
+        for step, action in enumerate(inputs[:len(snapshots) - 1]):
+            ticking.keys = ACTIONS[action]
+            for _ in range(CC.STEP):
+                ticking.tick()
+            if ticking.snapshot() != snapshots[step + 1]:
+                mismatches.append(f"seed {seed} step {step}")
+                break
+    return mismatches
+
+
+CHECKS = {"snapshot": check_snapshot, "replay": check_replay, "batch": check_batch, "horde": check_horde,
+          "ticks": check_ticks}
+"""Проверки по именам. Проверка получает два движка, файл уровня, число игр (зёрна 0..seeds-1) и число шагов
+    и возвращает описания расхождений"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LodeRunner simulation determinism checks")
+    parser.add_argument("levels", nargs="*", default=[path.join(path.dirname(path.abspath(__file__)), "Levels")],
+                        help="level files or folders, Levels by default")
+    parser.add_argument("--checks", nargs="+", choices=CHECKS, default=list(CHECKS), help="checks, all by default")
+    parser.add_argument("--seeds", type=int, default=4, help="games per level, seeded 0..N-1")
+    parser.add_argument("--steps", type=int, default=300, help="player steps per game")
+    args = parser.parse_args()
+
+    engines = engine.Engine(), engine.Engine(load_config=False)
+    levels = solver.level_files(args.levels)
+    failed = 0
+    for name in args.checks:
+        found = 0
+        for filename in levels:
+            for mismatch in CHECKS[name](engines, filename, args.seeds, args.steps):
+                print(f"{name}: {path.basename(filename)} {mismatch}")
+                found += 1
+        print(f"{name}: {len(levels) * args.seeds} games, {found} mismatches")
+        failed += found
+    exit(int(failed > 0))
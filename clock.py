@@ -0,0 +1,65 @@
+""" Часы игры.
+ Симуляция идёт с фиксированным шагом -- CC.FPS тиков в секунду, независимо от того, сколько кадров
+ в секунду успевает нарисовать компьютер. Кадр рисуется с частотой экрана (или CC.RENDER_FPS),
+ а положение персонажей между тиками интерполируется.
+"""
+
+import CC
+
+
+class GameClock:
+    """Часы симуляции с фиксированным шагом.
+
+        Реальное время, прошедшее между кадрами, переводится в тики симуляции. Счётчики тиков игрока и монстров
+        ведутся здесь же: логика игрока выполняется на тике, где player_tick == 0, монстров -- где beast_tick == 0.
+    """
+
+    def __init__(self, tick_rate=None, max_lag=None):
+        self.tick_rate = CC.FPS if tick_rate is None else tick_rate
+        """Тиков симуляции в секунду"""
+
+        self.max_lag = CC.STEP if max_lag is None else max_lag
+        """Наибольшее отставание симуляции в тиках. Если компьютер не успевает, игра замедляется, а не зависает"""
+
+        self.lag = 0.0
+        """Сколько тиков симуляции ещё нужно выполнить, чтобы догнать реальное время"""
+
+        self.player_tick = self.beast_tick = 0
+        self.ticks = 0
+        """Тиков симуляции с начала уровня"""
+
+        self.reset()
+
+    def reset(self):
+        """Начало уровня. Первый тик выполняется сразу, не дожидаясь, пока пройдёт время"""
+        self.lag = 1.0
+        self.player_tick = self.beast_tick = 0
+        self.ticks = 0
+
+    def seek(self, ticks):
+        """Переход к тику ticks с начала уровня. Нужен при восстановлении снимка уровня"""
+        self.ticks = ticks
+        self.player_tick = ticks % CC.STEP
+        self.beast_tick = ticks % CC.BEAST_STEP
+
+    def add_time(self, milliseconds):
+        """Учесть прошедшее реальное время"""
+        self.lag = min(self.lag + milliseconds * self.tick_rate / 1000, self.max_lag)
+
+    def pending(self) -> bool:
+        """Есть ли невыполненные тики симуляции"""
+        return self.lag >= 1
+
+    def step(self) -> tuple:
+        """Переход к следующему тику. Возвращает счётчики игрока и монстров для выполняемого тика"""
+        ticks = (self.player_tick, self.beast_tick)
+        self.player_tick = (self.player_tick + 1) * (self.player_tick < CC.STEP - 1)
+        self.beast_tick = (self.beast_tick + 1) * (self.beast_tick < CC.BEAST_STEP - 1)
+        self.lag -= 1
+        self.ticks += 1
+        return ticks
+
+    @property
+    def alpha(self):
+        """Доля следующего тика, уже прошедшая в реальном времени. Используется для интерполяции положений"""
+        return min(self.lag, 1.0)
@@ -0,0 +1,96 @@
+""" Управление игроком.
+ Игрок читает управление только на своём шаге (раз в CC.STEP тиков). Если смотреть на клавиатуру
+ только в этот момент, короткое нажатие между шагами теряется. Поэтому события клавиатуры собираются
+ каждый кадр в буфер, а на шаге игрока из буфера берётся команда.
+
+ Источник управления игрока (Player.controls) -- функция без параметров, возвращающая состояние клавиш,
+ индексируемое кодами клавиш pygame, так же, как результат pygame.key.get_pressed.
+"""
+
+from collections import deque
+from pygame.locals import *
+import CC
+
+INPUT_KEYS = {"up": K_UP,
+              "down": K_DOWN,
+              "left": K_LEFT,
+              "right": K_RIGHT,
+              "dig_left": K_q,
+              "dig_right": K_w,
+              }
+"""Имена клавиш управления игроком"""
+
+MOVE_KEYS = (K_UP, K_DOWN, K_LEFT, K_RIGHT)
+"""Клавиши перемещения"""
+
+DIG_KEYS = (K_q, K_w)
+"""Клавиши рытья"""
+
+
+class KeyState:
+    """Состояние клавиш для управления игроком без клавиатуры.
+        Индексируется кодами клавиш pygame, так же, как результат pygame.key.get_pressed."""
+
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+    @staticmethod
+    def parse(line: str):
+        """Состояние клавиш из строки вида "left dig_right" """
+        return KeyState(INPUT_KEYS[name] for name in line.lower().split())
+
+
+IDLE = KeyState()
+"""Ни одна клавиша не нажата"""
+
+
+class InputBuffer:
+    """Буфер клавиатурного ввода между шагами игрока. Используется как источник управления игрока.
+
+        Перемещение: если с прошлого шага была нажата клавиша перемещения, шаг получает её, даже если
+        она уже отпущена. Нажатия сверх одного на шаг откладываются на следующие шаги -- не больше
+        CC.INPUT_PREBUFFER штук. Если нажатий не было, действуют удерживаемые клавиши.
+
+        Рытьё срабатывает по нажатию: одно нажатие -- одна яма, удержание клавиши повторно не роет.
+    """
+
+    def __init__(self, prebuffer=None):
+        self.prebuffer = CC.INPUT_PREBUFFER if prebuffer is None else prebuffer
+        """Сколько нажатий перемещения можно отложить на следующие шаги"""
+
+        self.held = set()
+        """Клавиши перемещения, удерживаемые сейчас"""
+
+        self.moves = deque(maxlen=self.prebuffer + 1)
+        """Нажатия клавиш перемещения, ещё не отданные игроку. Если их больше, чем помещается, забываются старые"""
+
+        self.digs = set()
+        """Клавиши рытья, нажатые с прошлого шага"""
+
+    def reset(self, pressed=None):
+        """Забыть всё накопленное. Вызывается при старте уровня.
+            pressed -- текущее состояние клавиатуры (pygame.key.get_pressed), чтобы учесть уже зажатые клавиши"""
+        self.held = set() if pressed is None else {key for key in MOVE_KEYS if pressed[key]}
+        self.moves.clear()
+        self.digs.clear()
+
+    def handle(self, event):
+        """Учёт события pygame. Можно передавать любые события, лишние игнорируются"""
+        if event.type == KEYDOWN:
+            if event.key in MOVE_KEYS:
+                self.held.add(event.key)
+                self.moves.append(event.key)
+            elif event.key in DIG_KEYS:
+                self.digs.add(event.key)
+        elif event.type == KEYUP:
+            self.held.discard(event.key)
+
+    def __call__(self) -> KeyState:
+        """Команда на очередной шаг игрока"""
+        keys = {self.moves.popleft()} if self.moves else self.held.copy()
+        keys |= self.digs
+        self.digs.clear()
+        return KeyState(keys)
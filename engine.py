@@ -0,0 +1,127 @@
+""" Игровой движок без экрана и звука.
+ Загружает уровень и выполняет те же правила игры, что и LodeRunner.py: падение, рытьё, сбор сокровищ,
+ погоню монстров, смертельные блоки и выход. Отрисовки нет, а игроком управляет заданный поток ввода,
+ а не клавиатура. Нужен для ботов, проверки уровней и регрессионного тестирования на серверах.
+
+ Запуск: python engine.py Levels/01.lvl [--inputs файл_ввода] [--steps N]
+ Файл ввода -- по строке на шаг игрока, в строке через пробел клавиши: up down left right dig_left dig_right.
+ Пустая строка -- игрок стоит на месте.
+"""
+
+import argparse
+import configparser
+import time
+import CC
+import block
+import character
+import level
+import clock
+from controls import KeyState, IDLE
+
+RESULT_NAMES = {getattr(CC, name): name for name in dir(CC) if name.startswith("GAME_OVER_")}
+"""Имена статусов завершения игры, для отчётов"""
+
+
+def init_config():
+    """Загрузка той же конфигурации игры, что использует LodeRunner.py, чтобы правила совпадали"""
+    CC.init_config(configparser.ConfigParser(), configparser.ConfigParser())
+    CC.init_timing()
+
+
+class Engine:
+    """Уровень, работающий без экрана и звука. Управление игроком -- через step()"""
+
+    def __init__(self, load_config=True):
+        load_config and init_config()
+        block.HEADLESS = True
+
+        self.level = level.Level()
+        self.level.init()
+        self.level.player.controls = self.get_pressed
+
+        self.clock = clock.GameClock()
+        self.keys = IDLE
+        """Клавиши, нажатые на текущем шаге игрока"""
+
+        self.result = CC.GAME_OVER_NOT_OVER
+        """Статус игры. Пока он равен GAME_OVER_NOT_OVER, симуляция продолжается"""
+
+    def get_pressed(self):
+        return self.keys
+
+    def load(self, filename, seed=None):
+        """Загрузка уровня и сброс часов. seed -- зерно случайных чисел уровня (см. Level.load)"""
+        self.level.load(filename, seed)
+        self.clock.reset()
+        self.result = CC.GAME_OVER_NOT_OVER
+
+    def snapshot(self, rng=True) -> bytes:
+        """Снимок состояния игры: статус и снимок уровня (см. Level.snapshot)"""
+        return bytes((self.result, )) + self.level.snapshot(rng)
+
+    def restore(self, snapshot: bytes):
+        """Восстановление игры из снимка. Часы переводятся на тик снимка"""
+        self.result = snapshot[0]
+        self.level.restore(snapshot[1:])
+        self.clock.seek(self.level.ticks)
+
+    def tick(self) -> int:
+        """Один тик симуляции. Возвращает статус игры"""
+        if self.result == CC.GAME_OVER_NOT_OVER:
+            self.result = self.level.update(*self.clock.step())
+        return self.result
+
+    def step(self, keys=IDLE) -> int:
+        """Один шаг игрока -- CC.STEP тиков. Клавиши читаются игроком на первом тике шага.
+            keys -- KeyState или набор кодов клавиш. Возвращает статус игры."""
+        self.keys = keys if isinstance(keys, KeyState) else KeyState(keys)
+        # То же, что CC.STEP вызовов tick. Но тики, где ничего не происходит, не выполняются по одному,
+        # а пропускаются разом -- обычно за шаг игрока реально работают два-три тика из CC.STEP
+        game_field, game_clock = self.level, self.clock
+        remaining = CC.STEP
+        while remaining and self.result == CC.GAME_OVER_NOT_OVER:
+            quiet = game_field.quiet_ticks(game_clock.player_tick, game_clock.beast_tick, remaining)
+            if quiet:
+                game_field.skip(quiet)
+                game_clock.seek(game_clock.ticks + quiet)
+                remaining -= quiet
+            else:
+                self.result = game_field.update(*game_clock.step())
+                remaining -= 1
+        return self.result
+
+    def run(self, inputs, max_steps=None) -> int:
+        """Прогон потока ввода, по одному элементу на шаг игрока. Возвращает статус игры.
+            Если задан max_steps, после окончания потока игрок стоит на месте, пока шагов не станет max_steps."""
+        inputs = iter(inputs)
+        steps = 0
+        while self.result == CC.GAME_OVER_NOT_OVER and (max_steps is None or steps < max_steps):
+            keys = next(inputs, None)
+            if keys is None:
+                if max_steps is None:
+                    break
+                keys = IDLE
+            self.step(keys)
+            steps += 1
+        return self.result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless LodeRunner level run")
+    parser.add_argument("level", help="level file")
+    parser.add_argument("--inputs", help="input stream file, one player step per line")
+    parser.add_argument("--steps", type=int, default=1000, help="maximum player steps")
+    args = parser.parse_args()
+
+    engine = Engine()
+    engine.load(args.level)
+    stream = []
+    if args.inputs is not None:
+        with open(args.inputs, "r") as inputs_file:
+            stream = [KeyState.parse(line) for line in inputs_file]
+
+    started = time.perf_counter()
+    engine.run(stream, args.steps)
+    duration = time.perf_counter() - started
+    print(f"{RESULT_NAMES[engine.result]}: {engine.clock.ticks} ticks in {duration:.3f}s "
+          f"({engine.clock.ticks / max(duration, 1e-9):.0f} ticks/s)")
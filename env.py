@@ -0,0 +1,156 @@
+""" Среда для обучения агентов в духе gym: reset() и step(action).
+ Работает на том же движке без экрана, что engine.py, то есть по настоящим правилам игры.
+ Шаг среды -- шаг игрока (CC.STEP тиков).
+
+ Наблюдение -- массив uint8 формы (OBSERVATION_CHANNELS, высота карты, ширина карты), для стандартных уровней --
+ (OBSERVATION_CHANNELS, CC.LEVEL_HEIGHT, CC.LEVEL_WIDTH): коды блоков карты (CC.BLOCK_IDS), сокровища, игрок,
+ монстры. В каналах сокровищ и персонажей 1 -- есть, 0 -- нет.
+ Массив выделяется заново, только когда меняется размер карты, и переписывается на каждом шаге на месте:
+ если наблюдение нужно сохранить, его надо скопировать. Отрисовки нет, пока её не попросят методом render.
+
+ Пример:
+    env = LodeRunnerEnv(["Levels"])
+    observation = env.reset()
+    while True:
+        observation, reward, done, info = env.step(agent(observation))
+        if done:
+            break
+"""
+
+import random
+from os import path
+import numpy as np
+import CC
+import engine
+import solver
+from controls import KeyState
+
+ACTION_NAMES = ("", "left", "right", "up", "down", "dig_left", "dig_right")
+"""Действия агента по номерам. Имена -- как в файле ввода engine.py, пустое имя -- ожидание"""
+
+ACTIONS = tuple(KeyState.parse(name) for name in ACTION_NAMES)
+
+BLOCKS_CHANNEL, TREASURES_CHANNEL, PLAYER_CHANNEL, BEASTS_CHANNEL = range(4)
+OBSERVATION_CHANNELS = 4
+
+REWARD_TREASURE = 1.0
+"""Награда за каждое собранное сокровище"""
+
+RESULT_REWARDS = {CC.GAME_OVER_COMPLETE: 10.0,
+                  CC.GAME_OVER_EATEN: -10.0,
+                  CC.GAME_OVER_STUCK: -10.0,
+                  CC.GAME_OVER_KILLED: -10.0,
+                  }
+"""Награда за завершение игры, по статусу CC.GAME_OVER_*"""
+
+
+class LodeRunnerEnv:
+    """Уровень игры как среда для агента"""
+
+    def __init__(self, levels=None, max_steps=1000, game=None):
+        """levels -- файлы уровней или каталоги с ними (по умолчанию Levels рядом с программой).
+            max_steps -- после стольких шагов попытка обрывается. game -- готовый engine.Engine"""
+        self.game = engine.Engine() if game is None else game
+        self.levels = solver.level_files(levels or [path.join(path.dirname(path.abspath(__file__)), "Levels")])
+        self.max_steps = max_steps
+        self.rng = random.Random()
+        """Выбор уровня и зерна, если они не заданы в reset"""
+
+        self.observation = np.zeros((OBSERVATION_CHANNELS, CC.LEVEL_HEIGHT, CC.LEVEL_WIDTH), dtype=np.uint8)
+        self.info = {"level": "", "result": "", "ticks": 0, "steps": 0, "treasures": 0, "truncated": False}
+        """Сведения о попытке. Тот же словарь обновляется на каждом шаге"""
+
+        self.steps = 0
+        self.revision = None
+        """Ревизия карты уровня, по которой заполнен канал блоков"""
+
+        self.treasures = 0
+        """Сколько сокровищ было на уровне после прошлого шага"""
+
+        self.units = list()
+        """Индексы (канал, строка, столбец) игрока и монстров в наблюдении после прошлого шага"""
+
+    @property
+    def action_count(self) -> int:
+        return len(ACTIONS)
+
+    def seed(self, seed=None):
+        """Зерно выбора уровней и зёрен попыток"""
+        self.rng.seed(seed)
+
+    def reset(self, level=None, seed=None) -> np.ndarray:
+        """Новая попытка. level -- номер уровня в списке levels или имя файла, по умолчанию случайный уровень.
+            seed -- зерно случайных чисел уровня (см. Level.load), по умолчанию случайное"""
+        if level is None:
+            level = self.rng.randrange(len(self.levels))
+        filename = level if isinstance(level, str) else self.levels[level]
+        self.game.load(filename, self.rng.randrange(1 << 32) if seed is None else seed)
+        self.steps = 0
+        self.revision = self.treasures = None
+        self.units.clear()
+        shape = (OBSERVATION_CHANNELS, self.game.level.height, self.game.level.width)
+        if self.observation.shape != shape:
+            self.observation = np.zeros(shape, dtype=np.uint8)
+        self.observation[...] = 0
+        self.observe()
+
+        self.info.update(level=filename, result=engine.RESULT_NAMES[self.game.result], ticks=0, steps=0,
+                         treasures=len(self.game.level.treasures), truncated=False)
+        return self.observation
+
+    def step(self, action: int) -> tuple:
+        """Шаг игрока. Возвращает наблюдение, награду, признак конца попытки и сведения о ней (info)"""
+        result = self.game.step(ACTIONS[action])
+        self.steps += 1
+        collected = self.treasures - len(self.game.level.treasures)
+        self.observe()
+
+        reward = collected * REWARD_TREASURE + RESULT_REWARDS.get(result, 0.0)
+        truncated = result == CC.GAME_OVER_NOT_OVER and self.steps >= self.max_steps
+        info = self.info
+        info["result"] = engine.RESULT_NAMES[result]
+        info["ticks"] = self.game.level.ticks
+        info["steps"] = self.steps
+        info["treasures"] = self.treasures
+        info["truncated"] = truncated
+        return self.observation, reward, result != CC.GAME_OVER_NOT_OVER or truncated, info
+
+    def observe(self):
+        """Обновление наблюдения на месте. Переписывается только то, что изменилось с прошлого шага"""
+        game_field = self.game.level
+        observation = self.observation
+        if self.revision != game_field.revision:
+            np.copyto(observation[BLOCKS_CHANNEL], game_field.grid[1:-1, 1:-1])
+            self.revision = game_field.revision
+
+        if self.treasures != len(game_field.treasures):
+            channel = observation[TREASURES_CHANNEL]
+            channel[...] = 0
+            for cell in game_field.treasures:
+                row, col = divmod(cell, game_field.stride)
+                channel[row - 1, col - 1] = 1
+            self.treasures = len(game_field.treasures)
+
+        units = self.units
+        for index in units:
+            observation[index] = 0
+        units.clear()
+        pos = game_field.player.pos
+        units.append((PLAYER_CHANNEL, pos[0], pos[1]))
+        for beast in game_field.beasts:
+            pos = beast.pos
+            units.append((BEASTS_CHANNEL, pos[0], pos[1]))
+        for index in units:
+            observation[index] = 1
+
+    def render(self) -> str:
+        """Текстовая картинка уровня: символы блоков из файлов уровней, сокровища, игрок и монстры"""
+        game_field = self.game.level
+        rows = [[CC.BLOCK_CHARS[block_id] for block_id in row] for row in game_field.grid[1:-1, 1:-1].tolist()]
+        for cell in game_field.treasures:
+            row, col = divmod(cell, game_field.stride)
+            rows[row - 1][col - 1] = CC.TREASURE_BLOCKS[0]
+        for beast in game_field.beasts:
+            rows[beast.pos[0]][beast.pos[1]] = CC.BEAST_BLOCKS[0]
+        rows[game_field.player.pos[0]][game_field.player.pos[1]] = 'I'
+        return "\n".join("".join(row) for row in rows)
@@ -8,17 +8,29 @@ import CC
 
 
 def load_sound(filename):
-    """Загрузка звукового эффекта. Все эффекты лежат в каталоге Sounds"""
-    if filename is None:
+    """Загрузка звукового эффекта. Все эффекты лежат в каталоге Sounds.
+        Если звук не инициализирован (например, игра работает без экрана и звука), возвращает None"""
+    if filename is None or pygame.mixer.get_init() is None:
         return None
     snd = pygame.mixer.Sound(path.join(path.dirname(__file__), "Sounds", filename))
     snd.set_volume(0.5)
     return snd
 
 
-def to_number(val):
-    """Return random number from provided range or value itself"""
-    return random.randrange(int(val[0]), int(val[1]), int(val[2])) if isinstance(val, (list, tuple)) else val
+def to_number(val, rng=random):
+    """Return random number from provided range or value itself. rng -- генератор случайных чисел уровня"""
+    return rng.randrange(int(val[0]), int(val[1]), int(val[2])) if isinstance(val, (list, tuple)) else val
+
+
+def level_size(lines: list) -> tuple:
+    """Размер карты уровня (строк, столбцов) по строкам его файла. Рамка, которую рисуют справа для наглядности
+        (символы CC.BORDER_BLOCK в конце строки), и пустые строки в конце файла в размер не входят.
+        Карта не меньше CC.LEVEL_HEIGHT x CC.LEVEL_WIDTH"""
+    lines = [line.rstrip("\r\n") for line in lines]
+    while lines and not lines[-1]:
+        lines.pop()
+    width = max((len(line.rstrip(CC.BORDER_BLOCK)) for line in lines), default=0)
+    return max(len(lines), CC.LEVEL_HEIGHT), max(width, CC.LEVEL_WIDTH)
 
 
 def check_bounds(pos: list):
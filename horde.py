@@ -0,0 +1,280 @@
+""" Орда: ходы множества монстров одного уровня разом, операциями над массивами.
+ Beast.move двигает монстров по очереди, и каждый следующий видит клетки, уже занятые предыдущими.
+ Это честно, но стоит несколько обращений к объектам на каждого монстра, и при сотнях монстров
+ шаг монстров перестаёт укладываться в кадр. Когда монстров на уровне не меньше CC.BEAST_HORDE,
+ Level.update двигает их этим модулем.
+
+ Правила хода те же, что в Beast.move: падение, съедение игрока, путь по полю расстояний (navigation),
+ подход к игроку напрямую, блуждание, смерть в смертельном блоке. Ходы получаются те же, что при ходе
+ по очереди. Решение монстра зависит только от занятости соседних клеток, а её меняют только монстры
+ не дальше двух клеток от него (и умершие, возрождаясь рядом). Поэтому монстры, рядом с которыми никого нет,
+ ходят разом, операциями над массивами. Монстры в толпе и умирающие разбираются по одному в порядке номеров,
+ по текущей занятости клеток, как в Level.update: очередь за уходящим монстром успевает занять его клетку.
+ Случайная длина блуждания (Beast.range) берётся из генератора уровня теми же вызовами в том же порядке,
+ так что игра с одним зерном идёт одинаково с ордой и без неё.
+
+ Объекты Beast остаются: их рисует Level.show_beasts, читают снимки уровня, бот и решатель.
+ Массивы заполняются из них перед шагом и записываются обратно после, так что всё, что меняет монстров
+ помимо шага (зарастание ям, восстановление снимка), учитывается само.
+ Пакетный движок (batch.py) орду не поддерживает: там монстры всегда ходят по очереди.
+
+ Клетки, как и в navigation, -- упакованные в число позиции уровня (см. Level.cell).
+"""
+
+import numpy as np
+import CC
+import character
+from glb import sign
+
+DIRECTION_KEYS = (character.K_IDLE, character.K_UP, character.K_DOWN, character.K_LEFT, character.K_RIGHT)
+"""Направления движения монстров по номерам. Номер 0 -- монстр стоит"""
+
+DIRECTION_CODES = {key: code for code, key in enumerate(DIRECTION_KEYS)}
+
+ANTIDIRECTION = np.array((0, 2, 1, 4, 3), dtype=np.int8)
+"""Обратные направления, по номерам (см. character.ANTIMOTION)"""
+
+NEIGHBOURHOOD = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-2, 0), (2, 0), (0, -2), (0, 2),
+                 (-1, -1), (-1, 1), (1, -1), (1, 1))
+"""Смещения (строка, столбец) клеток не дальше двух шагов. Монстры в них могут занять или освободить
+    соседние клетки друг друга"""
+
+
+class Horde:
+    """Монстры уровня в массивах: клетка, направление, idioticy и range.
+        Номер монстра -- его индекс в Level.beasts"""
+
+    def __init__(self, game_field):
+        self.game_field = game_field
+        stride = game_field.stride
+        self.motion = np.array((0, -stride, stride, -1, 1), dtype=np.intp)
+        """Смещение клетки по номеру направления"""
+
+        self.margin = 2 * stride + 2
+        """Отступ, с которым клетки лежат в карте числа монстров (см. crowded): соседи клеток у рамки
+            не выходят за её края"""
+
+        self.neighbourhood = np.array([row * stride + col for row, col in NEIGHBOURHOOD], dtype=np.intp)
+
+        self.cells = np.zeros(0, dtype=np.intp)
+        self.direction = np.zeros(0, dtype=np.int8)
+        self.idioticy = np.zeros(0, dtype=np.intp)
+        self.range = np.zeros(0, dtype=np.intp)
+
+        self.deadly = np.zeros(game_field.grid.size, dtype=bool)
+        """Клетки смертельных блоков. Они неподвижны, поэтому карта строится один раз"""
+        self.deadly[list(game_field.deadly)] = True
+
+    def pull(self):
+        """Заполнение массивов из объектов монстров. Монстров могут и убрать с уровня (см. solver.py),
+            поэтому размер массивов берётся по их списку"""
+        beasts = self.game_field.beasts
+        cell = self.game_field.cell
+        self.cells = np.array([cell(beast.pos) for beast in beasts], dtype=np.intp)
+        self.direction = np.array([DIRECTION_CODES[beast.move_direction] for beast in beasts], dtype=np.int8)
+        self.idioticy = np.array([beast.idioticy for beast in beasts], dtype=np.intp)
+        self.range = np.array([beast.range for beast in beasts], dtype=np.intp)
+
+    def push(self, start, falling, hanging):
+        """Запись шага в объекты монстров. start -- клетки в начале шага, falling -- маска падающих,
+            hanging -- маска монстров, начавших шаг на перекладине"""
+        stride = self.game_field.stride
+        rows, cols = np.divmod(self.cells - stride - 1, stride)
+        old_rows, old_cols = np.divmod(start - stride - 1, stride)
+        states = np.where(falling, character.STATE_FALL,
+                          np.where(hanging, character.STATE_HANG, character.STATE_STAND))
+        for beast, row, col, old_row, old_col, state, direction, idioticy, rng_range in \
+                zip(self.game_field.beasts, rows.tolist(), cols.tolist(), old_rows.tolist(), old_cols.tolist(),
+                    states.tolist(), self.direction.tolist(), self.idioticy.tolist(), self.range.tolist()):
+            beast.pos, beast.oldpos = [row, col], [old_row, old_col]
+            beast.move_state, beast.move_direction = state, DIRECTION_KEYS[direction]
+            beast.idioticy, beast.range = idioticy, rng_range
+
+    def move(self) -> int:
+        """Шаг всех монстров. Возвращает CC.GAME_OVER_EATEN, если монстр добрался до игрока,
+            иначе CC.GAME_OVER_NOT_OVER"""
+        game_field = self.game_field
+        stride = game_field.stride
+        motion = self.motion
+        self.pull()
+        traits = game_field.trait_table[game_field.grid].ravel()
+        player = game_field.cell(game_field.player.pos)
+        start = self.cells.copy()
+        here = traits[start]
+        free = (traits & CC.TRAIT_SOLID) == 0
+        climb = (here & CC.TRAIT_CLIMB) != 0
+        occupied = np.zeros(traits.size, dtype=bool)
+        occupied[start] = True
+
+        # Character.fall: монстры падают сквозь других монстров, без выбора хода
+        falling = ((traits[start + stride] & CC.TRAIT_SUPPORT) | (here & CC.TRAIT_CARRY)) == 0
+        self.cells[falling] += stride
+        self.direction[falling] = 0
+        eaten = ~falling & (start == player)
+        acting = ~falling & ~eaten
+        # Направления и idioticy до шага -- для монстров, которые потом будут разобраны по очереди
+        direction, idioticy = self.direction.copy(), self.idioticy.copy()
+
+        # Заявки на ход: клетка и направление. Занимать клетки будут только после разбора заявок
+        target = start.copy()
+        heading = self.direction.copy()
+        claimed = np.zeros(start.size, dtype=bool)
+
+        def try_move(mask, codes, obstacles=True):
+            """Character.move для монстров из mask в направлениях codes. Возвращает маску принятых заявок"""
+            cells = start + motion[codes]
+            ok = mask & (codes != 0) & free[cells] & ((codes != 1) | climb)
+            if obstacles:
+                ok &= ~occupied[cells]
+            target[ok] = cells[ok]
+            heading[ok] = codes[ok]
+            return ok
+
+        think = acting & (self.idioticy == 0)
+        flow = None
+        if think.any():
+            # Длина блуждания -- как в Beast.move: те же вызовы генератора уровня в том же порядке
+            randrange = game_field.rng.randrange
+            self.range[think] = [randrange(0, 4) for _ in range(np.count_nonzero(think))]
+
+            # Ход по полю расстояний (navigation.next_move): первый по порядку строго ближний свободный
+            game_field.navigation.update(game_field.player.pos)
+            flow = np.array(game_field.navigation.distance)
+            best = flow[start]
+            choice = np.zeros(start.size, dtype=np.int8)
+            for code in (1, 2, 3, 4):
+                cells = start + motion[code]
+                distance = flow[cells]
+                ok = think & (distance < best) & free[cells] & ~occupied[cells] & ((code != 1) | climb)
+                best = np.where(ok, distance, best)
+                choice[ok] = code
+            claimed = try_move(think & (choice != 0), choice)
+
+            # Пути нет -- напрямую к игроку: сначала по вертикали, потом по горизонтали
+            player_row, player_col = divmod(player, stride)
+            row, col = np.divmod(start, stride)
+            for disp, codes in ((np.sign(player_row - row), (1, 0, 2)), (np.sign(player_col - col), (3, 0, 4))):
+                claimed |= try_move(think & ~claimed, np.take(codes, disp + 1).astype(np.int8))
+
+        wander = acting & ~claimed
+        if not CC.BEAST_WANDER:
+            self.direction[wander] = 0
+        elif wander.any():
+            self.idioticy[wander] = ((self.idioticy + 1) * (self.idioticy < self.range))[wander]
+
+            # Продолжаем идти, куда шли, а упёршись -- поворачиваем назад
+            going = wander & (self.direction != 0)
+            ahead = try_move(going, self.direction)
+            turned = going & ~ahead
+            back = try_move(turned, ANTIDIRECTION[self.direction], obstacles=False)
+            self.direction[turned & ~back] = 0
+            claimed |= ahead | back
+
+        movers = np.flatnonzero(claimed)
+        self.cells[movers] = target[movers]
+        self.direction[movers] = heading[movers]
+
+        # Монстры в толпе -- по очереди, как в Level.update
+        dying = ~eaten & self.deadly[start]
+        crowded = self.crowded(start, dying)
+        if crowded.any():
+            self.resolve(np.flatnonzero(crowded), start, traits, acting, think, dying, direction, idioticy, flow)
+
+        self.push(start, falling, (here & CC.TRAIT_HANG) != 0)
+
+        # Смертельный блок проверяется в клетке, где монстр был в начале хода
+        for index in np.flatnonzero(dying).tolist():
+            deadly = game_field.deadly[int(start[index])]
+            deadly.hit_sound is None or deadly.hit_sound.play()
+            game_field.beasts[index].die()
+            self.cells[index] = game_field.cell(game_field.beasts[index].pos)
+
+        game_field.occupancy.reset(game_field.beasts, self.cells.tolist())
+        return (CC.GAME_OVER_NOT_OVER, CC.GAME_OVER_EATEN)[bool(eaten.any())]
+
+    def crowded(self, start, dying):
+        """Маска монстров, чей ход может зависеть от других: рядом, не дальше двух шагов, есть другой монстр,
+            монстр умирает или рядом с ним возрождается умирающий"""
+        margin = self.margin
+        count = np.bincount(start + margin, minlength=self.deadly.size + 2 * margin)
+        crowded = count[(start + margin)[:, None] + self.neighbourhood].sum(axis=1) > 1
+        if dying.any():
+            crowded |= dying
+            spawn = np.zeros(count.size, dtype=bool)
+            cell = self.game_field.cell
+            spawn_cells = np.array([cell(self.game_field.beasts[index].spawn_pos)
+                                    for index in np.flatnonzero(dying).tolist()], dtype=np.intp)
+            spawn[(spawn_cells + margin)[:, None] + self.neighbourhood[:5]] = True
+            crowded |= spawn[start + margin]
+        return crowded
+
+    def resolve(self, order, start, traits, acting, think, dying, direction, idioticy, flow):
+        """Ход монстров order (номера по возрастанию) по одному, как Beast.move, по текущей занятости клеток.
+            Монстры не из order с ними не соседствуют, и их ходы на эти решения не влияют.
+            direction и idioticy -- значения до шага, flow -- поле расстояний (None, если думающих нет).
+            Всё, что от занятости не зависит, собирается заранее операциями над массивами"""
+        game_field = self.game_field
+        stride = game_field.stride
+        order = np.array(order, dtype=np.intp)
+        cells = start[order]
+        neighbours = cells[:, None] + self.motion
+        # Свободна ли клетка по направлению: не стена и, для хода вверх, можно лезть
+        climb = (traits[cells] & CC.TRAIT_CLIMB) != 0
+        free = (traits[neighbours] & CC.TRAIT_SOLID) == 0
+        free[:, 0] = False
+        free[:, 1] &= climb
+        distance = np.zeros_like(neighbours) if flow is None else flow[neighbours]
+        player_row, player_col = divmod(game_field.cell(game_field.player.pos), stride)
+        rows, cols = np.divmod(cells, stride)
+        direct = np.stack((np.take((1, 0, 2), np.sign(player_row - rows) + 1),
+                           np.take((3, 0, 4), np.sign(player_col - cols) + 1)), axis=1)
+        spawn = dict.fromkeys(np.flatnonzero(dying).tolist())
+        for index in spawn:
+            spawn[index] = game_field.cell(game_field.beasts[index].spawn_pos)
+
+        antidirection = ANTIDIRECTION.tolist()
+        occupied = dict()
+        for cell in cells.tolist():
+            occupied[cell] = occupied.get(cell, 0) + 1
+        moved, targets, headings, idiots = list(), list(), list(), list()
+        for index, cell, cell_free, cell_distance, cell_direct, cell_neighbours, active, thinking, heading, idiot, \
+                rng_range in zip(order.tolist(), cells.tolist(), free.tolist(), distance.tolist(), direct.tolist(),
+                                 neighbours.tolist(), acting[order].tolist(), think[order].tolist(),
+                                 direction[order].tolist(), idioticy[order].tolist(), self.range[order].tolist()):
+            if active:
+                code = 0
+                if thinking:
+                    best = cell_distance[0]
+                    for candidate in (1, 2, 3, 4):
+                        if cell_distance[candidate] < best and cell_free[candidate] and \
+                                not occupied.get(cell_neighbours[candidate]):
+                            best, code = cell_distance[candidate], candidate
+                    if not code:
+                        code = next((candidate for candidate in cell_direct
+                                     if cell_free[candidate] and not occupied.get(cell_neighbours[candidate])), 0)
+                if code:
+                    heading = code
+                elif not CC.BEAST_WANDER:
+                    heading = 0
+                else:
+                    idiot = (idiot + 1) * (idiot < rng_range)
+                    if heading and cell_free[heading] and not occupied.get(cell_neighbours[heading]):
+                        code = heading
+                    elif heading:
+                        # Назад монстр уходит, не глядя на других (см. Beast.move)
+                        heading = antidirection[heading]
+                        code = heading = (0, heading)[cell_free[heading]]
+                target = cell_neighbours[code]
+                moved.append(index)
+                targets.append(target)
+                headings.append(heading)
+                idiots.append(idiot)
+            else:
+                target = int(self.cells[index])  # Падение или съедение -- уже известно
+
+            occupied[cell] -= 1
+            target = spawn.get(index, target)
+            occupied[target] = occupied.get(target, 0) + 1
+        self.cells[moved] = targets
+        self.direction[moved] = headings
+        self.idioticy[moved] = idiots
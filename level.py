@@ -1,10 +1,80 @@
 """Level class for managing level data and do all other needful things for levels"""
 
+import random
+import hashlib
+import struct
+import numpy as np
 import pygame
 import CC
 from glb import *
 import block
 import character
+import render
+import scheduler
+import navigation
+import camera
+
+SNAPSHOT_HEADER = struct.Struct("<IHHHH")
+"""Заголовок снимка уровня: тик, сколько осталось собрать сокровищ, число несобранных сокровищ,
+    временных блоков и монстров"""
+
+SNAPSHOT_TEMPORARY = struct.Struct("<BHBI")
+"""Временный блок в снимке: шаблон, клетка, код перекрытого блока (NO_UNDERLAY, если нет), тик появления"""
+
+SNAPSHOT_CHARACTER = struct.Struct("<hhhhIBdBB")
+"""Персонаж в снимке: позиция, прошлая позиция, направление, состояние, счётчик анимации,
+    и для монстров -- idioticy и range"""
+
+SNAPSHOT_RNG = struct.Struct("<Bd")
+"""Хвост состояния генератора случайных чисел: версия и запасённое значение gauss (NaN, если нет)"""
+
+TEMPORARY_KINDS = ("attack_left", "attack_right", "cracked")
+"""Шаблоны временных блоков (см. Player.temporary_prototype)"""
+
+NO_UNDERLAY = 0xFF
+
+
+class Occupancy:
+    """Индекс занятости клеток уровня монстрами: клетка -> список стоящих в ней монстров.
+        Проверка, занята ли клетка, выполняется за O(1) вместо перебора всех монстров.
+        Индекс нужно обновлять при каждом перемещении, смерти и возрождении монстра.
+
+        Клетки хранятся упакованными в число функцией cell (см. Level.cell)."""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.cells = dict()
+
+    def clear(self):
+        self.cells.clear()
+
+    def reset(self, characters, cells):
+        """Индекс заново: монстры characters в упакованных клетках cells"""
+        self.cells.clear()
+        for character, cell in zip(characters, cells):
+            self.cells.setdefault(cell, []).append(character)
+
+    def add(self, character):
+        """Регистрация монстра в его текущей клетке"""
+        self.cells.setdefault(self.cell(character.pos), []).append(character)
+
+    def move(self, character, oldpos):
+        """Перенос монстра из клетки oldpos в его текущую клетку"""
+        old_cell, new_cell = self.cell(oldpos), self.cell(character.pos)
+        if old_cell == new_cell:
+            return
+        characters = self.cells[old_cell]
+        characters.remove(character)
+        if not characters:
+            del self.cells[old_cell]
+        self.cells.setdefault(new_cell, []).append(character)
+
+    def at(self, pos) -> list:
+        """Монстры в заданной клетке"""
+        return self.cells.get(self.cell(pos), [])
+
+    def __contains__(self, pos):
+        return self.cell(pos) in self.cells
 
 
 class Level:
@@ -15,26 +85,106 @@ class Level:
         self.treasures_count = 0
         """Treasures in level"""
 
-        self.level = list()
-        """Layer for static tiles"""
+        self.grid = np.zeros((CC.LEVEL_HEIGHT + 2, CC.LEVEL_WIDTH + 2), dtype=np.uint8)
+        """Layer for static tiles. Числовые коды блоков (CC.BLOCK_IDS), карта окружена рамкой из CC.BORDER_BLOCK,
+            поэтому клетка [row, col] уровня хранится в grid[row + 1, col + 1]"""
+
+        self.exit = np.zeros_like(self.grid)
+        """Layer for exit ladder. Такая же карта кодов, как grid; пустые клетки -- код CC.EMPTY_BLOCK"""
+
+        self.trait_table = np.array(CC.BLOCK_TRAITS, dtype=np.uint16)
+        """Маски свойств по кодам блоков. Для векторных операций над картой"""
+
+        self.height, self.width = CC.LEVEL_HEIGHT, CC.LEVEL_WIDTH
+        """Размер карты в клетках, без рамки. Берётся из файла уровня (см. glb.level_size)"""
+
+        self.stride = CC.LEVEL_WIDTH + 2
+        """Длина строки карты вместе с рамкой. Клетка упаковывается в число (см. cell) -- её индекс в grid.flat"""
+
+        self.revision = 0
+        """Номер изменения карты. Увеличивается при каждом изменении grid, по нему перестраиваются
+            производные от карты структуры (граф перемещений монстров)"""
 
-        self.exit = list()
-        """Layer for exit ladder"""
+        self.navigation = navigation.FlowField(self)
+        """Поле расстояний до игрока, по которому монстры ищут путь"""
+
+        self.planned = 0
+        """Сколько монстров уже просчитали ход к ближайшему шагу монстров"""
 
         self.beasts = list()
         """List of beasts in level"""
 
+        self.occupancy = Occupancy(self.cell)
+        """Индекс клеток, занятых монстрами"""
+
+        self.horde = None
+        """Монстры в массивах (horde.Horde), если их на уровне не меньше CC.BEAST_HORDE. Иначе None"""
+
         self.player = None
         """Player character"""
 
         self.animated_entities = dict()
-        """List of animated things on map"""
+        """Animated things on map. Ключ -- упакованная клетка (см. cell)"""
+
+        self.treasures = dict()
+        """Сокровища, ещё не собранные игроком. Ключ -- упакованная клетка"""
+
+        self.treasure_blocks = dict()
+        """Все сокровища уровня, включая собранные. Нужны для восстановления снимка"""
+
+        self.deadly = dict()
+        """Смертельные анимированные блоки. Ключ -- упакованная клетка"""
+
+        self.exit_cells = np.zeros(0, dtype=np.intp)
+        """Упакованные клетки выхода с уровня"""
 
         self.sprites = dict()
         """List of all static blocks. Just ordinary sprites"""
 
-        self.temporary_items = list()
-        """List of short-lived items for game events animation"""
+        self.temporary_items = dict()
+        """Short-lived items for game events animation. Значение -- тик, на котором блок появился"""
+
+        self.scheduler = scheduler.Scheduler()
+        """Отложенные события уровня: зарастание блоков, удаление временных блоков"""
+
+        self.ticks = 0
+        """Номер текущего тика симуляции с начала уровня"""
+
+        self.seed = 0
+        """Зерно генератора случайных чисел уровня"""
+
+        self.rng = random.Random()
+        """Генератор случайных чисел уровня. Вся случайность симуляции берётся только из него"""
+
+        self.digest = ""
+        """Хэш файла уровня"""
+
+        self.drawn_rects = list()
+        """Области канвы, на которых в текущем кадре нарисованы анимированные блоки и персонажи.
+            В следующем кадре только они восстанавливаются из статичной картинки уровня."""
+
+        self.dirty_rects = list()
+        """Области канвы, изменившиеся за последний кадр. Их и нужно передавать в pygame.display.update"""
+
+        self.full_redraw = True
+        """Признак того, что канва перерисована целиком и обновлять нужно весь экран"""
+
+        self.render_queue = render.RenderQueue()
+        """Очередь пакетной отрисовки. Каждый слой кадра отправляется на канву одним вызовом"""
+
+        self.camera = camera.Camera()
+        """Окно экрана в уровень. Следует за игроком, если уровень больше экрана"""
+
+        self.chunks = camera.StaticChunks(self)
+        """Куски статичной картинки уровня, из которых собирается фон экрана"""
+
+        self.animated_chunks = camera.ChunkIndex()
+        """Анимированные блоки по кускам уровня. Если уровень больше экрана, рисуются только блоки кусков
+            под камерой. Обновляется вместе с animated_entities"""
+
+        self.animated_clock = self.beasts_clock = 0
+        """Тики анимации слоёв анимированных блоков и монстров с загрузки уровня. По ним анимация спрайтов,
+            которые были за краем экрана, догоняет пропущенное время (см. Block.drawn_at)"""
 
         self.level_end_sound = self.exit_appears_sound = None
         self.level_end_sound_filename = done_sound
@@ -50,6 +200,7 @@ class Level:
             if drawing surface changed."""
         self.canvas: pygame.Surface = canvas
         self.static_image: pygame.Surface = pygame.Surface(self.canvas.get_size()) if canvas is not None else None
+        canvas is None or self.camera.resize(view=canvas.get_size())
 
     def init(self, done_sound=None, exit_appears_sound=None):
         """Initialize object. This must be called after pygame init and screen canvas creation.
@@ -74,78 +225,132 @@ class Level:
                                        step=CC.STEP,
                                        animation_step=CC.PLAYER_ANIMATION_STEP)
 
-    def load(self, filename):
+    def load(self, filename, seed=None):
         """Загружает игровой уровень. Создаёт всю необходимую структуру и динамические объекты.
             Уровень -- текстовый файл с буквами и символами, соответствующими структуре уровня.
-            Если канва уже задана (не None), сразу рисует статичную картинку."""
-        self.level.clear()
-        self.exit.clear()
+            Если канва уже задана (не None), сразу рисует статичную картинку.
+            seed -- зерно случайных чисел уровня. С одним зерном и одним управлением игра повторяется в точности.
+            Если не задано, выбирается случайно."""
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.rng.seed(self.seed)
+        with open(filename, 'r') as lvl_stream:
+            lines = lvl_stream.readlines()
+        self.height, self.width = level_size(lines)
+        self.grid = np.full((self.height + 2, self.width + 2), CC.BLOCK_IDS[CC.BORDER_BLOCK], dtype=np.uint8)
+        self.grid[1:-1, 1:-1] = CC.BLOCK_IDS[CC.EMPTY_BLOCK]
+        self.exit = np.full_like(self.grid, CC.BLOCK_IDS[CC.EMPTY_BLOCK])
+        self.trait_table = np.array(CC.BLOCK_TRAITS, dtype=np.uint16)
+        self.stride = self.width + 2
+        self.revision += 1
         self.beasts.clear()
+        self.occupancy.clear()
+        self.planned = 0
         self.animated_entities.clear()
+        self.animated_chunks.clear()
+        self.treasures.clear()
+        self.treasure_blocks.clear()
+        self.deadly.clear()
         self.temporary_items.clear()
+        self.scheduler.clear()
+        self.ticks = 0
         self.treasures_count = 0
-
-        with open(filename, 'r') as lvl_stream:
-            animated = CC.BLOCKS["animated"]
-            # Цикл по строкам файла
-            for row, line in enumerate(lvl_stream):
-                static_line = list()
-                exit_line = list()
-
-                # Цикл по отдельным символам строки. Добавляем один символ, чтобы не писать в коде лишних проверок
-                # на выход за границы массива
-                for col, ch in enumerate(line[0:CC.LEVEL_WIDTH + 1]):
-                    exit_line.append(('.', ch)[ch in CC.EXIT_BLOCKS])
-                    static_line.append(('.', ch)[ch in CC.MAPPED_BLOCKS and ch not in CC.EXIT_BLOCKS])
-
-                    if ch in animated:
-                        self.animated_entities[str([row, col]) + ":" + ch] = \
-                            block.AnimatedBlock(animated[ch]["animation"]["idle"], [row, col],
-                                                subfolder=animated[ch]["folder"],
-                                                animation_delay=to_number(animated[ch]["animation"]["speed"]),
-                                                animation_pause=to_number(animated[ch]["animation"]["delay"]),
-                                                hit_sound=load_sound(animated[ch]["sounds"]["over"])
-                                                                if animated[ch]["sounds"] is not None else None)
-                        self.treasures_count += (ch in CC.TREASURE_BLOCKS)
-
-                    if ch in CC.BEAST_BLOCKS:
-                        monster = CC.BEAST_UNITS[ch]
-                        self.beasts.append(character.Beast(monster["animation"], self, [row, col],
-                                                           subfolder=monster["folder"],
-                                                           sounds=(None, None, load_sound(monster["sounds"]["death"])),
-                                                           idle_delay=monster["idle_delay"],
-                                                           fall_delay=monster["fall_delay"],
-                                                           step=CC.BEAST_STEP,
-                                                           animation_step=CC.BEAST_ANIMATION_STEP))
-
-                    # Персонаж может быть только один, поэтому данный алгоритм вернёт последнее найденное положение
-                    if ch == 'I':
-                        self.player.pos, self.player.oldpos = [[row, col]] * 2
-
-                self.level.append(static_line)
-                self.exit.append(exit_line)
-
-        # Additional hidden line to avoid 'index out of range' errors
-        self.level.append(static_line)
-
+        self.animated_clock = self.beasts_clock = 0
+
+        with open(filename, 'rb') as lvl_stream:
+            self.digest = hashlib.md5(lvl_stream.read()).hexdigest()
+
+        animated = CC.BLOCKS["animated"]
+        # Цикл по строкам файла
+        for row, line in enumerate(lines[:self.height]):
+            # Цикл по отдельным символам строки. Проверять выход за границы карты не нужно -- она окружена рамкой
+            for col, ch in enumerate(line[0:self.width]):
+                if ch in CC.EXIT_BLOCKS:
+                    self.exit[row + 1, col + 1] = CC.BLOCK_IDS[ch]
+                elif ch in CC.MAPPED_BLOCKS:
+                    self.grid[row + 1, col + 1] = CC.BLOCK_IDS[ch]
+
+                if ch in animated:
+                    cell = self.cell((row, col))
+                    self.animated_entities[cell] = \
+                        block.AnimatedBlock(animated[ch]["animation"]["idle"], [row, col],
+                                            subfolder=animated[ch]["folder"],
+                                            animation_delay=to_number(animated[ch]["animation"]["speed"], self.rng),
+                                            animation_pause=to_number(animated[ch]["animation"]["delay"], self.rng),
+                                            hit_sound=load_sound(animated[ch]["sounds"]["over"])
+                                                            if animated[ch]["sounds"] is not None else None)
+                    self.animated_chunks.add(cell, self.animated_entities[cell])
+                    if ch in CC.TREASURE_BLOCKS:
+                        self.treasures[cell] = self.animated_entities[cell]
+                        self.treasures_count += 1
+                    if ch in CC.DEADLY_BLOCKS:
+                        self.deadly[cell] = self.animated_entities[cell]
+
+                if ch in CC.BEAST_BLOCKS:
+                    monster = CC.BEAST_UNITS[ch]
+                    self.beasts.append(character.Beast(monster["animation"], self, [row, col],
+                                                       subfolder=monster["folder"],
+                                                       sounds=(None, None, load_sound(monster["sounds"]["death"])),
+                                                       idle_delay=monster["idle_delay"],
+                                                       fall_delay=monster["fall_delay"],
+                                                       step=CC.BEAST_STEP,
+                                                       animation_step=CC.BEAST_ANIMATION_STEP))
+                    self.occupancy.add(self.beasts[-1])
+
+                # Персонаж может быть только один, поэтому данный алгоритм вернёт последнее найденное положение
+                if ch == 'I':
+                    self.player.pos, self.player.oldpos = [[row, col]] * 2
+
+        self.exit_cells = np.flatnonzero(self.exit != CC.BLOCK_IDS[CC.EMPTY_BLOCK])
+        self.treasure_blocks.update(self.treasures)
+        # Модуль орды импортируется здесь, а не в начале: ему нужен уже загруженный модуль character
+        import horde
+        self.horde = horde.Horde(self) if len(self.beasts) >= CC.BEAST_HORDE else None
+        self.navigation.load(filename)
+        self.camera.resize(world=(self.width * CC.BLOCK_WIDTH, self.height * CC.BLOCK_WIDTH))
+        self.camera.center(*self.player_center())
         self.prepare_static()
         # Return true if success
         return True
 
     def prepare_static(self, canvas: pygame.Surface = None) -> None:
         """Процедура подготовки статичной части уровня для отрисовки.
-            Рисует статичные блоки на заранее подготовленной канве."""
+            Рисует статичные блоки под камерой на заранее подготовленной канве. Куски статичной картинки,
+            нарисованные по прошлой карте, выбрасываются."""
         canvas = (self.static_image, canvas)[canvas is not None]
         if canvas is None:
             return
+        self.chunks.clear()
+        self.chunks.compose(canvas, self.camera)
+
+    def patch_static(self, pos, ch):
+        """Заменяет один блок уровня и перерисовывает только его клетку статичной картинки.
+            Клетка сразу переносится на канву и попадает в список изменённых областей кадра."""
+        self[pos] = ch
+        self.redraw_static(pos)
+
+    def redraw_static(self, pos):
+        """Перерисовывает одну клетку статичной картинки по текущему содержимому карты"""
+        if self.static_image is None:
+            return
+
+        self.chunks.redraw(pos)
+        area = pygame.Rect(pos[1] * CC.BLOCK_WIDTH, pos[0] * CC.BLOCK_WIDTH, CC.BLOCK_WIDTH, CC.BLOCK_WIDTH)
+        rect = self.camera.to_screen(area)
+        if not rect.colliderect(self.static_image.get_rect()):
+            return
+        self.chunks.compose(self.static_image, self.camera, area)
 
-        # Clean game screen
-        canvas.fill((0, 0, 0))
-        for y, row in enumerate(self.level):
-            for x, blk in enumerate(row):
-                # Используем метод get. Он не выдаёт ошибок, если индекс отсутствует, а возвращает None, что удобнее
-                cur_block: block.Block = self.sprites.get(blk)
-                cur_block is None or cur_block.show(canvas, [y, x])
+        if self.canvas is not None:
+            self.canvas.blit(self.static_image, rect, rect)
+            self.drawn_rects.append(rect)
+
+    def show_exit(self):
+        """Накладывает выход на уровень. Там, где в слое выхода не пусто, используется его блок.
+            Перерисовываются только клетки выхода"""
+        self.grid.flat[self.exit_cells] = self.exit.flat[self.exit_cells]
+        self.revision += 1
+        for cell in self.exit_cells:
+            self.redraw_static(self.pos(cell))
 
     def show_static(self, canvas: pygame.Surface = None):
         """Переносит заранее нарисованную статичную часть уровня на заданную канву."""
@@ -153,128 +358,334 @@ class Level:
         if canvas is None:
             return
         canvas.blit(self.static_image, self.static_image.get_rect())
+        # Канва перерисована целиком, поэтому стирать в следующем кадре уже нечего
+        self.drawn_rects.clear()
+        self.full_redraw = True
 
-    def show_animated(self, tick=0, canvas: pygame.Surface = None):
-        """Отрисовка анимированных блоков уровня"""
+    def restore_static(self, canvas: pygame.Surface = None) -> list:
+        """Стирает нарисованное в прошлом кадре. Из статичной картинки восстанавливаются только те области,
+            на которых что-то рисовалось. Возвращает список восстановленных областей."""
+        canvas = (self.canvas, canvas)[canvas is not None]
+        erased, self.drawn_rects = self.drawn_rects, list()
+        if canvas is not None:
+            for rect in erased:
+                self.render_queue.blit(self.static_image, rect, rect)
+            self.render_queue.flush(canvas)
+        return erased
+
+    def show_animated(self, tick=0, canvas: pygame.Surface = None, elapsed=1):
+        """Отрисовка анимированных блоков уровня. Если уровень больше экрана, рисуются только блоки кусков
+            под камерой. Остальные пропускаются, не трогая их анимацию: она догонит время, когда блок снова
+            окажется на экране"""
         canvas = (self.canvas, canvas)[canvas is not None]
         if canvas is None:
             return
-        for anim in self.animated_entities.values():
-            anim.show(canvas, tick)
-
-    def show_beasts(self, tick=0, canvas: pygame.Surface = None):
-        """Рисует монстров уровня"""
+        clock = self.animated_clock = self.animated_clock + elapsed
+        anims = self.animated_entities.values() if self.camera.fixed else self.animated_chunks.visible(self.camera)
+        for anim in anims:
+            anim.show(self.render_queue, tick, clock - anim.drawn_at)
+            anim.drawn_at = clock
+        self.drawn_rects.extend(self.render_queue.flush(canvas, origin=self.camera.origin))
+
+    def show_beasts(self, tick=0, canvas: pygame.Surface = None, elapsed=1):
+        """Рисует монстров уровня. Монстры за краем экрана пропускаются, как анимированные блоки"""
         canvas = (self.canvas, canvas)[canvas is not None]
         if canvas is None:
             return
+        clock = self.beasts_clock = self.beasts_clock + elapsed
+        # Монстр между клетками может быть виден, даже если его клетка уже или ещё за краем
+        row0, row1, col0, col1 = self.camera.visible_cells(1)
         for beast in self.beasts:
-            beast.show(canvas, tick)
-
-    def show_player(self, tick=0, canvas: pygame.Surface = None):
-        """Рисует монстров уровня"""
+            if row0 <= beast.pos[0] <= row1 and col0 <= beast.pos[1] <= col1:
+                beast.show(self.render_queue, tick, clock - beast.drawn_at)
+                beast.drawn_at = clock
+        # Монстры орды часто стоят стопкой в одной клетке. Рисовать их друг на друге незачем
+        self.drawn_rects.extend(self.render_queue.flush(canvas, self.horde is not None, self.camera.origin))
+
+    def show_player(self, tick=0, canvas: pygame.Surface = None, elapsed=1):
+        """Рисует игрока"""
         canvas = (self.canvas, canvas)[canvas is not None]
         if canvas is None:
             return
-        self.player.show(canvas, tick)
+        self.player.show(self.render_queue, tick, elapsed)
+        self.drawn_rects.extend(self.render_queue.flush(canvas, origin=self.camera.origin))
 
-    def live(self, player_tick=0, beast_tick=0) -> int:
-        """Жизненный цикл уровня. Монстры бегут к игроку, кушают его и умирают, если попадут в ловушку.
-            Монстры отрисовываются."""
+    def player_center(self, tick=0) -> tuple:
+        """Центр спрайта игрока в пикселах уровня на тике шага игрока tick"""
+        x, y = self.player.get_screen_pos(self.player.animation_step, tick)
+        return x + CC.BLOCK_WIDTH / 2, y + CC.BLOCK_WIDTH / 2
+
+    def update(self, player_tick=0, beast_tick=0) -> int:
+        """Один тик симуляции уровня. Вся игровая логика, без отрисовки.
+            Монстры бегут к игроку, кушают его и умирают, если попадут в ловушку."""
 
         live_result = CC.GAME_OVER_NOT_OVER
-        # =====================
-        # Erasing old animation
-        # =====================
-        self.show_static()
+        self.ticks += 1
 
         # =======================================
         # Do player movement and collisions check
         # =======================================
         if not player_tick:
-            if not self.player.move(self.beasts, self.temporary_items):
+            if not self.player.move(self.occupancy, self.add_temporary):
                 live_result = CC.GAME_OVER_EATEN
             else:
                 self.collect_treasures()
             # Row position at 0 is win position
             live_result = (live_result, CC.GAME_OVER_COMPLETE)[not self.player.oldpos[0]]
 
-        # ===============================================
-        # Check for player death at deadly block
-        # ===============================================
-        if self[self.player.oldpos] in CC.DEADLY_BLOCKS:
-            key = str(self.player.oldpos) + ":" + str(self[self.player.oldpos])
-            self.animated_entities[key].hit_sound is None or self.animated_entities[key].hit_sound.play()
-            live_result = CC.GAME_OVER_KILLED
+            # ===============================================
+            # Check for player death at deadly block
+            # Смертельные блоки неподвижны, а игрок перемещается только на своём шаге -- на остальных тиках
+            # проверка дала бы тот же результат
+            # ===============================================
+            deadly = self.deadly.get(self.cell(self.player.oldpos))
+            if deadly is not None:
+                deadly.hit_sound is None or deadly.hit_sound.play()
+                live_result = CC.GAME_OVER_KILLED
+
+        # ===========================================================
+        # Timed events: blocks regrow and do collision check, finished temporary items are removed
+        # ===========================================================
+        if self.scheduler.due(self.ticks):
+            for event in self.scheduler.pop_due(self.ticks):
+                live_result = event() or live_result
+
+        # ========================================================
+        # Move all beasts and check for eating player or
+        # for death at deadly block.
+        # ========================================================
+        if beast_tick:
+            self.horde is None and self.planned < len(self.beasts) and self.plan_beasts(player_tick, beast_tick)
+        elif self.horde is not None:
+            live_result = self.horde.move() or live_result
+        elif self.beasts:
+            self.planned = 0
+            self.navigation.update(self.player.pos)
+            for beast in self.beasts:
+                before = tuple(beast.pos)
+                # Метод возвращает ложь, если монстр оказался в позиции игрока
+                # В нашей ситуации это означает съедение
+                if not beast.move(self.player.pos, self.occupancy):
+                    live_result = CC.GAME_OVER_EATEN
+                else:
+                    deadly = self.deadly.get(self.cell(beast.oldpos))
+                    if deadly is not None:
+                        deadly.hit_sound is None or deadly.hit_sound.play()
+                        beast.die()
+                # Следующие монстры должны видеть эту клетку уже занятой
+                self.occupancy.move(beast, before)
+
+        return live_result
+
+    def quiet_ticks(self, player_tick=0, beast_tick=0, limit=CC.STEP) -> int:
+        """Сколько следующих тиков (не больше limit), начиная с тика со счётчиками player_tick и beast_tick,
+            не меняют ничего, кроме номера тика: не ходят ни игрок, ни монстры и не наступают события.
+            Такие тики можно пропустить методом skip -- игра пойдёт так же. Ходы монстров тогда не просчитываются
+            заранее, а считаются на их шаге (см. FlowField.next_move)"""
+        if not player_tick or not beast_tick and self.beasts:
+            return 0
+        quiet = min(CC.STEP - player_tick, limit)
+        if self.beasts:
+            quiet = min(quiet, CC.BEAST_STEP - beast_tick)
+        upcoming = self.scheduler.next_tick()
+        return quiet if upcoming is None else max(min(quiet, upcoming - self.ticks - 1), 0)
+
+    def skip(self, ticks):
+        """Пропуск тиков, в которых ничего не происходит (см. quiet_ticks)"""
+        self.ticks += ticks
+
+    def plan_beasts(self, player_tick, beast_tick):
+        """Просчёт ходов монстров заранее, на тиках между их шагами. Сами ходы делаются, как и раньше,
+            все сразу на шаге монстров, но уже просчитанные ходы там только проверяются.
+            Так нагрузка расходится по тикам, а не приходится на один.
+
+            Просчёт имеет смысл, только когда игрок уже не сдвинется до шага монстров. Оставшиеся монстры
+            делятся поровну между оставшимися тиками."""
+        remaining = CC.BEAST_STEP - beast_tick
+        if CC.STEP - player_tick <= remaining or self.planned >= len(self.beasts):
+            return
+        count = -(-(len(self.beasts) - self.planned) // remaining)
+        self.navigation.update(self.player.pos)
+        for beast in self.beasts[self.planned:self.planned + count]:
+            beast.plan = self.navigation.plan(beast.pos)
+        self.planned += count
+
+    def draw(self, player_tick=0, beast_tick=0, elapsed=1):
+        """Отрисовка кадра уровня. Тики могут быть дробными -- положение персонажей интерполируется между клетками.
+            elapsed -- сколько тиков симуляции прошло с прошлого кадра. На столько продвигается анимация блоков."""
+        self.render_queue.start_frame()
+        # ==========================================================
+        # Камера следует за игроком. Если она сдвинулась, фон экрана
+        # собирается заново и экран перерисовывается целиком
+        # ==========================================================
+        if self.camera.follow(*self.player_center(player_tick)):
+            self.chunks.compose(self.static_image, self.camera)
+            self.show_static()
+
+        # ==========================================================
+        # Erasing old animation. Only previously drawn areas restored
+        # ==========================================================
+        erased = self.restore_static()
 
         # ================================================
         # Drawing items in their positions
         # First -- non-movable level blocks with animation
         # ================================================
-        self.show_animated(player_tick)
+        self.show_animated(player_tick, elapsed=elapsed)
 
         # ==================================================================
-        # Second -- draw temporary items and do collision check if necessary
+        # Second -- temporary items. Their animation follows simulation ticks since they appeared,
+        # so the ones off the screen just catch up later
         # ==================================================================
-        for tempBlock in self.temporary_items:
-            tempBlock.show(self.canvas, player_tick)
-            if tempBlock.died:
-                if tempBlock.underlay is not None:
-                    if not tempBlock.is_killing(self.player.pos, self.beasts):
-                        live_result = CC.GAME_OVER_STUCK
-                    self[tempBlock.pos] = tempBlock.underlay
-
-        # Отдельный цикл удаления умерших временных блоков. Вынесен потому, что иначе цикл отрисовки (выше)
-        # пропускает элементы, так как удалять приходится из перебираемого массива.
-        for tempBlock in self.temporary_items:
-            if tempBlock.died:
-                del self.temporary_items[self.temporary_items.index(tempBlock)]
+        row0, row1, col0, col1 = self.camera.visible_cells()
+        for tempBlock, born in self.temporary_items.items():
+            if row0 <= tempBlock.pos[0] <= row1 and col0 <= tempBlock.pos[1] <= col1:
+                tempBlock.show(self.render_queue, player_tick, self.ticks - born + 1 - tempBlock.age)
+        self.drawn_rects.extend(self.render_queue.flush(self.canvas, origin=self.camera.origin))
 
         # ===========================
         # Third -- draw player sprite
         # ===========================
-        self.show_player(player_tick)
+        self.show_player(player_tick, elapsed=elapsed)
 
-        # ========================================================
-        # Fourth -- move all beasts and check for eating player or
-        #           for death at deadly block. Draw them as well.
-        # ========================================================
-        for beast in self.beasts:
-            if not beast_tick:
-                # Метод возвращает ложь, если монстр оказался в позиции игрока
-                # В нашей ситуации это означает съедение
-                if not beast.move(self.player.pos, self.beasts):
-                    live_result = CC.GAME_OVER_EATEN
-                else:
-                    if self[beast.oldpos] in CC.DEADLY_BLOCKS:
-                        key = str(beast.oldpos) + ":" + str(self[beast.oldpos])
-                        self.animated_entities[key].hit_sound is None or self.animated_entities[key].hit_sound.play()
-                        beast.die()
-            beast.show(self.canvas, beast_tick)
+        # ============================
+        # Fourth -- draw beasts sprites
+        # ============================
+        self.show_beasts(beast_tick, elapsed=elapsed)
 
+        # ==================================================================
+        # Screen areas to update: erased in this frame and drawn in this one
+        # ==================================================================
+        self.dirty_rects = [self.canvas.get_rect()] if self.full_redraw else erased + self.drawn_rects
+        self.full_redraw = False
+
+    def live(self, player_tick=0, beast_tick=0) -> int:
+        """Жизненный цикл уровня: один тик симуляции и отрисовка кадра"""
+        live_result = self.update(player_tick, beast_tick)
+        self.draw(player_tick, beast_tick)
         return live_result
 
+    def add_temporary(self, temp_block: block.TemporaryBlock, born=None):
+        """Добавляет временный блок и планирует события его жизни.
+            Блок живёт с текущего тика. На тике смерти перекрытый им блок зарастает,
+            а на следующем тике, когда последний кадр уже показан, блок убирается.
+
+            born -- тик появления блока, если блок восстанавливается из снимка. Тогда текущий тик уже отыгран,
+            и события, время которых наступило, не планируются."""
+        first = self.ticks if born is None else self.ticks + 1
+        born = self.ticks if born is None else born
+        self.temporary_items[temp_block] = born
+        death = born + temp_block.lifetime() - 1
+        if temp_block.underlay is not None and death >= first:
+            self.scheduler.schedule(death, lambda: self.regrow(temp_block))
+        self.scheduler.schedule(death + 1, lambda: self.remove_temporary(temp_block))
+
+    def remove_temporary(self, temp_block: block.TemporaryBlock):
+        del self.temporary_items[temp_block]
+
+    def regrow(self, temp_block: block.TemporaryBlock):
+        """Зарастание блока, перекрытого временным. Если игрок оказался внутри, он застрял"""
+        result = (CC.GAME_OVER_STUCK, None)[temp_block.is_killing(self.player.pos, self.occupancy)]
+        self[temp_block.pos] = temp_block.underlay
+        return result
+
     def collect_treasures(self):
         """Проверка на подбор сокровища игроком. Если все сокровища собраны, добавляем выход с уровня"""
-        for chb in CC.TREASURE_BLOCKS:
-            key = str(self.player.oldpos) + ":" + chb
-            if key in self.animated_entities:
-                self.animated_entities[key].hit_sound is None or self.animated_entities[key].hit_sound.play()
-                del self.animated_entities[key]
-                self.treasures_count -= 1
-
-                # Все сокровища собраны, готовим выход
-                if self.treasures_count <= 0:
-                    self.exit_appears_sound.play()
-                    #  Эта строка объединяет два массива. Там где в массиве exit не стоит точка, используется
-                    # символ этого массива, иначе -- исходного. Своеобразное наложение по маске.
-                    self.level = [[elem[elem[1] != '.'] for elem in zip(level_row[0], level_row[1])]
-                                  for level_row in zip(self.level, self.exit)]
-                    self.prepare_static()
-                    self.show_static()
+        cell = self.cell(self.player.oldpos)
+        treasure = self.treasures.pop(cell, None)
+        if treasure is not None:
+            treasure.hit_sound is None or treasure.hit_sound.play()
+            del self.animated_entities[cell]
+            self.animated_chunks.remove(cell, treasure)
+            self.treasures_count -= 1
+
+            # Все сокровища собраны, готовим выход
+            if self.treasures_count <= 0:
+                self.exit_appears_sound is None or self.exit_appears_sound.play()
+                self.show_exit()
 
         # Возвращаем значение, чтобы в главном цикле можно было написать более лаконичный код
         return CC.GAME_OVER_NOT_OVER
 
+    def snapshot(self, rng=True) -> bytes:
+        """Снимок состояния уровня между тиками: карта, сокровища, временные блоки, игрок, монстры
+            и генератор случайных чисел. Компактная строка байтов, без картинок.
+            Анимация неподвижных блоков в снимок не входит -- на игру она не влияет.
+            rng -- сохранять ли генератор случайных чисел. Это больше половины снимка, а без монстров
+            он не нужен."""
+        parts = [SNAPSHOT_HEADER.pack(self.ticks, self.treasures_count, len(self.treasures),
+                                      len(self.temporary_items), len(self.beasts)),
+                 self.grid.tobytes(),
+                 np.array(list(self.treasures), dtype=np.uint16).tobytes()]
+        parts.extend(SNAPSHOT_TEMPORARY.pack(TEMPORARY_KINDS.index(temp.kind), self.cell(temp.pos),
+                                             NO_UNDERLAY if temp.underlay is None else CC.BLOCK_IDS[temp.underlay],
+                                             born)
+                     for temp, born in self.temporary_items.items())
+        # Персонаж, ещё ни разу не ходивший, не имеет прошлой позиции. Для него она совпадает с текущей
+        parts.extend(SNAPSHOT_CHARACTER.pack(*unit.pos, *(unit.oldpos or unit.pos), unit.move_direction,
+                                             unit.move_state, unit.current_ticks,
+                                             getattr(unit, "idioticy", 0), getattr(unit, "range", 0))
+                     for unit in [self.player] + self.beasts)
+
+        if rng:
+            version, state, gauss = self.rng.getstate()
+            parts.append(np.array(state, dtype=np.uint32).tobytes())
+            parts.append(SNAPSHOT_RNG.pack(version, float("nan") if gauss is None else gauss))
+        return b"".join(parts)
+
+    def restore(self, snapshot: bytes):
+        """Восстановление состояния уровня из снимка (см. snapshot). Снимок должен быть сделан на этом же уровне.
+            Если уровень рисуется, статичная картинка перерисовывается целиком."""
+        ticks, self.treasures_count, treasures, temporaries, beasts = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if beasts != len(self.beasts):
+            raise ValueError("Snapshot does not belong to the loaded level")
+        offset = SNAPSHOT_HEADER.size
+
+        self.grid[...] = np.frombuffer(snapshot, np.uint8, self.grid.size, offset).reshape(self.grid.shape)
+        offset += self.grid.size
+        self.revision += 1
+
+        for cell, treasure in self.treasures.items():
+            del self.animated_entities[cell]
+            self.animated_chunks.remove(cell, treasure)
+        self.treasures.clear()
+        for cell in np.frombuffer(snapshot, np.uint16, treasures, offset).tolist():
+            self.treasures[cell] = self.animated_entities[cell] = self.treasure_blocks[cell]
+            self.animated_chunks.add(cell, self.treasure_blocks[cell])
+        offset += treasures * 2
+
+        self.ticks = ticks
+        self.temporary_items.clear()
+        self.scheduler.clear()
+        for kind, cell, underlay, born in \
+                SNAPSHOT_TEMPORARY.iter_unpack(snapshot[offset:offset + temporaries * SNAPSHOT_TEMPORARY.size]):
+            temp_block = self.player.temporary_prototype(TEMPORARY_KINDS[kind]).copy()
+            temp_block.pos = self.pos(cell)
+            temp_block.underlay = None if underlay == NO_UNDERLAY else CC.BLOCK_CHARS[underlay]
+            self.add_temporary(temp_block, born)
+        offset += temporaries * SNAPSHOT_TEMPORARY.size
+
+        self.occupancy.clear()
+        self.planned = 0
+        for unit in [self.player] + self.beasts:
+            row, col, old_row, old_col, unit.move_direction, unit.move_state, unit.current_ticks, idioticy, rng_range = \
+                SNAPSHOT_CHARACTER.unpack_from(snapshot, offset)
+            offset += SNAPSHOT_CHARACTER.size
+            unit.pos, unit.oldpos = [row, col], [old_row, old_col]
+            if unit is not self.player:
+                unit.idioticy, unit.range, unit.plan = idioticy, rng_range, None
+                self.occupancy.add(unit)
+
+        # Генератор случайных чисел мог быть не сохранён. Тогда он остаётся как есть
+        if offset < len(snapshot):
+            state = np.frombuffer(snapshot, np.uint32, (len(snapshot) - offset - SNAPSHOT_RNG.size) // 4, offset)
+            version, gauss = SNAPSHOT_RNG.unpack_from(snapshot, len(snapshot) - SNAPSHOT_RNG.size)
+            self.rng.setstate((version, tuple(state.tolist()), None if gauss != gauss else gauss))
+
+        if self.canvas is not None:
+            self.prepare_static()
+            self.show_static()
+
     @staticmethod
     def play_background_music(filename):
         """Load and start playing level background music"""
@@ -284,12 +695,29 @@ class Level:
 
     def stop_all_sounds(self):
         """Stop playing all level related sounds. Used in level change procedure."""
-        self.exit_appears_sound.stop()
-        self.level_end_sound.stop()
+        self.exit_appears_sound is None or self.exit_appears_sound.stop()
+        self.level_end_sound is None or self.level_end_sound.stop()
+
+    def cell(self, pos) -> int:
+        """Клетка уровня, упакованная в число -- индекс клетки в grid.flat"""
+        return (pos[0] + 1) * self.stride + pos[1] + 1
+
+    def pos(self, cell) -> list:
+        """Позиция [строка, столбец] упакованной клетки"""
+        row, col = divmod(int(cell), self.stride)
+        return [row - 1, col - 1]
+
+    def traits(self, pos) -> int:
+        """Маска свойств (CC.TRAIT_*) блока в заданной клетке"""
+        return CC.BLOCK_TRAITS[self.grid.item(pos[0] + 1, pos[1] + 1)]
+
+    def trait_map(self, mask) -> np.ndarray:
+        """Карта уровня (без рамки), где истина в клетках, блоки которых имеют хотя бы одно из свойств mask"""
+        return (self.trait_table[self.grid[1:-1, 1:-1]] & mask) != 0
 
     def __getitem__(self, item):
-        return (None, self.level[item[0]][item[1]])[isinstance(item, (list, tuple))]
+        return CC.BLOCK_CHARS[self.grid.item(item[0] + 1, item[1] + 1)]
 
     def __setitem__(self, key, value):
-        if isinstance(key, (list, tuple)):
-            self.level[key[0]][key[1]] = value
+        self.grid[key[0] + 1, key[1] + 1] = CC.BLOCK_IDS[value]
+        self.revision += 1
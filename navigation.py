@@ -0,0 +1,331 @@
+""" Навигация монстров.
+ Монстры идут к игроку не напрямую, а по полю расстояний. Поле строится поиском в ширину от клетки игрока
+ по графу перемещений (ходьба, лестницы, перекладины, падение) и пересчитывается, только когда игрок
+ перешёл в другую клетку или изменилась карта. Поле одно на всех монстров, выбор хода -- несколько
+ обращений к списку.
+
+ При загрузке уровня строится таблица расстояний между всеми парами клеток. Она сохраняется на диск
+ (каталог __navcache__ рядом с программой, имя файла -- хэш карты), поэтому строится один раз.
+ Пока карта совпадает с исходной, поле расстояний берётся из таблицы готовым. Когда карта изменена
+ (вырыты ямы, появился выход), поле считается поиском в ширину по текущему графу. Исправлять поле из таблицы
+ только вокруг ям не выгоднее: на карте 42x22 поиск в ширину обходит несколько сотен клеток за 60-70 мкс,
+ а исправление затрагивает десятки клеток, но каждая обходится в разы дороже. Для больших карт
+ (больше TABLE_CELLS клеток) таблицы нет, и поле всегда считается поиском в ширину.
+
+ Клетки здесь -- упакованные в число позиции уровня (см. Level.cell).
+"""
+
+from os import path, makedirs
+from zipfile import BadZipFile
+import hashlib
+import numpy as np
+import CC
+
+CACHE_FOLDER = path.join(path.dirname(__file__), "__navcache__")
+"""Каталог таблиц расстояний. Один на все уровни: таблицы различаются по хэшу карты, а не по файлу уровня"""
+
+UNREACHABLE = 0xFFFF
+"""Расстояние от клетки, из которой игрока не достать"""
+
+TABLE_MEMORY = 32
+"""Сколько последних таблиц расстояний держать в памяти. Таблица уровня 40x20 -- около 1.7 Мб"""
+
+__tables = dict()
+"""Таблицы расстояний в памяти: имя файла таблицы -> DistanceTable. Порядок -- от давно использованных к недавним"""
+
+TABLE_CELLS = 4096
+"""Для карт больше стольких клеток (с рамкой) таблица расстояний не строится: её размер -- квадрат числа клеток,
+    для карты 200x100 это 800 Мб. На таких картах поле расстояний всегда считается поиском в ширину"""
+
+INCREMENTAL_LIMIT = 64
+"""Сколько клеток карты может измениться, чтобы граф перемещений ещё обновлялся по ним, а не строился заново"""
+
+
+def cell_moves(traits: list, cell: int, stride: int) -> list:
+    """Клетки, куда из клетки cell можно попасть за один шаг. traits -- маски свойств всех клеток карты"""
+    if traits[cell] & CC.TRAIT_SOLID:
+        return []  # В стенах и рамке уровня персонажей не бывает
+    if not (traits[cell + stride] & CC.TRAIT_SUPPORT or traits[cell] & CC.TRAIT_CARRY):
+        return [cell + stride]  # Падаем, других движений нет
+    return [cell + disp for disp in (-stride, stride, -1, 1)
+            if not traits[cell + disp] & CC.TRAIT_SOLID and (disp != -stride or traits[cell] & CC.TRAIT_CLIMB)]
+
+
+def build_moves(game_field) -> list:
+    """Граф перемещений уровня: для каждой клетки -- список клеток, куда из неё можно попасть за один шаг.
+        Правила те же, что в Character.fall и Character.move. Монстры как препятствия не учитываются.
+        Вертикальные шаги идут перед горизонтальными -- так монстры выбирают ход при равных расстояниях."""
+    stride = game_field.stride
+    traits = game_field.trait_table[game_field.grid].ravel().tolist()
+    moves = [[] for _ in traits]
+    for cell in range(stride + 1, len(traits) - stride - 1):
+        moves[cell] = cell_moves(traits, cell, stride)
+    return moves
+
+
+def build_dig_moves(game_field, chained=True) -> list:
+    """Граф перемещений игрока, дополненный рытьём: из клетки, где игрок стоит, можно сразу попасть в блок,
+        который он может вырыть (рядом с игроком пусто, под этой клеткой -- разрушаемый блок), а из вырытого
+        блока -- ходить, как из пустой клетки. Зарастание не учитывается.
+
+        chained -- считать, что соседние разрушаемые блоки тоже могут быть вырыты, и ходить в них из вырытого.
+        Тогда всё, куда игрок может попасть на самом деле, достижимо и по этому графу, так что по нему можно
+        доказать недостижимость и оценивать расстояния. Без chained граф ближе к тому, что игрок может
+        сделать из текущего положения: из ямы, вырытой в сплошном ряду, не выйти."""
+    stride = game_field.stride
+    moves = build_moves(game_field)
+    traits = game_field.trait_table[game_field.grid].ravel().tolist()
+    empty = (game_field.grid == CC.BLOCK_IDS[CC.EMPTY_BLOCK]).ravel().tolist()
+
+    for cell in range(stride + 1, len(traits) - stride - 1):
+        if traits[cell] & CC.TRAIT_DESTRUCTABLE:
+            if not traits[cell + stride] & CC.TRAIT_SUPPORT:
+                moves[cell].append(cell + stride)
+                continue
+            moves[cell].extend(cell + disp for disp in (stride, -1, 1)
+                               if not traits[cell + disp] & CC.TRAIT_SOLID or
+                               chained and traits[cell + disp] & CC.TRAIT_DESTRUCTABLE)
+        elif not traits[cell] & CC.TRAIT_SOLID and traits[cell + stride] & CC.TRAIT_SUPPORT:
+            moves[cell].extend(cell + stride + side for side in (-1, 1)
+                               if empty[cell + side] and traits[cell + stride + side] & CC.TRAIT_DESTRUCTABLE)
+    return moves
+
+
+def reverse_moves(moves: list) -> list:
+    """Обратный граф: для каждой клетки -- клетки, из которых в неё можно попасть за один шаг"""
+    sources = [[] for _ in moves]
+    for cell, targets in enumerate(moves):
+        for target in targets:
+            sources[target].append(cell)
+    return sources
+
+
+def bfs(sources: list, target: int, blocked=frozenset()) -> list:
+    """Поиск в ширину по обратному графу: число шагов от каждой клетки до target.
+        По прямому графу -- наоборот, число шагов от target до каждой клетки.
+        Через клетки из blocked пути не прокладываются"""
+    distance = [UNREACHABLE] * len(sources)
+    # Заблокированные клетки помечаются, чтобы не проверять каждую клетку по blocked
+    for cell in blocked:
+        distance[cell] = None
+    distance[target] = 0
+    # Обход слоями: все клетки очередного слоя на одном расстоянии от цели
+    layer, step = [target], 0
+    while layer:
+        step += 1
+        next_layer = []
+        for cell in layer:
+            for source in sources[cell]:
+                if distance[source] == UNREACHABLE:
+                    distance[source] = step
+                    next_layer.append(source)
+        layer = next_layer
+    for cell in blocked:
+        if cell != target:
+            distance[cell] = UNREACHABLE
+    return distance
+
+
+def next_move(moves: list, distance, cell: int, stride: int, occupied=()):
+    """Смещение (строка, столбец) для шага из клетки cell по кратчайшему пути.
+        distance -- расстояния до цели от каждой клетки. Клетки из occupied пропускаются.
+        Если цель недостижима или все пути заняты -- None."""
+    best, best_distance = None, distance[cell]
+    for move in moves[cell]:
+        if distance[move] < best_distance and move not in occupied:
+            best, best_distance = move, distance[move]
+    if best is None:
+        return None
+    row, col = divmod(best - cell + 1, stride)
+    return row, col - 1
+
+
+class DistanceTable:
+    """Кратчайшие расстояния между всеми парами клеток исходной карты уровня"""
+
+    def __init__(self, game_field, distance: np.ndarray = None):
+        self.grid = game_field.grid.copy()
+        """Карта, по которой построена таблица"""
+
+        self.stride = game_field.stride
+        self.moves = build_moves(game_field)
+        """Граф перемещений исходной карты"""
+
+        self.sources = reverse_moves(self.moves)
+        """Обратный граф исходной карты"""
+
+        self.distance = distance
+        """Матрица uint16: distance[куда, откуда] -- число шагов. Строка матрицы -- поле расстояний до клетки"""
+
+        if distance is None:
+            sources = self.sources
+            self.distance = np.full((len(sources), len(sources)), UNREACHABLE, dtype=np.uint16)
+            solid = (game_field.trait_table[self.grid] & CC.TRAIT_SOLID).ravel().tolist()
+            for target in range(len(sources)):
+                if not solid[target]:
+                    self.distance[target] = bfs(sources, target)
+
+    def matches(self, grid: np.ndarray) -> bool:
+        """Годится ли таблица для карты grid, то есть совпадает ли карта с исходной"""
+        return np.array_equal(self.grid, grid)
+
+    def get(self, source_pos, target_pos) -> int:
+        """Число шагов от source_pos до target_pos. UNREACHABLE, если дойти нельзя"""
+        return int(self.distance[self.cell(target_pos), self.cell(source_pos)])
+
+    def next_move(self, source_pos, target_pos):
+        """Смещение первого шага кратчайшего пути от source_pos до target_pos, или None"""
+        return next_move(self.moves, self.distance[self.cell(target_pos)], self.cell(source_pos), self.stride)
+
+    def cell(self, pos) -> int:
+        return (pos[0] + 1) * self.stride + pos[1] + 1
+
+
+def table_key(game_field) -> str:
+    """Хэш карты уровня вместе со свойствами блоков. Им именуется файл таблицы расстояний"""
+    digest = hashlib.md5(np.array(game_field.grid.shape, dtype=np.uint16).tobytes())
+    digest.update(game_field.grid.tobytes())
+    digest.update(game_field.trait_table.tobytes())
+    return digest.hexdigest()
+
+
+def load_table(game_field) -> DistanceTable:
+    """Таблица расстояний для только что загруженного уровня. Берётся из памяти или из каталога кэша,
+        а если её нет и там -- строится и сохраняется. Если сохранить не удалось (например, каталог программы
+        только для чтения), таблица просто не кэшируется."""
+    filename = path.join(CACHE_FOLDER, table_key(game_field) + ".npz")
+    table = __tables.pop(filename, None)
+    if table is None:
+        try:
+            with np.load(filename) as cached:
+                distance = cached["distance"]
+            if distance.shape == (game_field.grid.size, game_field.grid.size) and distance.dtype == np.uint16:
+                table = DistanceTable(game_field, distance)
+        except (OSError, ValueError, KeyError, EOFError, BadZipFile):
+            pass
+
+    if table is None:
+        table = DistanceTable(game_field)
+        try:
+            makedirs(path.dirname(filename), exist_ok=True)
+            np.savez_compressed(filename, distance=table.distance)
+        except OSError:
+            pass
+
+    # Последние загруженные таблицы держим в памяти: повторная загрузка уровня не читает диск
+    __tables[filename] = table
+    while len(__tables) > TABLE_MEMORY:
+        del __tables[next(iter(__tables))]
+    return table
+
+
+class FlowField:
+    """Поле расстояний до игрока, общее для всех монстров уровня"""
+
+    def __init__(self, game_field):
+        self.game_field = game_field
+
+        self.table = None
+        """Таблица расстояний исходной карты уровня (DistanceTable). None, если карта слишком велика для таблицы"""
+
+        self.static = False
+        """Совпадает ли карта с исходной. Тогда поле берётся из таблицы, а не считается"""
+
+        self.revision = None
+        """Ревизия карты уровня, по которой построен граф перемещений"""
+
+        self.grid = None
+        """Копия карты, по которой построен граф перемещений. По отличиям от неё граф обновляется
+            только в изменившихся клетках и их соседях"""
+
+        self.traits = list()
+        """Маски свойств клеток этой карты"""
+
+        self.moves = list()
+        """Граф перемещений (см. build_moves)"""
+
+        self.sources = list()
+        """Обратный граф: для каждой клетки -- клетки, из которых в неё можно попасть за один шаг"""
+
+        self.target = None
+        """Клетка, до которой посчитаны расстояния"""
+
+        self.distance = list()
+        """Число шагов от каждой клетки до целевой. UNREACHABLE, если дойти нельзя"""
+
+    def update(self, target_pos):
+        """Пересчёт поля до клетки target_pos. Если ни клетка, ни карта не изменились, ничего не делается"""
+        target = self.game_field.cell(target_pos)
+        if self.revision != self.game_field.revision:
+            self.static = self.table is not None and self.table.matches(self.game_field.grid)
+            self.update_moves()
+            self.revision = self.game_field.revision
+            self.target = None
+
+        if target == self.target:
+            return
+
+        self.target = target
+        self.distance = self.table.distance[target].tolist() if self.static else bfs(self.sources, target)
+
+    def update_moves(self):
+        """Приведение графа перемещений к текущей карте. Если изменилось немного клеток, перестраиваются
+            только списки ходов этих клеток и их соседей -- только от них зависят их ходы"""
+        grid = self.game_field.grid
+        changed = None if self.grid is None or self.grid.shape != grid.shape else \
+            np.flatnonzero(self.grid != grid).tolist()
+        if changed is None or len(changed) > INCREMENTAL_LIMIT:
+            self.grid = grid.copy()
+            self.traits = self.game_field.trait_table[grid].ravel().tolist()
+            if self.static:
+                self.moves = [list(_) for _ in self.table.moves]
+                self.sources = [list(_) for _ in self.table.sources]
+            else:
+                self.moves = build_moves(self.game_field)
+                self.sources = reverse_moves(self.moves)
+            return
+
+        stride = self.game_field.stride
+        for cell in changed:
+            self.grid.flat[cell] = grid.flat[cell]
+            self.traits[cell] = int(self.game_field.trait_table[grid.flat[cell]])
+        for cell in {cell + disp for cell in changed for disp in (0, -stride, stride, -1, 1)}:
+            moves = cell_moves(self.traits, cell, stride)
+            if moves != self.moves[cell]:
+                for target in self.moves[cell]:
+                    self.sources[target].remove(cell)
+                for target in moves:
+                    self.sources[target].append(cell)
+                self.moves[cell] = moves
+
+    def load(self, filename):
+        """Таблица расстояний для уровня, только что загруженного из файла filename"""
+        table = None if self.game_field.grid.size > TABLE_CELLS else load_table(self.game_field)
+        # При перезапуске того же уровня граф не строится заново: карта отличается от прошлой попытки
+        # немногими клетками, и они исправляются так же, как изменения карты во время игры
+        if table is not self.table:
+            self.grid = None
+        self.table = table
+        self.revision = None
+
+    def plan(self, pos) -> tuple:
+        """Заранее просчитанный ход из pos без учёта монстров, вместе с состоянием поля, для которого он верен.
+            Передаётся потом в next_move"""
+        cell = self.game_field.cell(pos)
+        return self.target, self.revision, cell, next_move(self.moves, self.distance, cell, self.game_field.stride)
+
+    def next_move(self, pos, obstacles=None, plan=None):
+        """Смещение (строка, столбец) для шага из pos к цели по кратчайшему пути.
+            Клетки, занятые другими монстрами (obstacles -- level.Occupancy), пропускаются.
+            Если цель недостижима или все пути заняты -- None.
+
+            plan -- ход, просчитанный заранее методом plan. Он используется, если с тех пор не изменились
+            ни цель, ни карта, ни клетка монстра, а клетка хода свободна. Тогда и заново был бы выбран он же."""
+        cell = self.game_field.cell(pos)
+        stride = self.game_field.stride
+        occupied = () if obstacles is None else obstacles.cells
+        if plan is not None and plan[:3] == (self.target, self.revision, cell):
+            disp = plan[3]
+            if disp is None or cell + disp[0] * stride + disp[1] not in occupied:
+                return disp
+        return next_move(self.moves, self.distance, cell, stride, occupied)
@@ -0,0 +1,59 @@
+""" Пакетная отрисовка.
+ Спрайты не рисуются на канве по одному. Вместо этого пары (картинка, позиция) собираются в очередь,
+ а затем отправляются на канву одним вызовом Surface.blits на каждый слой.
+"""
+
+import pygame
+
+
+class RenderQueue:
+    """Очередь отрисовки одного слоя кадра.
+
+        Совместима с Surface.blit по сигнатуре, поэтому её можно передавать в методы show
+        спрайтов вместо канвы. Ведёт счётчики отрисовок для измерения нагрузки.
+    """
+
+    def __init__(self):
+        self.items = list()
+        """Накопленные с прошлой отправки пары (картинка, позиция) или тройки (картинка, позиция, область)"""
+
+        self.frame_blits = 0
+        """Сколько картинок отрисовано в текущем кадре"""
+
+        self.frame_calls = 0
+        """Сколько вызовов Surface.blits сделано в текущем кадре"""
+
+        self.last_frame_blits = 0
+        """Сколько картинок было отрисовано в предыдущем кадре"""
+
+        self.last_frame_calls = 0
+        """Сколько вызовов Surface.blits было сделано в предыдущем кадре"""
+
+    def blit(self, image: pygame.Surface, dest, area=None):
+        """Ставит картинку в очередь. Сигнатура повторяет Surface.blit, но область изменения не возвращается --
+            она станет известна только при отправке очереди."""
+        self.items.append((image, dest) if area is None else (image, dest, area))
+
+    def flush(self, canvas: pygame.Surface, unique=False, origin=(0, 0)) -> list:
+        """Отрисовывает всю очередь одним вызовом и очищает её. Возвращает список изменённых областей канвы.
+            unique -- рисовать повторы (та же картинка в том же месте) один раз. Полупрозрачные края картинки
+            при повторе темнеют, поэтому по умолчанию очередь рисуется как есть.
+            origin -- точка, которая окажется в левом верхнем углу канвы (см. camera.Camera). Позиции картинок
+            в очереди -- относительно неё"""
+        if not self.items:
+            return []
+        if unique:
+            self.items[:] = dict.fromkeys(self.items)
+        if origin != (0, 0):
+            x, y = origin
+            self.items[:] = [(item[0], (item[1][0] - x, item[1][1] - y)) + item[2:] for item in self.items]
+        rects = canvas.blits(self.items)
+        self.frame_blits += len(self.items)
+        self.frame_calls += 1
+        self.items.clear()
+        return rects
+
+    def start_frame(self):
+        """Начало нового кадра. Счётчики текущего кадра переносятся в счётчики предыдущего"""
+        self.last_frame_blits, self.last_frame_calls = self.frame_blits, self.frame_calls
+        self.frame_blits = self.frame_calls = 0
@@ -0,0 +1,144 @@
+""" Запись и воспроизведение игры.
+ Симуляция детерминирована: вся случайность уровня берётся из генератора с известным зерном (Level.seed),
+ а игрок зависит только от управления. Поэтому для точного повтора игры достаточно запомнить уровень,
+ зерно, настройки и команды игрока -- по одной на каждое чтение управления.
+
+ Файл записи -- заголовок и сжатый zlib поток команд, по байту на команду (битовая маска клавиш).
+
+ Воспроизведение без экрана: python replay.py файл_записи [--level файл_уровня]
+"""
+
+import argparse
+import struct
+import zlib
+from os import path, makedirs
+import CC
+from controls import KeyState, IDLE, INPUT_KEYS
+
+REPLAY_KEYS = tuple(INPUT_KEYS.values())
+"""Клавиши по порядку битов маски команды"""
+
+MAGIC = b"LRRP"
+VERSION = 1
+
+HEADER = struct.Struct("<4sB16s16sQH")
+"""Заголовок файла: метка, версия, хэш уровня, хэш настроек, зерно, длина имени уровня. Дальше -- имя уровня"""
+
+__states = tuple(KeyState(key for bit, key in enumerate(REPLAY_KEYS) if mask >> bit & 1)
+                 for mask in range(1 << len(REPLAY_KEYS)))
+"""Состояния клавиш для всех масок команды"""
+
+
+def encode(keys) -> int:
+    """Битовая маска команды из состояния клавиш"""
+    return sum(1 << bit for bit, key in enumerate(REPLAY_KEYS) if keys[key])
+
+
+def decode(mask: int) -> KeyState:
+    """Состояние клавиш из битовой маски команды"""
+    return __states[mask]
+
+
+class Replay:
+    """Запись попытки прохождения уровня"""
+
+    def __init__(self, level_name="", level_digest="", config_digest="", seed=0, inputs=None):
+        self.level_name = level_name
+        """Имя файла уровня. Только для удобства -- уровень проверяется по хэшу"""
+
+        self.level_digest = level_digest
+        self.config_digest = config_digest
+        self.seed = seed
+        self.inputs = bytearray() if inputs is None else bytearray(inputs)
+        """Маски команд игрока, в порядке чтения управления"""
+
+    @staticmethod
+    def start(game_field, level_name=""):
+        """Новая запись для только что загруженного уровня"""
+        return Replay(path.basename(level_name), game_field.digest, CC.config_digest(), game_field.seed)
+
+    def check(self, game_field) -> list:
+        """Расхождения уровня и настроек с записанными. Пустой список, если запись можно воспроизвести"""
+        problems = []
+        if game_field.digest != self.level_digest:
+            problems.append("level file differs from the recorded one")
+        if CC.config_digest() != self.config_digest:
+            problems.append("game settings differ from the recorded ones")
+        return problems
+
+    def save(self, filename):
+        name = self.level_name.encode()
+        makedirs(path.dirname(path.abspath(filename)), exist_ok=True)
+        with open(filename, "wb") as replay_file:
+            replay_file.write(HEADER.pack(MAGIC, VERSION, bytes.fromhex(self.level_digest),
+                                          bytes.fromhex(self.config_digest), self.seed, len(name)))
+            replay_file.write(name)
+            replay_file.write(zlib.compress(bytes(self.inputs)))
+
+    @staticmethod
+    def load(filename):
+        with open(filename, "rb") as replay_file:
+            data = replay_file.read()
+        magic, version, level_digest, config_digest, seed, name_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a replay file of version {VERSION}")
+        name_end = HEADER.size + name_length
+        return Replay(data[HEADER.size:name_end].decode(), level_digest.hex(), config_digest.hex(), seed,
+                      zlib.decompress(data[name_end:]))
+
+
+class Recorder:
+    """Источник управления игрока, который записывает команды другого источника"""
+
+    def __init__(self, controls, replay: Replay):
+        self.controls = controls
+        self.replay = replay
+
+    def __call__(self):
+        keys = self.controls()
+        self.replay.inputs.append(encode(keys))
+        return keys
+
+
+class ReplayControls:
+    """Источник управления игрока, выдающий записанные команды. После конца записи игрок стоит на месте"""
+
+    def __init__(self, replay: Replay):
+        self.inputs = replay.inputs
+        self.position = 0
+        """Номер следующей команды"""
+
+        self.overrun = False
+        """Игрок запросил команду после конца записи. Записанная игра на этом месте уже закончилась"""
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.inputs)
+
+    def __call__(self) -> KeyState:
+        if self.finished:
+            self.overrun = True
+            return IDLE
+        self.position += 1
+        return decode(self.inputs[self.position - 1])
+
+
+if __name__ == "__main__":
+    import engine
+
+    parser = argparse.ArgumentParser(description="Headless LodeRunner replay")
+    parser.add_argument("replay", help="replay file")
+    parser.add_argument("--level", help="level file, by default the recorded one from the Levels folder")
+    args = parser.parse_args()
+
+    recorded = Replay.load(args.replay)
+    game = engine.Engine()
+    game.load(args.level or path.join(path.dirname(__file__), "Levels", recorded.level_name), recorded.seed)
+    for problem in recorded.check(game.level):
+        print(f"Warning: {problem}")
+
+    playback = game.level.player.controls = ReplayControls(recorded)
+    while game.step() == CC.GAME_OVER_NOT_OVER and not playback.overrun:
+        pass
+    print(f"{engine.RESULT_NAMES[game.result]} after {game.clock.ticks} ticks, "
+          f"{playback.position} of {len(recorded.inputs)} commands played")
@@ -0,0 +1,48 @@
+""" Планировщик событий уровня.
+ Отложенные события -- зарастание разрушенных блоков, удаление отыгравших временных блоков и прочие
+ будущие механики со временем -- хранятся в куче, упорядоченной по номеру тика.
+ На каждом тике извлекаются только наступившие события, живые объекты при этом не перебираются.
+"""
+
+import heapq
+
+
+class Scheduler:
+    """Очередь событий по тикам симуляции.
+
+        Событие -- функция без параметров. Функция может вернуть статус игры (CC.GAME_OVER_*),
+        если событие закончило игру. События одного тика выполняются в порядке планирования.
+    """
+
+    def __init__(self):
+        self.queue = list()
+        """Куча троек (тик, порядковый номер, событие)"""
+
+        self.counter = 0
+        """Порядковый номер следующего события. Сохраняет порядок событий одного тика"""
+
+    def __len__(self):
+        return len(self.queue)
+
+    def clear(self):
+        self.queue.clear()
+        self.counter = 0
+
+    def schedule(self, tick: int, event):
+        """Планирует событие на тик tick"""
+        heapq.heappush(self.queue, (tick, self.counter, event))
+        self.counter += 1
+
+    def due(self, tick: int) -> bool:
+        """Есть ли события, наступившие к тику tick. Дешёвая проверка для тиков без событий"""
+        return bool(self.queue) and self.queue[0][0] <= tick
+
+    def next_tick(self):
+        """Тик ближайшего события. None, если событий нет"""
+        return self.queue[0][0] if self.queue else None
+
+    def pop_due(self, tick: int):
+        """Извлекает события, наступившие к тику tick. События, запланированные на этот же тик
+            во время перебора, тоже извлекаются."""
+        while self.queue and self.queue[0][0] <= tick:
+            yield heapq.heappop(self.queue)[2]
@@ -0,0 +1,288 @@
+""" Проверка проходимости уровней.
+ Перебор действий игрока (шаги, рытьё, ожидание) по настоящим правилам игры -- через движок без экрана
+ и снимки уровня. Одинаковые состояния, в которые можно прийти разными путями, рассматриваются один раз.
+ Раньше раскрываются состояния, где меньше несобранных сокровищ и ближе до ближайшего из них
+ (расстояния оцениваются по графу перемещений, дополненному рытьём, см. navigation.build_dig_moves).
+
+ Тот же граф доказывает непроходимость: если от игрока по нему не дойти до какого-нибудь сокровища
+ или до верхнего ряда, уровень непроходим без перебора, а такие состояния в переборе отбрасываются.
+ Рытьё перебирается целыми приёмами: вырыть и спрыгнуть в яму, прокопать лесенкой на несколько рядов вниз.
+ Ямы сами зарастают, и возраст ямы в состояние не входит -- перебор неполный, и если он кончился
+ ничем, итог UNKNOWN.
+
+ Монстры по умолчанию убираются с уровня: проверяется, что уровень можно пройти в принципе.
+ С монстрами перебор по одному шагу и с возрастом ям, как раньше.
+
+ Запуск: python solver.py [уровни или каталоги ...] [--jobs N] [--max-states N] [--beasts] [--path]
+ Найденный путь (--path) выводится в формате файла ввода engine.py -- по строке на шаг игрока.
+"""
+
+import argparse
+import heapq
+import time
+from types import SimpleNamespace
+from os import path, listdir
+from concurrent.futures import ProcessPoolExecutor
+from pygame.locals import *
+import CC
+import navigation
+from controls import KeyState, IDLE
+
+ACTIONS = {"left": KeyState((K_LEFT, )),
+           "right": KeyState((K_RIGHT, )),
+           "up": KeyState((K_UP, )),
+           "down": KeyState((K_DOWN, )),
+           "dig_left": KeyState((K_q, )),
+           "dig_right": KeyState((K_w, )),
+           "": IDLE,
+           }
+"""Действия игрока на один шаг. Имена -- как в файле ввода engine.py, пустое имя -- ожидание"""
+
+SOLVABLE = "solvable"
+UNSOLVABLE = "unsolvable"
+UNKNOWN = "unknown"
+"""Итоги проверки. UNKNOWN -- перебор остановлен по ограничению числа состояний или кончился,
+    но был неполным"""
+
+MAX_DIG_DEPTH = 4
+"""Сколько рядов вниз прокапывается лесенкой за один приём"""
+
+DISTANCE_WEIGHT = 2
+"""Вес оценки расстояния до цели против числа уже сделанных шагов при выборе состояния"""
+
+
+def staircase(depth, dig, step, back) -> tuple:
+    """Действия, которыми игрок прокапывает лесенку на depth рядов вниз в сторону step и спускается в неё.
+        В каждом ряду он копает от дальнего края к себе, отступая назад (back), и спрыгивает в ближнюю яму.
+        При depth 1 -- вырыть и спрыгнуть"""
+    res = []
+    for layer in range(1, depth + 1):
+        res += [step] * (depth - layer)
+        for dug in range(depth - layer, -1, -1):
+            res.append(dig)
+            dug and res.append(back)
+        res.append(step)
+    return tuple(res)
+
+
+class Solution:
+    """Итог проверки одного уровня"""
+
+    def __init__(self, level_name, status, path_steps=None, states=0, duration=0.0):
+        self.level_name = level_name
+        self.status = status
+        self.path = path_steps or []
+        """Действия игрока по шагам (ключи ACTIONS), если уровень пройден"""
+
+        self.states = states
+        """Сколько состояний рассмотрено"""
+
+        self.duration = duration
+
+    def __str__(self):
+        res = f"{self.level_name}: {self.status}, {self.states} states, {self.duration:.2f}s"
+        return res + (f", {len(self.path)} steps" if self.status == SOLVABLE else "")
+
+
+class Solver:
+    """Поиск пути прохождения уровня"""
+
+    def __init__(self, game=None, max_states=50000, beasts=False):
+        import engine
+        self.game = engine.Engine() if game is None else game
+        self.max_states = max_states
+        self.beasts = beasts
+        self.treasure_distance = dict()
+        """Для каждой клетки с сокровищем -- оценка числа шагов до неё от каждой клетки"""
+
+        self.exit_distance = list()
+        """Оценка числа шагов до верхнего ряда от каждой клетки, когда сокровища собраны"""
+
+    def state_key(self) -> int:
+        """Хэш состояния уровня, значимого для дальнейшей игры. Номер тика и анимация в него не входят.
+            От открытых ям учитывается только место, а с монстрами -- и возраст, а не тик появления"""
+        game_field = self.game.level
+        key = (game_field.cell(game_field.player.pos), game_field.grid.tobytes(), tuple(game_field.treasures),
+               tuple(game_field.cell(temp.pos) for temp in game_field.temporary_items if temp.underlay is not None))
+        if self.beasts:
+            key += (tuple((game_field.cell(temp.pos), game_field.ticks - born)
+                          for temp, born in game_field.temporary_items.items()),
+                    game_field.ticks % CC.BEAST_STEP,
+                    tuple((tuple(beast.pos), beast.idioticy, beast.range, beast.move_direction)
+                          for beast in game_field.beasts))
+        return hash(key)
+
+    def estimate(self) -> tuple:
+        """Приоритет состояния: меньше несобранных сокровищ, затем ближе до ближайшего из них.
+            Когда сокровищ нет -- ближе до верхнего ряда. Если до какого-нибудь сокровища или до верхнего
+            ряда не дойти, вторая часть -- navigation.UNREACHABLE: из такого состояния уровень не пройти"""
+        game_field = self.game.level
+        cell = game_field.cell(game_field.player.pos)
+        if not game_field.treasures:
+            return 0, self.exit_distance[cell]
+        distances = [self.treasure_distance[treasure][cell] for treasure in game_field.treasures]
+        if max(distances) == navigation.UNREACHABLE or self.exit_distance[cell] == navigation.UNREACHABLE:
+            return len(distances), navigation.UNREACHABLE
+        return len(distances), min(distances)
+
+    def relaxed_sources(self, open_exit=False) -> list:
+        """Обратный граф перемещений исходной карты с рытьём соседних блоков (см. navigation.build_dig_moves)"""
+        game_field = self.game.level
+        grid = game_field.grid.copy()
+        if open_exit:
+            grid.flat[game_field.exit_cells] = game_field.exit.flat[game_field.exit_cells]
+        return navigation.reverse_moves(navigation.build_dig_moves(
+            SimpleNamespace(grid=grid, stride=game_field.stride, trait_table=game_field.trait_table), chained=True))
+
+    def prepare(self):
+        """Оценки расстояний для только что загруженного уровня. Через смертельные блоки пути нет"""
+        game_field = self.game.level
+        deadly = frozenset(game_field.deadly)
+        sources = self.relaxed_sources()
+        self.treasure_distance = {treasure: navigation.bfs(sources, treasure, deadly)
+                                  for treasure in game_field.treasures}
+
+        sources = self.relaxed_sources(True)
+        self.exit_distance = [navigation.UNREACHABLE] * len(sources)
+        for target in range(game_field.stride + 1, 2 * game_field.stride - 1):
+            self.exit_distance = list(map(min, self.exit_distance, navigation.bfs(sources, target, deadly)))
+
+    def falling(self) -> bool:
+        """Игрок падает: управление не читается"""
+        game_field = self.game.level
+        pos = game_field.player.pos
+        return not (game_field.traits((pos[0] + 1, pos[1])) & CC.TRAIT_SUPPORT or
+                    game_field.traits(pos) & CC.TRAIT_CARRY)
+
+    def actions(self) -> list:
+        """Ходы, которые имеет смысл пробовать в текущем состоянии. Ход -- действия на несколько шагов"""
+        game_field = self.game.level
+        if self.falling():
+            return [("", )]
+
+        row, col = pos = game_field.player.pos
+        res = []
+        for name, (d_row, d_col) in (("left", (0, -1)), ("right", (0, 1)), ("up", (-1, 0)), ("down", (1, 0))):
+            # В стену и вверх не по лестнице игрок не сдвинется
+            if not (game_field.traits((row + d_row, col + d_col)) & CC.TRAIT_SOLID or
+                    name == "up" and not game_field.traits(pos) & CC.TRAIT_CLIMB):
+                res.append((name, ))
+
+        for name, side, step, back in (("dig_left", -1, "left", "right"), ("dig_right", 1, "right", "left")):
+            if game_field[(row, col + side)] != CC.EMPTY_BLOCK:
+                continue
+            # С монстрами яма бывает нужна, чтобы поймать монстра, а не чтобы в неё прыгать
+            self.beasts and game_field.traits((row + 1, col + side)) & CC.TRAIT_DESTRUCTABLE and res.append((name, ))
+            for depth in range(1, MAX_DIG_DEPTH + 1):
+                if depth > 1 and game_field[(row, col + side * depth)] != CC.EMPTY_BLOCK or \
+                        not all(game_field.traits((row + layer, col + side * dug)) & CC.TRAIT_DESTRUCTABLE
+                                for layer in range(1, depth + 1) for dug in range(layer, depth + 1)):
+                    break
+                res.append(staircase(depth, name, step, back))
+        # Ждать имеет смысл, только пока что-то меняется само
+        if self.beasts or any(temp.underlay is not None for temp in game_field.temporary_items):
+            res.append(("", ))
+        return res
+
+    def play(self, move) -> tuple:
+        """Ход из текущего состояния. Перед каждым действием хода, кроме первого, игрок долетает до опоры.
+            Возвращает итог игры и сделанные действия по шагам"""
+        result = CC.GAME_OVER_NOT_OVER
+        done = []
+        for number, action in enumerate(move):
+            while number and self.falling() and result == CC.GAME_OVER_NOT_OVER:
+                result = self.game.step(ACTIONS[""])
+                done.append("")
+            if result != CC.GAME_OVER_NOT_OVER:
+                break
+            result = self.game.step(ACTIONS[action])
+            done.append(action)
+            if result != CC.GAME_OVER_NOT_OVER:
+                break
+        return result, done
+
+    def solve(self, filename) -> Solution:
+        started = time.perf_counter()
+        self.game.load(filename, 0)
+        if not self.beasts:
+            self.game.level.beasts.clear()
+            self.game.level.occupancy.clear()
+        self.prepare()
+        if self.estimate()[1] == navigation.UNREACHABLE:
+            return Solution(path.basename(filename), UNSOLVABLE, states=1, duration=time.perf_counter() - started)
+
+        parents = {self.state_key(): None}
+        """Для каждого рассмотренного состояния -- (предыдущее состояние, действия хода)"""
+        # Куча (оценка, -порядковый номер, шаги, ключ, снимок). Оценка -- число несобранных сокровищ, затем
+        # сделанные шаги плюс взвешенное расстояние до цели. При равной оценке раньше берутся более новые
+        # состояния, то есть поиск идёт вглубь, а не перебирает всё равноценное подряд
+        queue = [((0, 0), 0, 0, self.state_key(), self.game.snapshot(self.beasts))]
+        counter = 1
+        status = (UNKNOWN, UNSOLVABLE)[self.beasts]
+        goal = None
+        """Последний ход: (состояние перед ним, действия)"""
+        while queue and goal is None:
+            if len(parents) >= self.max_states:
+                status = UNKNOWN
+                break
+            _, _, steps, key, snapshot = heapq.heappop(queue)
+            self.game.restore(snapshot)
+            for move in self.actions():
+                self.game.restore(snapshot)
+                result, done = self.play(move)
+                if result == CC.GAME_OVER_COMPLETE:
+                    status, goal = SOLVABLE, (key, done)
+                    break
+                child = self.state_key()
+                if result != CC.GAME_OVER_NOT_OVER or child in parents:
+                    continue
+                parents[child] = (key, done)
+                treasures, distance = self.estimate()
+                if distance != navigation.UNREACHABLE:
+                    heapq.heappush(queue, ((treasures, steps + len(done) + DISTANCE_WEIGHT * distance), -counter,
+                                           steps + len(done), child, self.game.snapshot(self.beasts)))
+                    counter += 1
+
+        steps = []
+        while goal is not None:
+            key, done = goal
+            steps.extend(reversed(done))
+            goal = parents[key]
+        return Solution(path.basename(filename), status, steps[::-1], len(parents), time.perf_counter() - started)
+
+
+def solve_file(filename, max_states=50000, beasts=False) -> Solution:
+    """Проверка одного уровня. Для запуска в отдельном процессе"""
+    return Solver(max_states=max_states, beasts=beasts).solve(filename)
+
+
+def level_files(names) -> list:
+    """Файлы уровней из списка файлов и каталогов"""
+    res = []
+    for name in names:
+        if path.isdir(name):
+            res.extend(path.join(name, _) for _ in sorted(listdir(name)) if _.endswith(".lvl"))
+        else:
+            res.append(name)
+    return res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LodeRunner level solvability check")
+    parser.add_argument("levels", nargs="*", default=[path.join(path.dirname(path.abspath(__file__)), "Levels")],
+                        help="level files or folders, Levels by default")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--max-states", type=int, default=50000, help="search budget per level")
+    parser.add_argument("--beasts", action="store_true", help="keep beasts on the level")
+    parser.add_argument("--path", action="store_true", help="print the found path in engine.py input format")
+    args = parser.parse_args()
+
+    files = level_files(args.levels)
+    failed = False
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for solution in pool.map(solve_file, files, [args.max_states] * len(files), [args.beasts] * len(files)):
+            print(solution)
+            if args.path and solution.status == SOLVABLE:
+                print("\n".join(solution.path))
+            failed = failed or solution.status != SOLVABLE
+    exit(int(failed))
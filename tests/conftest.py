@@ -0,0 +1,26 @@
+""" Общая настройка тестов: окно и звук без устройств, модули игры -- из корня проекта.
+ Запуск: python -m pytest -q
+"""
+
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import pygame
+import CC
+import engine
+
+LEVELS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Levels")
+"""Каталог уровней игры"""
+
+
+@pytest.fixture(scope="session")
+def canvas():
+    """Экран игры, как в LodeRunner.py, но без окна"""
+    engine.init_config()
+    pygame.init()
+    return pygame.display.set_mode((CC.BLOCK_WIDTH * CC.SCREEN_WIDTH, CC.BLOCK_WIDTH * CC.SCREEN_HEIGHT))
@@ -0,0 +1,24 @@
+""" Отрисовка уровня с экраном: кадры между тиками симуляции"""
+
+import os
+from pygame.locals import *
+import CC
+import clock
+import level
+from controls import KeyState
+from conftest import LEVELS_FOLDER
+
+
+def test_draw_alpha_near_one(canvas):
+    """Последний тик шага, дополненный alpha почти до 1, в плавающей точке даёт ровно CC.STEP.
+        Кадр анимации персонажа при этом должен остаться в пределах набора кадров"""
+    game_field = level.Level(canvas)
+    for key in (K_LEFT, K_RIGHT):
+        game_field.load(os.path.join(LEVELS_FOLDER, "01.lvl"), 0)
+        game_field.player.controls = lambda: KeyState((key, ))
+        game_clock = clock.GameClock()
+        for _ in range(CC.STEP):
+            frame_ticks = game_clock.step()
+            game_field.update(*frame_ticks)
+        assert frame_ticks[0] + 0.9999999999999991 == CC.STEP
+        game_field.draw(*(_ + 0.9999999999999991 for _ in frame_ticks))
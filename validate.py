@@ -0,0 +1,162 @@
+""" Проверка файлов уровней.
+ Level.load ничего не проверяет: ширина карты берётся по самой длинной строке, короткие строки дополняются
+ пустотой, незнакомые символы пропускаются. Здесь каждый файл разбирается по тем же правилам и проверяется:
+ размеры, незнакомые символы, число игроков и сокровищ, достижимость сокровищ и выхода.
+
+ Достижимость проверяется по графу перемещений с рытьём (navigation.build_dig_moves). Всё, куда можно
+ попасть в игре, достижимо и по нему, поэтому ошибка недостижимости -- точная. Обратное не гарантируется:
+ проходимость целиком проверяет solver.py.
+
+ Запуск: python validate.py [файлы, каталоги или архивы zip ...] [--jobs N] [--output отчёт.json]
+ Отчёт -- JSON. Код возврата 1, если хоть в одном уровне есть ошибки.
+"""
+
+import argparse
+import json
+import sys
+import zipfile
+from contextlib import nullcontext
+from os import path, listdir
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import CC
+import navigation
+from glb import level_size
+
+ERROR = "error"
+WARNING = "warning"
+
+
+class Report:
+    """Итог проверки одного уровня"""
+
+    def __init__(self, level_name):
+        self.level_name = level_name
+        self.issues = list()
+        """Найденные проблемы: словари с уровнем серьёзности, названием проверки, сообщением и, если есть,
+            позицией (строка, столбец)"""
+
+    def add(self, severity, check, message, pos=None):
+        issue = {"severity": severity, "check": check, "message": message}
+        pos is None or issue.update(row=pos[0], col=pos[1])
+        self.issues.append(issue)
+
+    @property
+    def ok(self) -> bool:
+        return all(issue["severity"] != ERROR for issue in self.issues)
+
+    def as_dict(self) -> dict:
+        return {"level": self.level_name, "ok": self.ok, "issues": self.issues}
+
+
+def validate(level_name, data: bytes) -> dict:
+    """Проверка уровня по содержимому файла. Результат -- Report.as_dict"""
+    report = Report(level_name)
+    try:
+        lines = data.decode().splitlines()
+    except UnicodeDecodeError:
+        report.add(ERROR, "format", "not a text file")
+        return report.as_dict()
+
+    # Разбор по тем же правилам, что в Level.load. Рамку уровня (символ границы после последнего столбца)
+    # в файлах рисуют для наглядности, в карту она не входит
+    glyphs = set(CC.BLOCK_CHARS) - {CC.BORDER_BLOCK} | {" "}
+    height, width = level_size(lines)
+    stride = width + 2
+    grid = np.full((height + 2, stride), CC.BLOCK_IDS[CC.BORDER_BLOCK], dtype=np.uint8)
+    grid[1:-1, 1:-1] = CC.BLOCK_IDS[CC.EMPTY_BLOCK]
+    exit_grid = grid.copy()
+    players, treasures = list(), list()
+
+    # Короткий файл и короткие строки Level.load дополняет пустотой, так что уровень играется.
+    # Но чаще это испорченный или обрезанный файл, поэтому о них предупреждаем
+    if len(lines) < CC.LEVEL_HEIGHT:
+        report.add(WARNING, "dimensions", f"{len(lines)} rows, expected {CC.LEVEL_HEIGHT}")
+    for row, line in enumerate(lines[:height]):
+        line = line.rstrip(CC.BORDER_BLOCK)
+        if len(line) < width:
+            report.add(WARNING, "dimensions", f"row is {len(line)} columns, expected {width}", (row, len(line)))
+
+        for col, ch in enumerate(line):
+            if ch not in glyphs:
+                report.add(ERROR, "glyph", f"unknown block {ch!r}", (row, col))
+            elif ch in CC.EXIT_BLOCKS:
+                exit_grid[row + 1, col + 1] = CC.BLOCK_IDS[ch]
+            elif ch in CC.MAPPED_BLOCKS:
+                grid[row + 1, col + 1] = CC.BLOCK_IDS[ch]
+
+            if ch in CC.TREASURE_BLOCKS:
+                treasures.append((row, col))
+            if ch == 'I':
+                players.append((row, col))
+
+    if not players:
+        report.add(ERROR, "player", "no player start")
+    elif len(players) > 1:
+        report.add(WARNING, "player", f"{len(players)} player starts, the last one is used", players[-1])
+    if not treasures:
+        report.add(ERROR, "treasure", "no treasures, the exit never appears")
+    if not players:
+        return report.as_dict()
+
+    # Достижимость: сокровища -- от старта игрока, выход -- от старта игрока по карте с открытым выходом.
+    # Сокровища не мешают движению, а выход только добавляет пути, так что второе тоже честная проверка
+    trait_table = np.array(CC.BLOCK_TRAITS, dtype=np.uint16)
+    start = (players[-1][0] + 1) * stride + players[-1][1] + 1
+    distance = navigation.bfs(navigation.build_dig_moves(SimpleNamespace(grid=grid, stride=stride,
+                                                                         trait_table=trait_table)), start)
+    for pos in treasures:
+        if distance[(pos[0] + 1) * stride + pos[1] + 1] == navigation.UNREACHABLE:
+            report.add(ERROR, "reachability", "treasure is unreachable", pos)
+
+    exit_cells = exit_grid != CC.BLOCK_IDS[CC.EMPTY_BLOCK]
+    grid[exit_cells] = exit_grid[exit_cells]
+    distance = navigation.bfs(navigation.build_dig_moves(SimpleNamespace(grid=grid, stride=stride,
+                                                                         trait_table=trait_table)), start)
+    if min(distance[stride + 1:2 * stride - 1]) == navigation.UNREACHABLE:
+        report.add(ERROR, "reachability", "top row is unreachable even with the exit open")
+
+    return report.as_dict()
+
+
+def validate_item(item) -> dict:
+    """Проверка уровня из пары (имя, содержимое файла). Для запуска в отдельном процессе"""
+    return validate(*item)
+
+
+def level_sources(names):
+    """Пары (имя, содержимое файла) уровней из списка файлов, каталогов и архивов zip"""
+    for name in names:
+        if path.isdir(name):
+            yield from level_sources(path.join(name, _) for _ in sorted(listdir(name)) if _.endswith(".lvl"))
+        elif zipfile.is_zipfile(name):
+            with zipfile.ZipFile(name) as pack:
+                for member in sorted(pack.namelist()):
+                    if member.endswith(".lvl"):
+                        yield f"{name}:{member}", pack.read(member)
+        else:
+            with open(name, "rb") as lvl_stream:
+                yield name, lvl_stream.read()
+
+
+if __name__ == "__main__":
+    import engine
+
+    parser = argparse.ArgumentParser(description="LodeRunner level files validation")
+    parser.add_argument("levels", nargs="*", default=[path.join(path.dirname(path.abspath(__file__)), "Levels")],
+                        help="level files, folders or zip packs, Levels by default")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--output", help="report file, standard output by default")
+    args = parser.parse_args()
+
+    engine.init_config()
+    with ProcessPoolExecutor(args.jobs, initializer=engine.init_config) as pool:
+        reports = list(pool.map(validate_item, level_sources(args.levels), chunksize=64))
+
+    failed = sum(not report["ok"] for report in reports)
+    result = {"checked": len(reports), "failed": failed, "levels": reports}
+    with nullcontext(sys.stdout) if args.output is None else open(args.output, "w") as report_file:
+        json.dump(result, report_file, indent=1)
+        report_file.write("\n")
+    exit(int(failed > 0))